@@ -8,12 +8,19 @@ This library enables ADK agents to dynamically discover and use NPL protocols
 as tools, automatically generating FunctionTool instances from OpenAPI specs.
 """
 
+from typing import TYPE_CHECKING
+
 from .config import NPLConfig
 from .client import NPLClient
+from .pipeline import NPLSession
 from .discovery import NPLPackageDiscovery
-from .tools import NPLToolGenerator
-from .auth import AuthStrategy, KeycloakAuth, TokenAuth, create_auth_strategy
-from .agent_builder import NPLToolRegistry, create_agent_with_npl
+from .auth import (
+    AuthStrategy,
+    KeycloakAuth,
+    KeycloakTokenCache,
+    TokenAuth,
+    create_auth_strategy
+)
 from .utils import (
     NPLIntegrationError,
     AuthenticationError,
@@ -34,10 +41,25 @@ from .activity_logger import (
     get_activity_logger,
     log_activity
 )
-from .protocol_memory import (
-    NPLProtocolMemory,
-    create_memory_tools
-)
+
+if TYPE_CHECKING:
+    from .tools import NPLToolGenerator
+    from .agent_builder import NPLToolRegistry, create_agent_with_npl, discover_npl_tools
+    from .protocol_memory import NPLProtocolMemory, create_memory_tools
+    from .async_client import AsyncNPLClient
+
+# Exports whose modules import google.adk (or optional httpx); they are loaded on
+# first access so that client-only users (NPLClient, auth, monitoring) don't pay
+# for the ADK stack
+_LAZY_EXPORTS = {
+    "AsyncNPLClient": ".async_client",
+    "NPLToolGenerator": ".tools",
+    "NPLToolRegistry": ".agent_builder",
+    "create_agent_with_npl": ".agent_builder",
+    "discover_npl_tools": ".agent_builder",
+    "NPLProtocolMemory": ".protocol_memory",
+    "create_memory_tools": ".protocol_memory",
+}
 
 __version__ = "0.1.0"
 
@@ -47,6 +69,8 @@ __all__ = [
     
     # Clients
     "NPLClient",
+    "AsyncNPLClient",
+    "NPLSession",
     
     # Discovery
     "NPLPackageDiscovery",
@@ -58,11 +82,13 @@ __all__ = [
     # Authentication
     "AuthStrategy",
     "KeycloakAuth",
+    "KeycloakTokenCache",
     "TokenAuth",
     "create_auth_strategy",
     
     # Convenience
     "create_agent_with_npl",
+    "discover_npl_tools",
     
     # Errors
     "NPLIntegrationError",
@@ -89,3 +115,12 @@ __all__ = [
     "create_memory_tools",
 ]
 
+
+def __getattr__(name):
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+    value = getattr(import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
@@ -9,7 +9,6 @@ Provides structured logging of all system activities including:
 - Authentication events
 """
 
-import json
 import os
 import logging
 from datetime import datetime, timezone
@@ -17,6 +16,8 @@ from typing import Dict, Any, Optional, List
 from pathlib import Path
 import threading
 
+from .utils import json_dumps_bytes
+
 logger = logging.getLogger(__name__)
 
 
@@ -151,8 +152,8 @@ class ActivityLogger:
         
         # Write to file
         try:
-            with open(self.log_file, 'a') as f:
-                f.write(json.dumps(event) + '\n')
+            with open(self.log_file, 'ab') as f:
+                f.write(json_dumps_bytes(event) + b'\n')
         except Exception as e:
             logger.error(f"Failed to write activity log: {e}")
         
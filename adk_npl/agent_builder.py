@@ -4,16 +4,23 @@ Agent builder utilities for creating ADK agents with NPL tools.
 Provides convenience functions for easy integration.
 """
 
+import functools
 import logging
 import asyncio
-from typing import List, Optional, Any
+import os
+import time
+import weakref
+from typing import Dict, List, Optional, Any
+import requests
+from requests.adapters import HTTPAdapter
 from google.adk.agents import LlmAgent
+from google.adk.tools import FunctionTool
 
 from .config import NPLConfig
 from .client import NPLClient
-from .auth import create_auth_strategy
+from .auth import KeycloakTokenCache, create_auth_strategy
 from .tools import NPLToolGenerator
-from .utils import AuthenticationError
+from .utils import AuthenticationError, Cache
 
 logger = logging.getLogger(__name__)
 
@@ -205,3 +212,132 @@ async def create_agent_with_npl(
     
     return base_agent
 
+
+# Discovered NPL tools per (engine, Keycloak realm/client, user). An entry lives
+# at most _NPL_TOOL_CACHE_TTL seconds and never past the point where
+# KeycloakTokenCache would stop handing out the token it was built with; agents
+# holding the tools longer are covered by the client's token_refresh_callback
+_NPL_TOOL_CACHE_TTL = 300
+_npl_tool_cache = Cache(default_ttl=_NPL_TOOL_CACHE_TTL)
+# asyncio primitives are bound to one event loop, so they are kept per loop;
+# entries go away with their loop. Discovery locks only exist while in flight.
+_npl_tool_locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Lock]]" = (
+    weakref.WeakKeyDictionary()
+)
+_npl_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+# One connection pool shared by every Keycloak login and NPL client this module
+# creates; sessions stay separate so each client keeps its own auth header
+_HTTP_ADAPTER = HTTPAdapter(pool_connections=4, pool_maxsize=32)
+_KEYCLOAK_SESSION = requests.Session()
+_KEYCLOAK_SESSION.mount("http://", _HTTP_ADAPTER)
+_KEYCLOAK_SESSION.mount("https://", _HTTP_ADAPTER)
+
+# Cap on in-flight NPL Engine calls across all agents on one event loop
+_NPL_MAX_CONCURRENCY = int(os.getenv("NPL_MAX_CONCURRENCY", "8"))
+
+
+def _npl_semaphore() -> asyncio.Semaphore:
+    """Return the running loop's semaphore for NPL tool calls."""
+    loop = asyncio.get_running_loop()
+    semaphore = _npl_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _npl_semaphores[loop] = asyncio.Semaphore(_NPL_MAX_CONCURRENCY)
+    return semaphore
+
+
+def _bounded_npl_tool(tool: FunctionTool) -> FunctionTool:
+    """
+    Wrap a generated (synchronous) NPL tool so calls run in a worker thread,
+    at most _NPL_MAX_CONCURRENCY at a time per event loop.
+    
+    ADK runs the function calls of one model response concurrently, but a
+    blocking tool stalls the event loop and serializes them; awaiting the
+    thread lets independent NPL round-trips overlap. functools.wraps keeps the name, docstring and typed signature that ADK
+    uses to build the function declaration.
+    """
+    func = tool.func
+    
+    @functools.wraps(func)
+    async def bounded(**kwargs):
+        async with _npl_semaphore():
+            return await asyncio.to_thread(func, **kwargs)
+    
+    return FunctionTool(bounded, require_confirmation=False)
+
+
+async def discover_npl_tools(config: NPLConfig) -> List[FunctionTool]:
+    """
+    Discover and generate NPL tools for the configured Keycloak identity.
+    
+    Tools are cached per (engine, Keycloak realm/client, user) and shared by
+    every agent of that identity; concurrent calls share one discovery. Each
+    tool runs in a worker thread, bounded per event loop by
+    NPL_MAX_CONCURRENCY (default: 8).
+    
+    Args:
+        config: NPL configuration with Keycloak credentials
+        
+    Returns:
+        List of ADK FunctionTool instances
+    """
+    cache_key = (
+        f"{config.engine_url}|{config.keycloak_url}|{config.keycloak_realm}|"
+        f"{config.keycloak_client_id}|{config.credentials.get('username')}"
+    )
+    tools = _npl_tool_cache.get(cache_key)
+    if tools is not None:
+        logger.debug(f"Using cached NPL tools for {cache_key}")
+        return list(tools)
+    
+    # Concurrent agent creations for the same identity share one discovery
+    locks = _npl_tool_locks.setdefault(asyncio.get_running_loop(), {})
+    lock = locks.setdefault(cache_key, asyncio.Lock())
+    try:
+        async with lock:
+            tools = _npl_tool_cache.get(cache_key)
+            if tools is None:
+                # Shared per identity, so agents for the same user authenticate once
+                identity = {
+                    "keycloak_url": config.keycloak_url,
+                    "realm": config.keycloak_realm,
+                    "client_id": config.keycloak_client_id,
+                    "username": config.credentials.get("username"),
+                }
+                
+                def refresh_token() -> str:
+                    # Runs in the worker thread of a bounded tool call, which has no event loop
+                    return asyncio.run(KeycloakTokenCache.get_or_refresh(
+                        **identity,
+                        password=config.credentials.get("password"),
+                        session=_KEYCLOAK_SESSION
+                    ))
+                
+                token = await KeycloakTokenCache.get_or_refresh(
+                    **identity,
+                    password=config.credentials.get("password"),
+                    session=_KEYCLOAK_SESSION
+                )
+                client = NPLClient(
+                    config.engine_url,
+                    token,
+                    token_refresh_callback=refresh_token,
+                    adapter=_HTTP_ADAPTER
+                )
+                
+                # Generate tools
+                generator = NPLToolGenerator(client)
+                tools = [_bounded_npl_tool(tool) for tool in await generator.generate_tools()]
+                refresh_at = KeycloakTokenCache.refresh_at(**identity)
+                ttl = _NPL_TOOL_CACHE_TTL if refresh_at is None else min(_NPL_TOOL_CACHE_TTL, refresh_at - time.time())
+                if ttl > 0:
+                    _npl_tool_cache.set(cache_key, tools, ttl=ttl)
+    finally:
+        # Later callers find the tools in the cache; keep no lock per identity
+        if locks.get(cache_key) is lock:
+            del locks[cache_key]
+    
+    return list(tools)
@@ -0,0 +1,265 @@
+"""
+Async NPL Engine client.
+
+AsyncNPLClient mirrors NPLClient's protocol API as coroutines on top of
+``httpx.AsyncClient``. With the optional ``h2`` package installed, requests
+from concurrent tasks are multiplexed over one HTTP/2 connection instead of
+each blocking a thread on a pooled ``requests`` connection.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - optional dependency
+    httpx = None
+
+try:
+    import h2  # noqa: F401
+    _HAS_H2 = True
+except ImportError:  # pragma: no cover - optional dependency
+    _HAS_H2 = False
+
+from .client import NPLClient, _Outcome
+from .utils import NPLClientError, json_dumps_bytes, json_loads
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncNPLClient(NPLClient):
+    """
+    Async client for NPL Engine API.
+    
+    Shares configuration, retry classification, circuit breaker and error
+    mapping with NPLClient; the ``a``-prefixed methods are the async
+    counterparts of the sync ones, which remain available.
+    
+    Requires httpx (``pip install 'httpx[http2]'``).
+    """
+    
+    def __init__(
+        self,
+        *args,
+        http2: Optional[bool] = None,
+        max_keepalive_connections: int = 20,
+        transport: Optional["httpx.AsyncBaseTransport"] = None,
+        **kwargs
+    ):
+        """
+        Initialize async NPL Engine client.
+        
+        Takes the same arguments as NPLClient, plus:
+        
+        Args:
+            http2: Use HTTP/2 (default: when the h2 package is installed)
+            max_keepalive_connections: Idle connections kept in the pool (default: 20)
+            transport: Optional httpx transport, e.g. httpx.MockTransport in tests
+        """
+        if httpx is None:
+            raise ImportError("AsyncNPLClient requires httpx: pip install 'httpx[http2]'")
+        super().__init__(*args, **kwargs)
+        self._client = httpx.AsyncClient(
+            http2=_HAS_H2 if http2 is None else http2,
+            timeout=self.timeout,
+            limits=httpx.Limits(max_keepalive_connections=max_keepalive_connections),
+            headers={"Authorization": f"Bearer {self.auth_token}"} if self.auth_token else None,
+            transport=transport,
+        )
+    
+    def set_auth_token(self, token: Optional[str]):
+        """
+        Set or update authentication token.
+        
+        Args:
+            token: JWT authentication token
+        """
+        super().set_auth_token(token)
+        # Called from NPLClient.__init__ before the httpx client exists
+        client = getattr(self, "_client", None)
+        if client is None:
+            return
+        if token:
+            client.headers["Authorization"] = f"Bearer {token}"
+        else:
+            client.headers.pop("Authorization", None)
+    
+    async def aclose(self) -> None:
+        """Close the underlying connection pool."""
+        await self._client.aclose()
+    
+    async def __aenter__(self) -> "AsyncNPLClient":
+        return self
+    
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+    
+    async def _amake_request(self, method: str, url: str, **kwargs) -> "httpx.Response":
+        """
+        Make HTTP request with retry logic, guarded by the circuit breaker.
+        
+        Args:
+            method: HTTP method (GET, POST, etc.)
+            url: Request URL
+            **kwargs: Additional arguments for httpx
+        
+        Returns:
+            HTTP response object
+        
+        Raises:
+            ServiceUnavailableError: If the circuit is open
+            NPLClientError: For API errors
+            TokenExpiredError: If token expired
+        """
+        self._check_circuit(method, url)
+        
+        try:
+            response = await self._arequest_with_retries(method, url, **kwargs)
+        except NPLClientError as e:
+            self._record_breaker_failure(e)
+            raise
+        except Exception:
+            self._breaker.record_success()
+            raise
+        
+        self._breaker.record_success()
+        return response
+    
+    async def _arequest_with_retries(self, method: str, url: str, **kwargs) -> "httpx.Response":
+        """Async counterpart of NPLClient._request_with_retries."""
+        kwargs.setdefault("timeout", self.timeout)
+        
+        overall_start_time = time.time()
+        deadline = (
+            time.monotonic() + self.total_timeout if self.total_timeout is not None else None
+        )
+        delay = self.backoff_base
+        
+        self._refresh_if_expiring()
+        
+        for attempt in range(self.max_retries + 1):
+            can_retry = attempt < self.max_retries
+            attempt_start_time = time.time()
+            error: Optional[Exception] = None
+            try:
+                response = await self._client.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                error = e
+                response = None
+                outcome = self._record_failed_attempt(
+                    e, method, url, attempt, time.time() - attempt_start_time,
+                    retryable=can_retry
+                )
+            else:
+                outcome = self._record_attempt(
+                    response, method, url, attempt, time.time() - attempt_start_time,
+                    overall_start_time, can_retry
+                )
+            
+            if outcome is _Outcome.OK:
+                return response
+            
+            if outcome is _Outcome.REFRESH_AUTH:
+                self._refresh_after_401()
+                continue
+            
+            if outcome is _Outcome.FATAL:
+                self._raise_fatal(method, url, attempt, response, error, time.time() - attempt_start_time)
+            
+            delay = self._retry_delay(outcome, method, url, attempt, response, error, delay, deadline)
+            await asyncio.sleep(delay)
+        
+        # Unreachable: the last attempt always resolves to OK or FATAL
+        raise NPLClientError(f"Request failed: {method} {url}", url=url)
+    
+    async def acreate_protocol(
+        self,
+        package: str,
+        protocol_name: str,
+        parties: Dict[str, str],
+        data: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Async counterpart of NPLClient.create_protocol."""
+        logger.info(f"Creating protocol {protocol_name} in package {package}")
+        
+        url = f"{self.base_url}/npl/{package}/{protocol_name}/"
+        payload = {"@parties": parties, **data}
+        self._validate_payload(package, protocol_name, payload, url)
+        
+        response = await self._amake_request(
+            "POST", url, content=json_dumps_bytes(payload), headers=self._JSON_HEADERS
+        )
+        return json_loads(response.content)
+    
+    async def aexecute_action(
+        self,
+        package: str,
+        protocol_name: str,
+        instance_id: str,
+        action_name: str,
+        party: Optional[str] = None,
+        params: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Async counterpart of NPLClient.execute_action."""
+        logger.info(f"Executing action {action_name} on {instance_id}")
+        
+        url = f"{self.base_url}/npl/{package}/{protocol_name}/{instance_id}/{action_name}"
+        
+        headers = dict(self._JSON_HEADERS)
+        if party:
+            headers["X-Party"] = party
+        
+        response = await self._amake_request(
+            "POST", url, content=json_dumps_bytes(params or {}), headers=headers
+        )
+        if response.status_code == 204 or not response.content:
+            return {}
+        return json_loads(response.content)
+    
+    async def aget_instance(
+        self,
+        package: str,
+        protocol_name: str,
+        instance_id: str
+    ) -> Dict[str, Any]:
+        """Async counterpart of NPLClient.get_instance."""
+        logger.info(f"Getting instance {instance_id}")
+        
+        url = f"{self.base_url}/npl/{package}/{protocol_name}/{instance_id}/"
+        
+        response = await self._amake_request("GET", url)
+        return json_loads(response.content)
+    
+    async def aquery_instances(
+        self,
+        package: str,
+        protocol_name: str,
+        filters: Optional[Dict[str, Any]] = None,
+        page: int = 0,
+        size: int = 20
+    ) -> Dict[str, Any]:
+        """Async counterpart of NPLClient.query_instances."""
+        logger.info(f"Querying instances of {protocol_name}")
+        
+        url = f"{self.base_url}/npl/{package}/{protocol_name}"
+        
+        params = {
+            "page": page + 1,  # NPL Engine uses 1-indexed pages
+            "pageSize": size   # NPL Engine uses pageSize, not size
+        }
+        if filters:
+            params.update(filters)
+        
+        response = await self._amake_request("GET", url, params=params)
+        return json_loads(response.content)
+    
+    async def aget_openapi_spec(self, package: str) -> Dict[str, Any]:
+        """Async counterpart of NPLClient.get_openapi_spec."""
+        logger.info(f"Getting OpenAPI spec for package '{package}'")
+        
+        url = f"{self.base_url}/npl/{package}/-/openapi.json"
+        
+        response = await self._amake_request("GET", url)
+        return json_loads(response.content)
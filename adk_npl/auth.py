@@ -5,11 +5,17 @@ Supports Keycloak OAuth2 and direct token authentication.
 """
 
 import requests
+import asyncio
+import hashlib
+import hmac
 import logging
-from typing import Optional
+import os
+import time
+import weakref
+from typing import Any, Dict, Optional, Tuple
 from abc import ABC, abstractmethod
 
-from .utils import AuthenticationError
+from .utils import AuthenticationError, decode_jwt_claims, json_loads, jwt_expiry
 
 logger = logging.getLogger(__name__)
 
@@ -39,7 +45,8 @@ class KeycloakAuth(AuthStrategy):
         realm: str,
         username: str,
         password: str,
-        client_id: str = "npl-client"
+        client_id: str = "npl-client",
+        session: Optional[requests.Session] = None
     ):
         """
         Initialize Keycloak authentication.
@@ -50,6 +57,8 @@ class KeycloakAuth(AuthStrategy):
             username: Username
             password: Password
             client_id: Keycloak client ID
+            session: Optional requests session to reuse connections across
+                token requests (defaults to one-off requests)
         """
         self.keycloak_url = keycloak_url.rstrip('/')
         self.realm = realm
@@ -58,6 +67,23 @@ class KeycloakAuth(AuthStrategy):
         self.client_id = client_id
         self._refresh_token: Optional[str] = None
         self._access_token: Optional[str] = None
+        self._http = session or requests
+        # Epoch seconds from the access token's exp claim (None if unknown)
+        self.expires_at: Optional[float] = None
+        self._claims: Dict[str, Any] = {}
+    
+    @property
+    def claims(self) -> Dict[str, Any]:
+        """Claims of the current access token, decoded once when it was issued."""
+        return self._claims
+    
+    def _set_access_token(self, token: str) -> None:
+        self._access_token = token
+        self._claims = decode_jwt_claims(token) or {}
+        try:
+            self.expires_at = float(self._claims["exp"])
+        except (KeyError, TypeError, ValueError):
+            self.expires_at = None
     
     async def authenticate(self) -> str:
         """
@@ -90,16 +116,18 @@ class KeycloakAuth(AuthStrategy):
             request_headers["Host"] = "keycloak:11000"
         
         try:
-            response = requests.post(
+            # requests is blocking; keep the event loop free during the round-trip
+            response = await asyncio.to_thread(
+                self._http.post,
                 token_url,
                 data=payload,
                 headers=request_headers
             )
             response.raise_for_status()
             
-            token_data = response.json()
+            token_data = json_loads(response.content)
             token = token_data["access_token"]
-            self._access_token = token
+            self._set_access_token(token)
             
             # Store refresh token if provided
             if "refresh_token" in token_data:
@@ -112,7 +140,7 @@ class KeycloakAuth(AuthStrategy):
             error_msg = f"Keycloak authentication failed: {e}"
             if hasattr(e, 'response') and e.response is not None:
                 try:
-                    error_detail = e.response.json()
+                    error_detail = json_loads(e.response.content)
                     error_msg += f" - {error_detail}"
                 except:
                     error_msg += f" - Status: {e.response.status_code}"
@@ -120,6 +148,23 @@ class KeycloakAuth(AuthStrategy):
             logger.error(error_msg)
             raise AuthenticationError(error_msg) from e
     
+    async def ensure_fresh(self, margin: float = 30.0) -> str:
+        """
+        Return an access token valid for at least ``margin`` more seconds.
+        
+        Refreshes ahead of expiry (refresh-token grant, falling back to a
+        full login) so requests don't have to fail with 401 first. Tokens
+        without an exp claim are refreshed only when there is none yet.
+        
+        Returns:
+            JWT access token
+        """
+        if self._access_token is None:
+            return await self.authenticate()
+        if self.expires_at is not None and time.time() >= self.expires_at - margin:
+            return await self.refresh_token()
+        return self._access_token
+    
     async def refresh_token(self) -> str:
         """
         Refresh access token using refresh token.
@@ -150,16 +195,18 @@ class KeycloakAuth(AuthStrategy):
             request_headers["Host"] = "keycloak:11000"
         
         try:
-            response = requests.post(
+            # requests is blocking; keep the event loop free during the round-trip
+            response = await asyncio.to_thread(
+                self._http.post,
                 token_url,
                 data=payload,
                 headers=request_headers
             )
             response.raise_for_status()
             
-            token_data = response.json()
+            token_data = json_loads(response.content)
             token = token_data["access_token"]
-            self._access_token = token
+            self._set_access_token(token)
             
             # Update refresh token if provided
             if "refresh_token" in token_data:
@@ -172,7 +219,7 @@ class KeycloakAuth(AuthStrategy):
             error_msg = f"Token refresh failed: {e}"
             if hasattr(e, 'response') and e.response is not None:
                 try:
-                    error_detail = e.response.json()
+                    error_detail = json_loads(e.response.content)
                     error_msg += f" - {error_detail}"
                 except:
                     error_msg += f" - Status: {e.response.status_code}"
@@ -184,6 +231,119 @@ class KeycloakAuth(AuthStrategy):
             return await self.authenticate()
 
 
+class KeycloakTokenCache:
+    """
+    Process-wide Keycloak access tokens keyed by (keycloak_url, realm,
+    client_id, username).
+    
+    The first caller for an identity authenticates; concurrent callers on
+    the same event loop wait for that same request instead of issuing their
+    own, and later callers get the cached token until ``refresh_margin``
+    seconds before it expires. The first caller after that refreshes it;
+    nothing is refreshed in the background, so identities nobody asks for
+    anymore simply age out.
+    """
+    
+    refresh_margin: float = 60.0
+    default_lifetime: float = 300.0
+    
+    # key -> (access token, time at which it should be refreshed, password digest)
+    _tokens: Dict[Tuple[str, str, str, str], Tuple[str, float, bytes]] = {}
+    # Keys the password digests, so they are meaningless outside this process
+    _digest_key: bytes = os.urandom(16)
+    _auths: Dict[Tuple[str, str, str, str], KeycloakAuth] = {}
+    # asyncio locks are bound to one loop; keep them per loop so that each
+    # asyncio.run() gets fresh ones and closed loops take theirs with them
+    _locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[str, str, str, str], asyncio.Lock]]" = (
+        weakref.WeakKeyDictionary()
+    )
+    
+    @classmethod
+    async def get_or_refresh(
+        cls,
+        keycloak_url: str,
+        realm: str,
+        client_id: str,
+        username: str,
+        password: str,
+        session: Optional[requests.Session] = None
+    ) -> str:
+        """
+        Return a valid access token for the identity, authenticating at most
+        once per token lifetime.
+        
+        Raises:
+            AuthenticationError: If authentication fails
+        """
+        key = (keycloak_url, realm, client_id, username)
+        # A caller only gets a cached token by presenting the password it was issued for
+        digest = cls._password_digest(password)
+        token = cls._valid_token(key, digest)
+        if token is not None:
+            return token
+        
+        loop_locks = cls._locks.setdefault(asyncio.get_running_loop(), {})
+        async with loop_locks.setdefault(key, asyncio.Lock()):
+            token = cls._valid_token(key, digest)
+            if token is not None:
+                return token
+            
+            auth = cls._auths.get(key)
+            if auth is None or auth.password != password:
+                auth = KeycloakAuth(
+                    keycloak_url=keycloak_url,
+                    realm=realm,
+                    username=username,
+                    password=password,
+                    client_id=client_id,
+                    session=session
+                )
+                cls._auths[key] = auth
+            
+            # Refresh grant when a refresh token is held, full login otherwise
+            token = await auth.refresh_token()
+            cls._store(key, token, digest)
+            return token
+    
+    @classmethod
+    def refresh_at(cls, keycloak_url: str, realm: str, client_id: str, username: str) -> Optional[float]:
+        """
+        Return the time (epoch seconds) after which the cached token for the
+        identity is no longer handed out, or None if none is cached.
+        """
+        entry = cls._tokens.get((keycloak_url, realm, client_id, username))
+        return entry[1] if entry is not None else None
+    
+    @classmethod
+    def clear(cls) -> None:
+        """Drop all cached tokens."""
+        cls._tokens.clear()
+        cls._auths.clear()
+        cls._locks.clear()
+    
+    @classmethod
+    def _password_digest(cls, password: str) -> bytes:
+        return hashlib.blake2b(password.encode(), key=cls._digest_key, digest_size=16).digest()
+    
+    @classmethod
+    def _valid_token(cls, key: Tuple[str, str, str, str], digest: bytes) -> Optional[str]:
+        entry = cls._tokens.get(key)
+        if entry is None:
+            return None
+        token, refresh_at, stored_digest = entry
+        if not hmac.compare_digest(digest, stored_digest) or time.time() >= refresh_at:
+            return None
+        return token
+    
+    @classmethod
+    def _store(cls, key: Tuple[str, str, str, str], token: str, digest: bytes) -> None:
+        now = time.time()
+        lifetime = (jwt_expiry(token) or now + cls.default_lifetime) - now
+        # Short-lived tokens are refreshed halfway through instead
+        refresh_at = now + max(0.0, lifetime - min(cls.refresh_margin, lifetime / 2))
+        cls._tokens[key] = (token, refresh_at, digest)
+
+
 class TokenAuth(AuthStrategy):
     """
     Direct token authentication (for service accounts or pre-obtained tokens).
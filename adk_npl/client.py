@@ -5,19 +5,49 @@ Provides a client for interacting with the NPL Engine API,
 including protocol instantiation, action execution, and OpenAPI spec fetching.
 """
 
+import itertools
 import requests
 import logging
+import random
+from requests.adapters import HTTPAdapter
 import time
-from typing import Dict, List, Any, Optional, Callable
+from enum import Enum
+from typing import TYPE_CHECKING, Dict, List, Any, Optional, Callable, Iterator, Tuple
 
-from .utils import NPLClientError, ServiceUnavailableError, TokenExpiredError
-from .retry import is_retryable_exception
+try:
+    import ijson
+except ImportError:  # pragma: no cover - optional dependency
+    ijson = None
+
+from .utils import (
+    NPLClientError,
+    ServiceUnavailableError,
+    PayloadValidator,
+    TokenExpiredError,
+    compile_payload_validator,
+    json_dumps_bytes,
+    json_loads,
+    jwt_expiry,
+)
+from .retry import CircuitBreaker, is_retryable_exception, is_retryable_status_code
 from .monitoring import get_metrics
 from .activity_logger import get_activity_logger
 
+if TYPE_CHECKING:
+    from .pipeline import NPLSession
+
 logger = logging.getLogger(__name__)
 
 
+class _Outcome(Enum):
+    """What a single request attempt resolved to, as seen by the retry loop."""
+    OK = "ok"
+    REFRESH_AUTH = "refresh_auth"
+    RETRY_5XX = "retry_5xx"
+    RETRY_NET = "retry_net"
+    FATAL = "fatal"
+
+
 class NPLClient:
     """
     Client for NPL Engine API.
@@ -25,13 +55,25 @@ class NPLClient:
     Wraps HTTP calls to NPL Engine with authentication support.
     """
     
+    # Request bodies are pre-serialized (see utils.json_dumps_bytes), so the
+    # content type has to be set explicitly.
+    _JSON_HEADERS = {"Content-Type": "application/json"}
+    
+    # Refresh this many seconds before the token's exp instead of waiting for a 401
+    token_refresh_margin = 30.0
+    
     def __init__(
         self,
         base_url: str = "http://localhost:12000",
         auth_token: Optional[str] = None,
         max_retries: int = 3,
         timeout: float = 30.0,
-        token_refresh_callback: Optional[Callable[[], str]] = None
+        token_refresh_callback: Optional[Callable[[], str]] = None,
+        adapter: Optional[HTTPAdapter] = None,
+        backoff_base: float = 1.0,
+        backoff_cap: float = 60.0,
+        total_timeout: Optional[float] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None
     ):
         """
         Initialize NPL Engine client.
@@ -42,13 +84,31 @@ class NPLClient:
             max_retries: Maximum number of retries for failed requests (default: 3)
             timeout: Request timeout in seconds (default: 30.0)
             token_refresh_callback: Optional callback to refresh expired tokens
+            adapter: Optional transport adapter to mount, e.g. one shared with
+                other clients so they reuse the same connection pool
+            backoff_base: Minimum delay between retries in seconds (default: 1.0)
+            backoff_cap: Maximum delay between retries in seconds (default: 60.0)
+            total_timeout: Optional budget in seconds for a request including
+                all retries and backoff; no retry is started that would exceed it
+            circuit_breaker: Optional breaker to use; by default clients of the
+                same base URL share one (see CircuitBreaker.for_endpoint)
         """
         self.base_url = base_url.rstrip('/')
         self.auth_token = auth_token
+        self.token_expires_at = jwt_expiry(auth_token)
         self.max_retries = max_retries
         self.timeout = timeout
         self.token_refresh_callback = token_refresh_callback
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.total_timeout = total_timeout
+        self._breaker = circuit_breaker or CircuitBreaker.for_endpoint(self.base_url)
+        # (package, protocol) -> creation payload validator, see register_schema()
+        self._validators: Dict[Tuple[str, str], PayloadValidator] = {}
         self.session = requests.Session()
+        if adapter is not None:
+            self.session.mount("http://", adapter)
+            self.session.mount("https://", adapter)
         
         if auth_token:
             self.session.headers.update({
@@ -63,6 +123,7 @@ class NPLClient:
             token: JWT authentication token
         """
         self.auth_token = token
+        self.token_expires_at = jwt_expiry(token)
         if token:
             self.session.headers.update({
                 "Authorization": f"Bearer {token}"
@@ -85,7 +146,7 @@ class NPLClient:
         """
         status_code = response.status_code
         try:
-            error_body = response.json()
+            error_body = json_loads(response.content)
         except:
             error_body = response.text[:500]  # Limit error body length
         
@@ -116,6 +177,76 @@ class NPLClient:
         method: str,
         url: str,
         **kwargs
+    ) -> requests.Response:
+        """
+        Make HTTP request through the circuit breaker, with retries.
+        
+        While the engine's circuit is open, calls fail immediately with
+        ServiceUnavailableError instead of spending the retry budget.
+        Network errors and 5xx responses (after retries) count as failures;
+        any other outcome shows the engine is up and closes the circuit.
+        
+        Args:
+            method: HTTP method (GET, POST, etc.)
+            url: Request URL
+            **kwargs: Additional arguments for requests
+            
+        Returns:
+            HTTP response object
+            
+        Raises:
+            ServiceUnavailableError: If the circuit is open
+            NPLClientError: For API errors
+            TokenExpiredError: If token expired
+        """
+        self._check_circuit(method, url)
+        
+        try:
+            response = self._request_with_retries(method, url, **kwargs)
+        except (requests.exceptions.RequestException, NPLClientError) as e:
+            self._record_breaker_failure(e)
+            raise
+        except Exception:
+            # e.g. TokenExpiredError: the engine answered, so it is up
+            self._breaker.record_success()
+            raise
+        
+        self._breaker.record_success()
+        return response
+    
+    def _check_circuit(self, method: str, url: str) -> None:
+        """Raise ServiceUnavailableError if the endpoint's circuit is open."""
+        if not self._breaker.allow_request():
+            get_metrics().increment("npl.api.circuit_rejections", method=method)
+            raise ServiceUnavailableError(
+                f"Circuit open for {self.base_url}: failing fast after "
+                f"{self._breaker.failure_count} consecutive failures",
+                url=url
+            )
+    
+    def _record_breaker_failure(self, error: Exception) -> None:
+        """Count a failed request against the breaker unless the engine answered with a 4xx."""
+        status_code = getattr(error, "status_code", None)
+        if status_code is None or status_code >= 500:
+            if self._breaker.record_failure():
+                logger.error(f"Circuit opened for {self.base_url}")
+                get_metrics().increment("npl.api.circuit_trips")
+        else:
+            self._breaker.record_success()
+    
+    def _token_expiring(self) -> bool:
+        """Whether the token can be refreshed and is within token_refresh_margin of exp."""
+        return bool(
+            self.token_refresh_callback
+            and self.token_expires_at is not None
+            and time.time() >= self.token_expires_at - self.token_refresh_margin
+        )
+    
+    def _request_with_retries(
+        self,
+        method: str,
+        url: str,
+        **kwargs
     ) -> requests.Response:
         """
         Make HTTP request with retry logic and error handling.
@@ -136,119 +267,296 @@ class NPLClient:
         if 'timeout' not in kwargs:
             kwargs['timeout'] = self.timeout
         
-        last_exception = None
-        
-        metrics = get_metrics()
-        activity_logger = get_activity_logger()
         overall_start_time = time.time()
+        deadline = (
+            time.monotonic() + self.total_timeout if self.total_timeout is not None else None
+        )
+        delay = self.backoff_base
+        
+        self._refresh_if_expiring()
         
         for attempt in range(self.max_retries + 1):
+            can_retry = attempt < self.max_retries
             attempt_start_time = time.time()
+            error: Optional[requests.exceptions.RequestException] = None
             try:
-                # Refresh token if callback provided and this is a retry after 401
-                if attempt > 0 and self.token_refresh_callback:
-                    logger.info("Refreshing authentication token...")
-                    new_token = self.token_refresh_callback()
-                    self.set_auth_token(new_token)
-                
                 response = self.session.request(method, url, **kwargs)
-                attempt_latency = time.time() - attempt_start_time
-                overall_latency = time.time() - overall_start_time
-                
-                # Record metrics (use attempt latency for individual call, overall for total)
-                metrics.increment("npl.api.calls", method=method, status_code=response.status_code)
-                metrics.record_latency("npl.api.latency", attempt_latency, method=method)
-                
-                # Log activity
-                activity_logger.log_npl_api_call(
-                    method=method,
-                    endpoint=url.replace(self.base_url, ""),
-                    status_code=response.status_code,
-                    response_time=attempt_latency
-                )
-                if attempt > 0:
-                    metrics.record_latency("npl.api.latency_with_retries", overall_latency, method=method)
-                
-                # Handle 401 - token expired
-                if response.status_code == 401 and self.token_refresh_callback and attempt < self.max_retries:
-                    logger.warning(f"Authentication failed (401), refreshing token and retrying...")
-                    metrics.increment("npl.api.token_refreshes")
-                    new_token = self.token_refresh_callback()
-                    self.set_auth_token(new_token)
-                    continue
-                
-                # Check if status code is retryable before handling error
-                if not response.ok:
-                    from .retry import is_retryable_status_code
-                    if is_retryable_status_code(response.status_code) and attempt < self.max_retries:
-                        # Retryable error - will retry in the except block
-                        response.raise_for_status()  # This will raise an exception to trigger retry
-                    
-                    # Non-retryable or max retries exceeded - handle error
-                    metrics.increment("npl.api.errors", status_code=response.status_code, method=method)
-                    metrics.record_error(
-                        "NPLClientError",
-                        f"API error {response.status_code}",
-                        url=url,
-                        status_code=response.status_code,
-                        method=method
-                    )
-                    # Log error activity
-                    activity_logger.log_npl_api_call(
-                        method=method,
-                        endpoint=url.replace(self.base_url, ""),
-                        status_code=response.status_code,
-                        response_time=attempt_latency,
-                        error=f"HTTP {response.status_code}"
-                    )
-                    self._handle_response_error(response, url)
-                
-                return response
-                
             except requests.exceptions.RequestException as e:
-                last_exception = e
-                attempt_latency = time.time() - attempt_start_time
-                
-                # Record error metrics
-                metrics.increment("npl.api.errors", method=method, error_type=type(e).__name__)
-                metrics.record_error(
-                    type(e).__name__,
-                    str(e),
-                    url=url,
-                    method=method,
-                    attempt=attempt + 1,
-                    latency_seconds=attempt_latency
+                error = e
+                response = getattr(e, "response", None)
+                outcome = self._record_failed_attempt(
+                    e, method, url, attempt, time.time() - attempt_start_time,
+                    retryable=can_retry and is_retryable_exception(e)
                 )
-                
-                # Check if retryable
-                if attempt < self.max_retries and is_retryable_exception(e):
-                    import random
-                    delay = min(1.0 * (2.0 ** attempt), 60.0)
-                    jitter = random.uniform(0, delay * 0.1)
-                    logger.warning(
-                        f"Request failed (attempt {attempt + 1}/{self.max_retries + 1}): {e}. "
-                        f"Retrying in {delay + jitter:.2f}s..."
-                    )
-                    metrics.increment("npl.api.retries", method=method)
-                    time.sleep(delay + jitter)
-                    continue
-                
-                # Non-retryable or max retries exceeded
-                if attempt >= self.max_retries:
-                    logger.error(f"Max retries exceeded for {method} {url}")
-                    raise NPLClientError(
-                        f"Request failed after {self.max_retries + 1} attempts: {e}",
-                        url=url
-                    ) from e
-                
-                raise
-        
-        # Should not reach here, but handle just in case
-        if last_exception:
+            else:
+                outcome = self._record_attempt(
+                    response, method, url, attempt, time.time() - attempt_start_time,
+                    overall_start_time, can_retry
+                )
+            
+            if outcome is _Outcome.OK:
+                return response
+            
+            if outcome is _Outcome.REFRESH_AUTH:
+                self._refresh_after_401()
+                continue
+            
+            if outcome is _Outcome.FATAL:
+                self._raise_fatal(method, url, attempt, response, error, time.time() - attempt_start_time)
+            
+            delay = self._retry_delay(outcome, method, url, attempt, response, error, delay, deadline)
+            time.sleep(delay)
+        
+        # Unreachable: the last attempt always resolves to OK or FATAL
+        raise NPLClientError(f"Request failed: {method} {url}", url=url)
+    
+    # Steps of the retry loop, shared by _request_with_retries and
+    # AsyncNPLClient._arequest_with_retries so both report the same metrics,
+    # errors and activity-log entries
+    
+    def _refresh_if_expiring(self) -> None:
+        """
+        Proactive refresh: renew a token that is about to expire up front, so
+        the request doesn't pay for a 401 plus a retry.
+        """
+        if self._token_expiring():
+            logger.info("Access token about to expire, refreshing before request...")
+            get_metrics().increment("npl.api.proactive_token_refreshes")
+            self.set_auth_token(self.token_refresh_callback())
+    
+    def _refresh_after_401(self) -> None:
+        """Get a new token from token_refresh_callback after a 401."""
+        logger.warning("Authentication failed (401), refreshing token and retrying...")
+        get_metrics().increment("npl.api.token_refreshes")
+        self.set_auth_token(self.token_refresh_callback())
+    
+    def _record_failed_attempt(
+        self,
+        error: Exception,
+        method: str,
+        url: str,
+        attempt: int,
+        attempt_latency: float,
+        retryable: bool
+    ) -> "_Outcome":
+        """Record an attempt that raised a network error and decide whether to retry."""
+        metrics = get_metrics()
+        metrics.increment("npl.api.errors", method=method, error_type=type(error).__name__)
+        metrics.record_error(
+            type(error).__name__,
+            str(error),
+            url=url,
+            method=method,
+            attempt=attempt + 1,
+            latency_seconds=attempt_latency
+        )
+        return _Outcome.RETRY_NET if retryable else _Outcome.FATAL
+    
+    def _record_attempt(
+        self,
+        response,
+        method: str,
+        url: str,
+        attempt: int,
+        attempt_latency: float,
+        overall_start_time: float,
+        can_retry: bool
+    ) -> "_Outcome":
+        """Record an attempt that got a response and classify it."""
+        metrics = get_metrics()
+        metrics.increment("npl.api.calls", method=method, status_code=response.status_code)
+        metrics.record_latency("npl.api.latency", attempt_latency, method=method)
+        get_activity_logger().log_npl_api_call(
+            method=method,
+            endpoint=url.replace(self.base_url, ""),
+            status_code=response.status_code,
+            response_time=attempt_latency
+        )
+        if attempt > 0:
+            metrics.record_latency(
+                "npl.api.latency_with_retries",
+                time.time() - overall_start_time,
+                method=method
+            )
+        outcome = self._classify(response.status_code, can_retry)
+        if outcome is _Outcome.RETRY_5XX:
+            # Engine failures count as errors even when a retry follows; the
+            # final failed attempt is recorded by _raise_fatal
+            metrics.increment("npl.api.errors", status_code=response.status_code, method=method)
+            metrics.record_error(
+                "NPLClientError",
+                f"API error {response.status_code}",
+                url=url,
+                status_code=response.status_code,
+                method=method,
+                attempt=attempt + 1
+            )
+        return outcome
+    
+    def _raise_fatal(
+        self,
+        method: str,
+        url: str,
+        attempt: int,
+        response,
+        error: Optional[Exception],
+        attempt_latency: float
+    ) -> None:
+        """Raise the error for an attempt that will not be retried."""
+        if error is not None:
+            if attempt >= self.max_retries:
+                logger.error(f"Max retries exceeded for {method} {url}")
+                raise NPLClientError(
+                    f"Request failed after {self.max_retries + 1} attempts: {error}",
+                    url=url
+                ) from error
+            raise error
+        
+        metrics = get_metrics()
+        metrics.increment("npl.api.errors", status_code=response.status_code, method=method)
+        metrics.record_error(
+            "NPLClientError",
+            f"API error {response.status_code}",
+            url=url,
+            status_code=response.status_code,
+            method=method
+        )
+        get_activity_logger().log_npl_api_call(
+            method=method,
+            endpoint=url.replace(self.base_url, ""),
+            status_code=response.status_code,
+            response_time=attempt_latency,
+            error=f"HTTP {response.status_code}"
+        )
+        self._handle_response_error(response, url)
+    
+    def _retry_delay(
+        self,
+        outcome: "_Outcome",
+        method: str,
+        url: str,
+        attempt: int,
+        response,
+        error: Optional[Exception],
+        delay: float,
+        deadline: Optional[float]
+    ) -> float:
+        """
+        Pick the backoff before retrying a RETRY_5XX / RETRY_NET attempt.
+        
+        Honors the server's Retry-After; otherwise uses decorrelated jitter so
+        clients that failed together don't retry together. Raises once the
+        retry would overrun total_timeout.
+        """
+        reason = error if error is not None else f"HTTP {response.status_code}"
+        delay = self._next_delay(response, delay)
+        
+        if deadline is not None and time.monotonic() + delay > deadline:
+            logger.error(f"Retry budget of {self.total_timeout}s exhausted for {method} {url}")
+            raise NPLClientError(
+                f"Request failed within {self.total_timeout}s budget "
+                f"after {attempt + 1} attempt(s): {reason}",
+                url=url
+            ) from error
+        
+        logger.warning(
+            f"Request failed (attempt {attempt + 1}/{self.max_retries + 1}): {reason}. "
+            f"Retrying in {delay:.2f}s..."
+        )
+        get_metrics().increment("npl.api.retries", method=method, outcome=outcome.value)
+        return delay
+    
+    def _classify(self, status_code: int, can_retry: bool) -> "_Outcome":
+        """Map a response status to what the retry loop should do next."""
+        if status_code < 400:
+            return _Outcome.OK
+        if not can_retry:
+            return _Outcome.FATAL
+        if status_code == 401:
+            return _Outcome.REFRESH_AUTH if self.token_refresh_callback else _Outcome.FATAL
+        if is_retryable_status_code(status_code):
+            return _Outcome.RETRY_5XX
+        return _Outcome.FATAL
+    
+    def _next_delay(self, response, delay: float) -> float:
+        """Backoff before the next attempt: Retry-After if given, else decorrelated jitter."""
+        retry_after = self._retry_after(response)
+        if retry_after is not None:
+            return min(retry_after, self.backoff_cap)
+        return min(self.backoff_cap, random.uniform(self.backoff_base, delay * 3))
+    
+    @staticmethod
+    def _retry_after(response: Optional[requests.Response]) -> Optional[float]:
+        """Seconds from a numeric Retry-After header, or None if absent/unparseable."""
+        headers = getattr(response, "headers", None)
+        if not headers:
+            return None
+        try:
+            return max(0.0, float(headers.get("Retry-After")))
+        except (TypeError, ValueError):
+            return None
+    
+    def register_schema(
+        self,
+        package: str,
+        protocol_name: str,
+        schema: Dict[str, Any],
+        components: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """
+        Validate create_protocol payloads for a protocol before sending them.
+        
+        NPLToolGenerator registers the creation schema of every protocol it
+        generates tools for, so malformed payloads fail locally instead of
+        costing a round-trip for the engine's 400.
+        
+        Args:
+            package: NPL package name
+            protocol_name: Name of the protocol
+            schema: Request body schema from the OpenAPI spec
+            components: ``components.schemas`` of the spec, for $refs
+        """
+        self._validators[(package, protocol_name)] = compile_payload_validator(schema, components)
+    
+    def _validate_payload(
+        self,
+        package: str,
+        protocol_name: str,
+        payload: Dict[str, Any],
+        url: str
+    ) -> None:
+        """Raise NPLClientError (400) if a registered schema rejects the payload."""
+        validate = self._validators.get((package, protocol_name))
+        if validate is None:
+            return
+        problems = validate(payload)
+        if problems:
+            get_metrics().increment("npl.api.rejected_payloads", protocol=protocol_name)
             raise NPLClientError(
-                f"Request failed: {last_exception}",
+                f"Invalid {protocol_name} payload (400): {'; '.join(problems)}",
+                status_code=400,
                 url=url
-            ) from last_exception
+            )
+    
+    def begin_session(self, max_batch: int = 32, flush_interval: float = 0.002) -> "NPLSession":
+        """
+        Start a pipelined session for creating many protocols.
+        
+        Usage::
+        
+            async with client.begin_session() as session:
+                futures = [session.create_protocol(...) for ... in ...]
+            instances = [f.result() for f in futures]
+        
+        Args:
+            max_batch: Maximum number of requests in flight per batch
+            flush_interval: Seconds to wait for a batch to fill up
+            
+        Returns:
+            NPLSession bound to this client
+        """
+        from .pipeline import NPLSession
+        return NPLSession(self, max_batch=max_batch, flush_interval=flush_interval)
     
     def create_protocol(
         self,
@@ -277,9 +585,12 @@ class NPLClient:
             "@parties": parties,
             **data
         }
+        self._validate_payload(package, protocol_name, payload, url)
         
-        response = self._make_request("POST", url, json=payload)
-        return response.json()
+        response = self._make_request(
+            "POST", url, data=json_dumps_bytes(payload), headers=self._JSON_HEADERS
+        )
+        return json_loads(response.content)
     
     def execute_action(
         self,
@@ -308,16 +619,18 @@ class NPLClient:
         
         url = f"{self.base_url}/npl/{package}/{protocol_name}/{instance_id}/{action_name}"
         
-        headers = {}
+        headers = dict(self._JSON_HEADERS)
         if party:
             headers["X-Party"] = party
         
         params = params or {}
         
-        response = self._make_request("POST", url, json=params, headers=headers)
+        response = self._make_request(
+            "POST", url, data=json_dumps_bytes(params), headers=headers
+        )
         if response.status_code == 204 or not response.content:
             return {}
-        return response.json()
+        return json_loads(response.content)
     
     def get_instance(
         self,
@@ -341,7 +654,7 @@ class NPLClient:
         url = f"{self.base_url}/npl/{package}/{protocol_name}/{instance_id}/"
         
         response = self._make_request("GET", url)
-        return response.json()
+        return json_loads(response.content)
     
     def query_instances(
         self,
@@ -377,7 +690,66 @@ class NPLClient:
             params.update(filters)
         
         response = self._make_request("GET", url, params=params)
-        return response.json()
+        return json_loads(response.content)
+    
+    def stream_list(
+        self,
+        package: str,
+        protocol_name: str,
+        filters: Optional[Dict[str, Any]] = None,
+        page: int = 0,
+        size: int = 20
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate over the instances of one result page without buffering it.
+        
+        Takes the same arguments as query_instances() but yields the entries
+        of the page's ``items`` array (or of a bare top-level array) one at a
+        time. When ijson is installed the body is parsed incrementally from
+        the socket, so callers that stop early (e.g. once they find an ID)
+        never read the rest of the page. Without ijson the page is parsed in
+        one go and then iterated; both paths yield the same values.
+        
+        Args:
+            package: NPL package name
+            protocol_name: Name of the protocol
+            filters: Optional query filters
+            page: Page number (0-indexed)
+            size: Page size
+            
+        Yields:
+            instance: Protocol instance data
+        """
+        logger.info(f"Streaming instances of {protocol_name}")
+        
+        url = f"{self.base_url}/npl/{package}/{protocol_name}"
+        
+        params = {
+            "page": page + 1,  # NPL Engine uses 1-indexed pages
+            "pageSize": size   # NPL Engine uses pageSize, not size
+        }
+        
+        if filters:
+            params.update(filters)
+        
+        response = self._make_request("GET", url, params=params, stream=True)
+        try:
+            if ijson is not None:
+                response.raw.decode_content = True
+                # Floats rather than Decimals, as json_loads returns
+                events = ijson.parse(response.raw, use_float=True)
+                first = next(events)
+                # The first event tells a bare array from an {"items": [...]} page
+                prefix = "item" if first[1] == "start_array" else "items.item"
+                yield from ijson.items(itertools.chain([first], events), prefix)
+                return
+            
+            result = json_loads(response.content)
+            if isinstance(result, dict):
+                result = result.get("items", [])
+            yield from result
+        finally:
+            response.close()
     
     def get_openapi_spec(self, package: str) -> Dict[str, Any]:
         """
@@ -394,5 +766,5 @@ class NPLClient:
         url = f"{self.base_url}/npl/{package}/-/openapi.json"
         
         response = self._make_request("GET", url)
-        return response.json()
+        return json_loads(response.content)
 
@@ -9,8 +9,26 @@ from typing import Dict, Any, Optional, List
 from pathlib import Path
 from dotenv import load_dotenv
 
+# Set once .env has been loaded; inherited by subprocesses (e.g. pytest-xdist
+# workers), which already have its values in their environment
+_DOTENV_LOADED_VAR = "_ADK_NPL_DOTENV_LOADED"
+
+
+def load_env_once() -> None:
+    """
+    Load the .env file into os.environ, once per process tree.
+    
+    Set ADK_NPL_AUTOLOAD_ENV=0 to skip loading entirely (e.g. in tests that
+    control the environment themselves).
+    """
+    if os.environ.get(_DOTENV_LOADED_VAR) or os.getenv("ADK_NPL_AUTOLOAD_ENV", "1") != "1":
+        return
+    load_dotenv()
+    os.environ[_DOTENV_LOADED_VAR] = "1"
+
+
 # Load .env file if it exists
-load_dotenv()
+load_env_once()
 
 
 class NPLConfig:
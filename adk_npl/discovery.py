@@ -6,6 +6,7 @@ Discovers available NPL packages by parsing Swagger UI or reading configuration.
 
 import re
 import os
+import asyncio
 import json
 import requests
 import logging
@@ -18,6 +19,11 @@ from .config import NPLConfig
 
 logger = logging.getLogger(__name__)
 
+# Package path in a /npl/{package}/-/openapi.json URL, e.g.
+#   - /npl/protocolpackage/-/openapi.json → "protocolpackage"
+#   - /npl/objects/iou/-/openapi.json → "objects/iou"
+_OPENAPI_PACKAGE_RE = re.compile(r'/npl/([^"\'/]+(?:/[^"\'/]+)*)/-/openapi\.json')
+
 
 class NPLPackageDiscovery:
     """
@@ -51,9 +57,11 @@ class NPLPackageDiscovery:
         Raises:
             PackageDiscoveryError: If discovery fails
         """
-        # Try Swagger UI first (primary method)
+        # Try Swagger UI first (primary method). The fetch runs in a worker
+        # thread so concurrent discoveries (e.g. agents created with
+        # asyncio.gather) don't serialize on the event loop.
         try:
-            packages = self._discover_from_swagger_ui()
+            packages = await asyncio.to_thread(self._discover_from_swagger_ui)
             if packages:
                 logger.info(f"✅ Discovered {len(packages)} package(s) from Swagger UI: {', '.join(packages)}")
                 return packages
@@ -110,11 +118,7 @@ class NPLPackageDiscovery:
         html = response.text
         
         # Extract all /npl/{package}/-/openapi.json URLs
-        # Pattern matches:
-        #   - /npl/protocolpackage/-/openapi.json → "protocolpackage"
-        #   - /npl/objects/iou/-/openapi.json → "objects/iou"
-        regex = re.compile(r'/npl/([^"\'/]+(?:/[^"\'/]+)*)/-/openapi\.json')
-        matches = regex.findall(html)
+        matches = _OPENAPI_PACKAGE_RE.findall(html)
         
         # Get unique package names
         packages = list(set(matches))
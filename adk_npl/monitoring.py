@@ -4,17 +4,24 @@ Monitoring and observability utilities for ADK-NPL integration.
 Provides structured logging, metrics collection, and health checks.
 """
 
-import json
+import asyncio
+import math
+import sys
 import time
 import logging
-import requests
 from typing import Dict, Any, Optional, List
 from datetime import datetime, timezone
-from collections import defaultdict
+from collections import Counter, defaultdict, deque
+from itertools import islice
 from threading import Lock
 
+from .utils import json_dumps_bytes, json_loads
+
 logger = logging.getLogger(__name__)
 
+# Latencies are stored as integer microseconds; converted back to seconds on read
+_MICROS = 1_000_000
+
 
 class StructuredLogger:
     """
@@ -23,6 +30,8 @@ class StructuredLogger:
     Useful for log aggregation systems (ELK, CloudWatch, etc.).
     """
     
+    __slots__ = ("logger", "use_json")
+    
     def __init__(self, name: str, use_json: bool = False):
         """
         Initialize structured logger.
@@ -44,33 +53,122 @@ class StructuredLogger:
                 "logger": self.logger.name,
                 **kwargs
             }
-            return json.dumps(log_entry)
+            return json_dumps_bytes(log_entry).decode()
         else:
             # Plain text format with extra fields
-            extra_str = ", ".join(f"{k}={v}" for k, v in kwargs.items())
-            if extra_str:
+            if kwargs:
+                extra_str = ", ".join([f"{k}={v}" for k, v in kwargs.items()])
                 return f"{message} | {extra_str}"
             return message
     
+    # Each method checks the level first so filtered records are never formatted
+    
     def info(self, message: str, **kwargs):
         """Log info message."""
-        formatted = self._format_message("INFO", message, **kwargs)
-        self.logger.info(formatted)
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info(self._format_message("INFO", message, **kwargs))
     
     def warning(self, message: str, **kwargs):
         """Log warning message."""
-        formatted = self._format_message("WARNING", message, **kwargs)
-        self.logger.warning(formatted)
+        if self.logger.isEnabledFor(logging.WARNING):
+            self.logger.warning(self._format_message("WARNING", message, **kwargs))
     
     def error(self, message: str, **kwargs):
         """Log error message."""
-        formatted = self._format_message("ERROR", message, **kwargs)
-        self.logger.error(formatted)
+        if self.logger.isEnabledFor(logging.ERROR):
+            self.logger.error(self._format_message("ERROR", message, **kwargs))
     
     def debug(self, message: str, **kwargs):
         """Log debug message."""
-        formatted = self._format_message("DEBUG", message, **kwargs)
-        self.logger.debug(formatted)
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(self._format_message("DEBUG", message, **kwargs))
+
+
+class LatencySketch:
+    """
+    Fixed-memory latency distribution with relative-error quantiles.
+    
+    Samples are counted in logarithmic buckets (DDSketch-style): bucket i covers
+    (gamma**(i-1), gamma**i], so every quantile is within ``relative_accuracy``
+    of the true value. Count, sum, min and max are tracked exactly. Inserting is
+    O(1) and memory is bounded by the dynamic range of the samples (a few
+    hundred buckets for 1µs-100s at 1%), not by the number of samples.
+    
+    The sketch is unit-agnostic; MetricsCollector feeds it integer
+    microseconds so the running sum stays an exact int.
+    """
+    
+    __slots__ = (
+        "relative_accuracy", "_gamma", "_log_gamma", "_buckets", "_zero_count",
+        "count", "total", "min", "max",
+    )
+    
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._buckets: Dict[int, int] = defaultdict(int)
+        self._zero_count = 0  # samples <= 0, which have no log bucket
+        self.count = 0
+        self.total = 0
+        self.min = math.inf
+        self.max = -math.inf
+    
+    def add(self, value: float):
+        """Record one sample."""
+        if value > 0:
+            self._buckets[math.ceil(math.log(value) / self._log_gamma)] += 1
+        else:
+            self._zero_count += 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+    
+    def merge(self, other: "LatencySketch"):
+        """Fold another sketch (e.g. from another thread) into this one."""
+        if other._gamma != self._gamma:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for index, n in other._buckets.items():
+            self._buckets[index] += n
+        self._zero_count += other._zero_count
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+    
+    def quantile(self, q: float) -> float:
+        """
+        Value at quantile q (0..1), using the same upper nearest-rank
+        convention as sorted(values)[int(n * q)].
+        """
+        if self.count == 0:
+            raise ValueError("Empty sketch")
+        rank = min(int(self.count * q), self.count - 1)
+        seen = self._zero_count
+        if rank < seen:
+            return self.min
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if rank < seen:
+                # Bucket midpoint (in relative terms), clamped to the observed range
+                value = 2 * self._gamma ** index / (self._gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+    
+    def stats(self) -> Dict[str, float]:
+        """Summary in the shape returned by MetricsCollector.get_latency_stats()."""
+        return {
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+            "avg": self.total / self.count,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99)
+        }
 
 
 class MetricsCollector:
@@ -80,13 +178,26 @@ class MetricsCollector:
     Thread-safe for use in multi-threaded environments.
     """
     
+    __slots__ = (
+        "_lock", "_counters", "_histograms", "_max_errors", "_errors", "_error_counts",
+        "_key_cache", "_max_cached_keys", "_snapshot", "_refresh_task",
+    )
+    
     def __init__(self):
         """Initialize metrics collector."""
         self._lock = Lock()
-        self._counters: Dict[str, int] = defaultdict(int)
-        self._histograms: Dict[str, List[float]] = defaultdict(list)
-        self._errors: List[Dict[str, Any]] = []
+        self._counters: Counter = Counter()
+        self._histograms: Dict[str, LatencySketch] = defaultdict(LatencySketch)
         self._max_errors = 100  # Keep last 100 errors
+        self._errors: deque = deque(maxlen=self._max_errors)
+        # Per-type totals, unlike _errors not capped at _max_errors
+        self._error_counts: Counter = Counter()
+        # (metric name, tag items in call order) -> interned formatted key
+        self._key_cache: Dict[tuple, str] = {}
+        self._max_cached_keys = 4096
+        # Summary served to readers while the refresh task (see start()) runs
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._refresh_task: Optional[asyncio.Task] = None
     
     def increment(self, metric_name: str, value: int = 1, **tags):
         """
@@ -110,12 +221,10 @@ class MetricsCollector:
             latency_seconds: Latency in seconds
             **tags: Optional tags for the metric
         """
+        micros = round(latency_seconds * _MICROS)
         with self._lock:
             key = self._format_key(metric_name, tags)
-            self._histograms[key].append(latency_seconds)
-            # Keep only last 1000 measurements per metric
-            if len(self._histograms[key]) > 1000:
-                self._histograms[key] = self._histograms[key][-1000:]
+            self._histograms[key].add(micros)
     
     def record_error(self, error_type: str, error_message: str, **context):
         """
@@ -133,17 +242,30 @@ class MetricsCollector:
                 "message": error_message,
                 **context
             }
-            self._errors.append(error_entry)
-            # Keep only last N errors
-            if len(self._errors) > self._max_errors:
-                self._errors = self._errors[-self._max_errors:]
+            self._error_counts[error_type] += 1
+            self._errors.append(error_entry)  # deque drops the oldest beyond _max_errors
     
     def _format_key(self, metric_name: str, tags: Dict[str, Any]) -> str:
-        """Format metric key with tags."""
-        if tags:
-            tag_str = ",".join(f"{k}={v}" for k, v in sorted(tags.items()))
-            return f"{metric_name}[{tag_str}]"
-        return metric_name
+        """Format metric key with tags (memoized; called with the lock held)."""
+        if not tags:
+            return metric_name
+        
+        try:
+            cache_key = (metric_name, tuple(tags.items()))
+            key = self._key_cache.get(cache_key)
+        except TypeError:  # unhashable tag value
+            cache_key = key = None
+        if key is not None:
+            return key
+        
+        tag_str = ",".join([f"{k}={v}" for k, v in sorted(tags.items())])
+        key = sys.intern("".join((metric_name, "[", tag_str, "]")))
+        if cache_key is not None:
+            if len(self._key_cache) >= self._max_cached_keys:
+                # FIFO eviction keeps high-cardinality tags from growing the cache
+                del self._key_cache[next(iter(self._key_cache))]
+            self._key_cache[cache_key] = key
+        return key
     
     def get_counters(self) -> Dict[str, int]:
         """Get all counter metrics."""
@@ -158,28 +280,25 @@ class MetricsCollector:
             metric_name: Name of the metric
             **tags: Tags to filter by
             
+        Count, min, max and avg are exact; percentiles come from a
+        LatencySketch and are within 1% of the true value.
+        
         Returns:
-            Dict with min, max, avg, p50, p95, p99, or None if no data
+            Dict with count, min, max, avg, p50, p95, p99, or None if no data
         """
         with self._lock:
             key = self._format_key(metric_name, tags)
-            values = self._histograms.get(key, [])
+            sketch = self._histograms.get(key)
             
-            if not values:
+            if sketch is None or sketch.count == 0:
                 return None
             
-            sorted_values = sorted(values)
-            n = len(sorted_values)
-            
-            return {
-                "count": n,
-                "min": min(values),
-                "max": max(values),
-                "avg": sum(values) / n,
-                "p50": sorted_values[int(n * 0.5)],
-                "p95": sorted_values[int(n * 0.95)],
-                "p99": sorted_values[int(n * 0.99)]
-            }
+            stats = sketch.stats()
+        
+        return {
+            name: value if name == "count" else value / _MICROS
+            for name, value in stats.items()
+        }
     
     def get_errors(self, limit: int = 10) -> List[Dict[str, Any]]:
         """
@@ -192,27 +311,86 @@ class MetricsCollector:
             List of error entries (most recent first)
         """
         with self._lock:
-            return list(reversed(self._errors[-limit:]))
+            return list(islice(reversed(self._errors), limit))
+    
+    def get_error_counts(self) -> Dict[str, int]:
+        """
+        Get the number of errors recorded per error type.
+        
+        Counts every error since the last reset, including those that have
+        already dropped out of get_errors().
+        
+        Returns:
+            Dict mapping error type to count
+        """
+        with self._lock:
+            return dict(self._error_counts)
     
-    def get_summary(self) -> Dict[str, Any]:
+    def get_summary(self, force: bool = False) -> Dict[str, Any]:
         """
         Get summary of all metrics.
         
+        While the refresh task is running (see start()), returns the snapshot
+        it last built, so frequent scrapes don't each walk every counter.
+        Each caller gets its own top-level dict; the nested sections are
+        shared with the snapshot and should be treated as read-only.
+        
+        Args:
+            force: Recompute now instead of returning the snapshot
+        
         Returns:
             Dict with counters, latency stats, and recent errors
         """
+        snapshot = self._snapshot
+        if snapshot is not None and not force:
+            return dict(snapshot)
+        return self._compute_summary()
+    
+    def _compute_summary(self) -> Dict[str, Any]:
         return {
             "counters": self.get_counters(),
+            "error_counts": self.get_error_counts(),
             "recent_errors": self.get_errors(limit=10),
             "timestamp": datetime.now(timezone.utc).isoformat()
         }
     
+    async def start(self, interval: float = 1.0):
+        """
+        Start rebuilding the summary snapshot every ``interval`` seconds.
+        
+        Meant for long-running services (e.g. a FastAPI lifespan hook);
+        call stop() on shutdown.
+        """
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return
+        self._snapshot = self._compute_summary()
+        self._refresh_task = asyncio.create_task(self._refresh_loop(interval))
+    
+    async def stop(self):
+        """Stop the refresh task; get_summary() computes inline again."""
+        task, self._refresh_task = self._refresh_task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._snapshot = None
+    
+    async def _refresh_loop(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            self._snapshot = self._compute_summary()
+    
     def reset(self):
         """Reset all metrics (useful for testing)."""
         with self._lock:
             self._counters.clear()
             self._histograms.clear()
             self._errors.clear()
+            self._error_counts.clear()
+        if self._snapshot is not None:
+            self._snapshot = self._compute_summary()
 
 
 # Global metrics collector instance
@@ -229,34 +407,65 @@ class HealthCheck:
     Health check utilities for NPL Engine connectivity.
     """
     
-    def __init__(self, npl_client):
+    __slots__ = ("npl_client", "failure_cache_ttl", "_failure_cache")
+    
+    def __init__(self, npl_client, failure_cache_ttl: float = 5.0):
         """
         Initialize health check.
         
         Args:
             npl_client: NPLClient instance
+            failure_cache_ttl: Seconds to reuse an unhealthy/unreachable result
+                before probing again (default: 5.0, 0 disables)
         """
         self.npl_client = npl_client
+        self.failure_cache_ttl = failure_cache_ttl
+        # (time.monotonic() of the probe, result) of the last failed probe
+        self._failure_cache: Optional[tuple] = None
     
-    def check_engine_health(self) -> Dict[str, Any]:
+    def check_engine_health(self, force: bool = False) -> Dict[str, Any]:
         """
         Check NPL Engine health.
         
+        A failed probe is reused for failure_cache_ttl seconds, so frequent
+        polling during an outage doesn't open a connection (and wait for its
+        timeout) on every call. Healthy results are never cached.
+        
+        Args:
+            force: Probe the engine even if a failure is cached
+            
         Returns:
             Dict with health status and details
         """
+        cached = self._failure_cache
+        if (
+            not force
+            and cached is not None
+            and time.monotonic() - cached[0] < self.failure_cache_ttl
+        ):
+            return cached[1]
+        
+        result = self._probe_engine()
+        self._failure_cache = (
+            (time.monotonic(), result) if result["status"] != "healthy" else None
+        )
+        return result
+    
+    def _probe_engine(self) -> Dict[str, Any]:
+        """Request the engine's health endpoint once."""
         try:
             health_url = f"{self.npl_client.base_url}/actuator/health"
             
             start_time = time.time()
-            response = requests.get(health_url, timeout=5.0)
+            # The client's session keeps the connection alive between probes
+            response = self.npl_client.session.get(health_url, timeout=5.0)
             latency = time.time() - start_time
             
             if response.ok:
                 return {
                     "status": "healthy",
                     "latency_seconds": latency,
-                    "details": response.json() if response.content else {}
+                    "details": json_loads(response.content) if response.content else {}
                 }
             else:
                 return {
@@ -0,0 +1,120 @@
+"""
+Pipelined protocol creation.
+
+NPLSession buffers create_protocol calls and sends them in concurrent
+batches, so creating many protocols costs roughly one round-trip per batch
+instead of one per protocol. The engine has no batch endpoint; a batch is
+a set of concurrent requests.
+"""
+
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Dict, Optional, Set
+
+from .monitoring import get_metrics
+
+logger = logging.getLogger(__name__)
+
+
+class NPLSession:
+    """
+    Buffer of pending protocol creations for one client.
+    
+    Use as an async context manager (see NPLClient.begin_session()):
+    create_protocol() returns a future immediately; requests are flushed
+    once ``max_batch`` are pending or ``flush_interval`` seconds after the
+    first one was queued, and leaving the block waits for all of them.
+    
+    With an AsyncNPLClient requests run on its event loop; with the sync
+    NPLClient each runs in a worker thread.
+    """
+    
+    def __init__(self, client, max_batch: int = 32, flush_interval: float = 0.002):
+        """
+        Initialize session.
+        
+        Args:
+            client: NPLClient or AsyncNPLClient to send requests with
+            max_batch: Maximum number of requests in flight per batch (default: 32)
+            flush_interval: Seconds to wait for a batch to fill up (default: 0.002)
+        """
+        self.client = client
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._pending: deque = deque()
+        self._outstanding: Set[asyncio.Future] = set()
+        self._ready: Optional[asyncio.Event] = None
+        self._flusher: Optional[asyncio.Task] = None
+    
+    async def __aenter__(self) -> "NPLSession":
+        self._ready = asyncio.Event()
+        self._flusher = asyncio.create_task(self._flush_loop())
+        return self
+    
+    async def __aexit__(self, *exc_info) -> None:
+        try:
+            await self.drain()
+        finally:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+    
+    def create_protocol(
+        self,
+        package: str,
+        protocol_name: str,
+        parties: Dict[str, str],
+        data: Dict[str, Any]
+    ) -> asyncio.Future:
+        """
+        Queue a protocol creation.
+        
+        Takes the same arguments as NPLClient.create_protocol().
+        
+        Returns:
+            Future resolving to the created instance (or raising its error)
+        """
+        if self._ready is None:
+            raise RuntimeError("NPLSession must be used as 'async with client.begin_session()'")
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(((package, protocol_name, parties, data), future))
+        self._outstanding.add(future)
+        future.add_done_callback(self._outstanding.discard)
+        self._ready.set()
+        return future
+    
+    async def drain(self) -> None:
+        """Wait until every queued request has completed."""
+        while self._outstanding:
+            await asyncio.gather(*list(self._outstanding), return_exceptions=True)
+    
+    async def _flush_loop(self) -> None:
+        while True:
+            await self._ready.wait()
+            if len(self._pending) < self.max_batch:
+                await asyncio.sleep(self.flush_interval)
+            self._ready.clear()
+            
+            batch = [self._pending.popleft() for _ in range(min(self.max_batch, len(self._pending)))]
+            if self._pending:
+                self._ready.set()
+            if batch:
+                get_metrics().increment("npl.session.batches")
+                await asyncio.gather(*(self._send(args, future) for args, future in batch))
+    
+    async def _send(self, args: tuple, future: asyncio.Future) -> None:
+        acreate = getattr(self.client, "acreate_protocol", None)
+        try:
+            if acreate is not None:
+                result = await acreate(*args)
+            else:
+                result = await asyncio.to_thread(self.client.create_protocol, *args)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+        else:
+            if not future.done():
+                future.set_result(result)
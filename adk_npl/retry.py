@@ -1,12 +1,14 @@
 """
 Retry utilities for resilient NPL Engine calls.
 
-Provides exponential backoff retry logic for handling transient failures.
+Provides exponential backoff retry logic for handling transient failures,
+and a circuit breaker that fails fast while an endpoint is down.
 """
 
 import time
 import logging
-from typing import Callable, TypeVar, Optional, List
+from threading import Lock
+from typing import Callable, Dict, TypeVar, Optional, List
 from functools import wraps
 
 logger = logging.getLogger(__name__)
@@ -149,3 +151,93 @@ def retry_with_backoff(
         return wrapper
     return decorator
 
+
+class CircuitBreaker:
+    """
+    Closed/open/half-open circuit breaker for one endpoint.
+    
+    After ``failure_threshold`` consecutive failed calls the circuit opens and
+    allow_request() refuses calls without touching the network. Once
+    ``reset_timeout`` seconds have passed, a single probe call is admitted
+    (half-open): success closes the circuit, failure re-opens it.
+    
+    Thread-safe; breakers from for_endpoint() are shared by all clients of the
+    same endpoint.
+    """
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    _registry: Dict[str, "CircuitBreaker"] = {}
+    _registry_lock = Lock()
+    
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        Initialize circuit breaker.
+        
+        Args:
+            failure_threshold: Consecutive failures that open the circuit (default: 5)
+            reset_timeout: Seconds to stay open before admitting a probe (default: 30.0)
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failure_count = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = Lock()
+    
+    @classmethod
+    def for_endpoint(cls, endpoint: str, **kwargs) -> "CircuitBreaker":
+        """Get (or create with ``kwargs``) the shared breaker for an endpoint."""
+        with cls._registry_lock:
+            breaker = cls._registry.get(endpoint)
+            if breaker is None:
+                breaker = cls._registry[endpoint] = cls(**kwargs)
+            return breaker
+    
+    @classmethod
+    def reset_all(cls):
+        """Forget all shared breakers (useful for testing)."""
+        with cls._registry_lock:
+            cls._registry.clear()
+    
+    def allow_request(self) -> bool:
+        """Whether a call may go out now; admits one probe when half-open."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+    
+    def record_success(self):
+        """Record a call that reached the endpoint; closes the circuit."""
+        with self._lock:
+            self.state = self.CLOSED
+            self.failure_count = 0
+            self._probe_in_flight = False
+    
+    def record_failure(self) -> bool:
+        """
+        Record a failed call.
+        
+        Returns:
+            True if this failure opened the circuit
+        """
+        with self._lock:
+            self._probe_in_flight = False
+            self.failure_count += 1
+            if self.state == self.HALF_OPEN or (
+                self.state == self.CLOSED and self.failure_count >= self.failure_threshold
+            ):
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                return True
+            return False
@@ -5,12 +5,20 @@ Generates Python functions with explicit typed parameters from OpenAPI schemas,
 making them self-documenting for LLM consumption.
 """
 
+import asyncio
+import copy
+import hashlib
+import json
 import logging
 import inspect
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional, Callable, get_type_hints
 from google.adk.tools import FunctionTool
 
 from .client import NPLClient
+from .async_client import AsyncNPLClient
 from .discovery import NPLPackageDiscovery
 from .protocol_memory import NPLProtocolMemory, create_memory_tools, auto_track_result
 from .utils import (
@@ -138,6 +146,12 @@ class NPLToolGenerator:
         }
     }
     
+    # One precompiled matcher per category, checked in ERROR_PATTERNS order
+    _ERROR_MATCHERS = [
+        (category, re.compile("|".join(re.escape(p) for p in config["patterns"])), config)
+        for category, config in ERROR_PATTERNS.items()
+    ]
+    
     @classmethod
     def _create_structured_error(cls, error: Exception, action_name: str = "") -> Dict[str, Any]:
         """
@@ -160,8 +174,8 @@ class NPLToolGenerator:
         retryable = False
         guidance = "An unexpected error occurred. Check the error message for details."
         
-        for category, config in cls.ERROR_PATTERNS.items():
-            if any(pattern in error_str for pattern in config["patterns"]):
+        for category, matcher, config in cls._ERROR_MATCHERS:
+            if matcher.search(error_str):
                 error_type = category
                 retryable = config["retryable"]
                 guidance = config["guidance"]
@@ -177,12 +191,16 @@ class NPLToolGenerator:
             "hint": "If retryable=True, check the protocol state and try again. If retryable=False, adjust your parameters."
         }
 
+    # Upper bound on concurrent OpenAPI spec fetches in generate_tools
+    SPEC_FETCH_CONCURRENCY = 10
+    
     def __init__(
         self,
         npl_client: NPLClient,
         cache_ttl: float = 300.0,
         protocol_memory: Optional[NPLProtocolMemory] = None,
-        agent_id: str = "default"
+        agent_id: str = "default",
+        read_cache_ttl: float = 2.0
     ):
         """
         Initialize tool generator.
@@ -192,9 +210,17 @@ class NPLToolGenerator:
             cache_ttl: Cache TTL in seconds (default: 5 minutes)
             protocol_memory: Optional memory for tracking protocol instances
             agent_id: Agent identifier for memory scoping
+            read_cache_ttl: How long *_get / *_list results are reused, in
+                seconds (0 disables). Kept short because other parties can
+                change protocol state; the agent's own create/action calls
+                invalidate the protocol's entries immediately.
         """
         self.npl_client = npl_client
         self.cache = Cache(default_ttl=cache_ttl)
+        self.read_cache_ttl = read_cache_ttl
+        self._read_cache = Cache(default_ttl=read_cache_ttl)
+        self._read_cache_keys: Dict[str, set] = {}
+        self._read_cache_lock = threading.Lock()
         self._tools_cache: Optional[List[FunctionTool]] = None
         self._cache_time: float = 0.0
         self.agent_id = agent_id
@@ -234,8 +260,20 @@ class NPLToolGenerator:
         
         all_tools = []
         
+        # Fetch all OpenAPI specs concurrently (bounded to stay within the
+        # engine's connection pool); generation below stays sequential
+        # because it shares per-package schema state
+        semaphore = asyncio.Semaphore(self.SPEC_FETCH_CONCURRENCY)
+        specs = await asyncio.gather(
+            *(self._fetch_openapi_spec(package, semaphore) for package in packages),
+            return_exceptions=True
+        )
+        
         # Process each package
-        for package in packages:
+        for package, spec in zip(packages, specs):
+            if isinstance(spec, Exception):
+                logger.error(f"❌ Failed to generate tools for package '{package}': {spec}")
+                continue
             try:
                 tools = self._generate_tools_for_package(package)
                 all_tools.extend(tools)
@@ -268,6 +306,37 @@ class NPLToolGenerator:
         age = time.time() - self._cache_time
         return age < 300.0  # Default 5 minutes
     
+    async def _fetch_openapi_spec(
+        self,
+        package: str,
+        semaphore: Optional[asyncio.Semaphore] = None
+    ) -> Dict[str, Any]:
+        """
+        Fetch (and cache) a package's OpenAPI spec without blocking the event loop.
+        
+        An AsyncNPLClient fetches natively (multiplexed over its connection);
+        the sync client is run in a worker thread.
+        
+        Args:
+            package: Package name
+            semaphore: Optional limit on concurrent fetches
+            
+        Returns:
+            OpenAPI specification
+        """
+        cache_key = f"openapi_spec_{package}"
+        spec = self.cache.get(cache_key)
+        
+        if spec is None:
+            async with semaphore or asyncio.Semaphore(self.SPEC_FETCH_CONCURRENCY):
+                if isinstance(self.npl_client, AsyncNPLClient):
+                    spec = await self.npl_client.aget_openapi_spec(package)
+                else:
+                    spec = await asyncio.to_thread(self.npl_client.get_openapi_spec, package)
+            self.cache.set(cache_key, spec)
+        
+        return spec
+    
     def _generate_tools_for_package(self, package: str) -> List[FunctionTool]:
         """
         Generate tools for a specific package.
@@ -333,8 +402,73 @@ class NPLToolGenerator:
             list_func = self._create_list_instances_function(package, protocol_name)
             tools.append(FunctionTool(list_func, require_confirmation=False))
         
+        # One tool to fetch several instances (of any of these protocols) at once
+        if protocols_with_tools:
+            batch_func = self._create_batch_get_function(package, sorted(protocols_with_tools))
+            tools.append(FunctionTool(batch_func, require_confirmation=False))
+        
         return tools
     
+    def _cached_read(
+        self,
+        protocol_name: str,
+        endpoint: str,
+        params: Dict[str, Any],
+        fetch: Callable[[], Any]
+    ) -> Any:
+        """
+        Serve an idempotent read from the short-lived read cache.
+        
+        Entries are keyed by endpoint and a hash of the parameters, and tagged
+        with the protocol so _invalidate_reads() can drop them. Only successful
+        dict results are cached; callers get a deep copy, so mutating a
+        result (including nested protocol data) never alters the cache.
+        """
+        if self.read_cache_ttl <= 0:
+            return fetch()
+        
+        digest = hashlib.blake2b(
+            json.dumps(params, sort_keys=True, default=str).encode(), digest_size=16
+        ).hexdigest()
+        key = f"{endpoint}:{digest}"
+        
+        with self._read_cache_lock:
+            cached = self._read_cache.get(key)
+        if cached is not None:
+            return copy.deepcopy(cached)
+        
+        result = fetch()
+        if isinstance(result, dict) and result.get("success"):
+            with self._read_cache_lock:
+                self._read_cache.set(key, copy.deepcopy(result))
+                self._read_cache_keys.setdefault(protocol_name, set()).add(key)
+        return result
+    
+    def _read_instance(self, package: str, protocol_name: str, instance_id: str) -> Any:
+        """Get a protocol instance through the read cache (raises on client errors)."""
+        def fetch():
+            result = self.npl_client.get_instance(
+                package=package,
+                protocol_name=protocol_name,
+                instance_id=instance_id
+            )
+            if isinstance(result, dict):
+                result["success"] = True
+            return result
+        
+        return self._cached_read(
+            protocol_name,
+            f"{package}/{protocol_name}/get",
+            {"instance_id": instance_id},
+            fetch
+        )
+    
+    def _invalidate_reads(self, protocol_name: str) -> None:
+        """Drop cached reads for a protocol after a (possibly) mutating call."""
+        with self._read_cache_lock:
+            for key in self._read_cache_keys.pop(protocol_name, ()):
+                self._read_cache.invalidate(key)
+    
     def _resolve_ref(self, ref: str) -> Dict[str, Any]:
         """Resolve a $ref to its schema definition."""
         if ref.startswith("#/components/schemas/"):
@@ -642,6 +776,9 @@ class NPLToolGenerator:
         summary = method_spec.get("summary", f"Create {protocol_name} instance")
         schema = self._get_schema_for_path(method_spec)
         
+        # Let the client reject malformed payloads before they reach the engine
+        self.npl_client.register_schema(package, protocol_name, schema, self._schemas)
+        
         # Flatten schema to get parameters
         params = self._flatten_schema(schema)
         parties = self._extract_parties(schema)
@@ -759,6 +896,7 @@ Error Handling:
                     parties=parties_dict,
                     data=data
                 )
+                self._invalidate_reads(protocol_name)
                 # Add success indicator for clarity
                 if isinstance(result, dict) and "@id" in result:
                     result["success"] = True
@@ -855,6 +993,7 @@ Error Handling:
                     party=party,
                     params=kwargs
                 )
+                self._invalidate_reads(protocol_name)
                 # Add success indicator for clarity
                 if result is None:
                     # Update state in memory for void actions (state transitions)
@@ -917,19 +1056,92 @@ Usage Pattern:
             """Get a protocol instance by ID."""
             try:
                 instance_id = kwargs.get("instance_id")
-                result = self.npl_client.get_instance(
-                    package=package,
-                    protocol_name=protocol_name,
-                    instance_id=instance_id
-                )
-                if isinstance(result, dict):
-                    result["success"] = True
-                return result
+                return self._read_instance(package, protocol_name, instance_id)
             except Exception as e:
                 return NPLToolGenerator._create_structured_error(e, f"{protocol_name}_get")
         
         return create_typed_function(func_name, doc, all_params, impl)
     
+    # Upper bound on concurrent GETs issued by one batch_get call
+    BATCH_GET_MAX_WORKERS = 8
+    
+    def _create_batch_get_function(
+        self,
+        package: str,
+        protocol_names: List[str]
+    ) -> Callable:
+        """
+        Create a function that gets several protocol instances in one tool call.
+        
+        The NPL Engine has no batch read endpoint, so the individual GETs are
+        issued concurrently and the call takes about as long as the slowest one.
+        """
+        func_name = f"npl_{package}_batch_get"
+        
+        doc = f"""Get several protocol instances in package '{package}' in one call.
+
+Prefer this over calling several *_get tools one after another, e.g. when checking
+the state of an offer and its purchase order after a state_error.
+
+Args:
+    instance_refs: str (required) - Comma-separated 'Protocol:instance_id' pairs,
+        e.g. 'Offer:1234-...,PurchaseOrder:5678-...'.
+        Protocols: {", ".join(protocol_names)}
+
+Returns:
+    - success: True if every instance was fetched
+    - items: Dict mapping each 'Protocol:instance_id' to the instance (with @id and @state)
+      or to a structured error for that instance
+    - count: Number of instances requested
+"""
+        
+        all_params = [
+            {"name": "instance_refs", "type": "str", "required": True, "nullable": False}
+        ]
+        known_protocols = set(protocol_names)
+        
+        def fetch(ref: str) -> Dict[str, Any]:
+            protocol_name, _, instance_id = ref.partition(":")
+            protocol_name, instance_id = protocol_name.strip(), instance_id.strip()
+            try:
+                if protocol_name not in known_protocols or not instance_id:
+                    raise ValueError(
+                        f"Invalid reference '{ref}': expected 'Protocol:instance_id' "
+                        f"with Protocol one of {sorted(known_protocols)}"
+                    )
+                return self._read_instance(package, protocol_name, instance_id)
+            except Exception as e:
+                return NPLToolGenerator._create_structured_error(e, f"{protocol_name}_get")
+        
+        def impl(**kwargs) -> Dict[str, Any]:
+            """Get several protocol instances concurrently."""
+            refs = list(dict.fromkeys(
+                ref.strip() for ref in (kwargs.get("instance_refs") or "").split(",") if ref.strip()
+            ))
+            if not refs:
+                return NPLToolGenerator._create_structured_error(
+                    ValueError("Invalid instance_refs: no 'Protocol:instance_id' pairs given"),
+                    "batch_get"
+                )
+            
+            if len(refs) == 1:
+                results = [fetch(refs[0])]
+            else:
+                workers = min(len(refs), NPLToolGenerator.BATCH_GET_MAX_WORKERS)
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    results = list(pool.map(fetch, refs))
+            
+            items = dict(zip(refs, results))
+            return {
+                "success": all(
+                    not isinstance(r, dict) or r.get("success", True) for r in results
+                ),
+                "items": items,
+                "count": len(items)
+            }
+        
+        return create_typed_function(func_name, doc, all_params, impl)
+    
     def _create_list_instances_function(
         self,
         package: str,
@@ -981,18 +1193,26 @@ Usage Pattern:
                 if state:
                     filters["state"] = state
                 
-                result = self.npl_client.query_instances(
-                    package=package,
-                    protocol_name=protocol_name,
-                    filters=filters if filters else None,
-                    page=page - 1,  # query_instances expects 0-indexed
-                    size=page_size
+                def fetch():
+                    result = self.npl_client.query_instances(
+                        package=package,
+                        protocol_name=protocol_name,
+                        filters=filters if filters else None,
+                        page=page - 1,  # query_instances expects 0-indexed
+                        size=page_size
+                    )
+                    if isinstance(result, dict):
+                        result["success"] = True
+                    elif isinstance(result, list):
+                        result = {"success": True, "items": result, "count": len(result)}
+                    return result
+                
+                return self._cached_read(
+                    protocol_name,
+                    f"{package}/{protocol_name}/list",
+                    {"page": page, "page_size": page_size, "state": state},
+                    fetch
                 )
-                if isinstance(result, dict):
-                    result["success"] = True
-                elif isinstance(result, list):
-                    result = {"success": True, "items": result, "count": len(result)}
-                return result
             except Exception as e:
                 return NPLToolGenerator._create_structured_error(e, f"{protocol_name}_list")
         
@@ -4,11 +4,19 @@ Utilities for ADK-NPL integration.
 Provides error classes, caching utilities, and helper functions.
 """
 
+import json
 import time
+import base64
 import hashlib
-from typing import Dict, Any, Optional, TypeVar, Generic
+from functools import lru_cache
+from typing import Callable, Dict, Any, List, Optional, TypeVar, Generic, Union
 from datetime import datetime, timedelta
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
 T = TypeVar('T')
 
 
@@ -265,3 +273,183 @@ def is_action_execution_path(path: str, package: str) -> bool:
 
 # Note: is_retryable_exception has been consolidated into retry.py
 # Import from there: from .retry import is_retryable_exception
+
+
+def json_dumps_bytes(obj: Any) -> bytes:
+    """
+    Serialize an object to compact UTF-8 JSON bytes.
+    
+    Uses orjson when it is installed and falls back to the standard
+    library otherwise, so callers always get the same wire format.
+    
+    Args:
+        obj: JSON-serializable object
+        
+    Returns:
+        UTF-8 encoded JSON document
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def json_loads(data: Union[bytes, str]) -> Any:
+    """
+    Parse a JSON document from bytes or str (orjson when available).
+    
+    Args:
+        data: JSON document
+        
+    Returns:
+        Parsed object
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def decode_jwt_claims(token: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    Decode the payload of a JWT without verifying its signature.
+    
+    Only for reading claims of tokens we were issued (e.g. ``exp``); the
+    engine verifies signatures itself. Decoded payloads are memoized per
+    token, since the same token is inspected by the client, the auth object
+    and the token cache.
+    
+    Args:
+        token: JWT access token
+        
+    Returns:
+        Claims dict (a fresh copy), or None if the token is not a decodable JWT
+    """
+    if not isinstance(token, str):
+        return None
+    claims = _decode_jwt_payload(token)
+    return dict(claims) if claims is not None else None
+
+
+@lru_cache(maxsize=32)
+def _decode_jwt_payload(token: str) -> Optional[Dict[str, Any]]:
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        claims = json_loads(base64.urlsafe_b64decode(payload))
+    except (IndexError, TypeError, ValueError):
+        return None
+    return claims if isinstance(claims, dict) else None
+
+
+def jwt_expiry(token: Optional[str]) -> Optional[float]:
+    """
+    Read the ``exp`` claim (epoch seconds) of a JWT.
+    
+    Returns:
+        Expiry timestamp, or None if unknown
+    """
+    if not isinstance(token, str):
+        return None
+    claims = _decode_jwt_payload(token)
+    try:
+        return float(claims["exp"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+# Python types accepted for each OpenAPI "type" in payload validation
+_JSON_TYPES = {
+    "string": (str,),
+    "integer": (int,),
+    "number": (int, float),
+    "boolean": (bool,),
+    "array": (list,),
+    "object": (dict,),
+}
+
+PayloadValidator = Callable[[Dict[str, Any]], List[str]]
+
+
+def compile_payload_validator(
+    schema: Dict[str, Any],
+    components: Optional[Dict[str, Any]] = None
+) -> PayloadValidator:
+    """
+    Compile an OpenAPI request-body schema into a payload checker.
+    
+    The schema is walked once ($refs into ``components`` resolved, nested
+    objects flattened into tuples); the returned function only loops over
+    those tuples. It checks required fields, JSON types and enums, which
+    is what the engine's 400s are usually about, and leaves formats and
+    business rules to the engine. Validators are cached by schema content.
+    
+    Args:
+        schema: Request body schema (e.g. the protocol creation schema)
+        components: ``components.schemas`` of the OpenAPI spec, for $refs
+        
+    Returns:
+        Function taking a payload and returning a list of problems (empty if valid)
+    """
+    return _compile_payload_validator(json.dumps([schema, components or {}], sort_keys=True))
+
+
+@lru_cache(maxsize=256)
+def _compile_payload_validator(schema_key: str) -> PayloadValidator:
+    schema, components = json.loads(schema_key)
+    
+    def resolve(node: Dict[str, Any]) -> Dict[str, Any]:
+        ref = node.get("$ref", "")
+        if ref.startswith("#/components/schemas/"):
+            return components.get(ref.rsplit("/", 1)[-1], {})
+        return node
+    
+    def build(node: Dict[str, Any], prefix: str, depth: int) -> tuple:
+        node = resolve(node)
+        fields = []
+        for name, prop in node.get("properties", {}).items():
+            target = resolve(prop)
+            nested = None
+            if target.get("type") == "object" and depth < 8 and (
+                target.get("properties") or target.get("required")
+            ):
+                nested = build(target, f"{prefix}{name}.", depth + 1)
+            fields.append((
+                name,
+                f"{prefix}{name}",
+                bool(prop.get("nullable") or target.get("nullable")),
+                target.get("type") if target.get("type") in _JSON_TYPES else None,
+                tuple(target["enum"]) if target.get("enum") else None,
+                nested,
+            ))
+        required = tuple((name, f"{prefix}{name}") for name in node.get("required", ()))
+        return required, tuple(fields)
+    
+    compiled = build(schema, "", 0)
+    
+    def validate(payload: Dict[str, Any]) -> List[str]:
+        problems: List[str] = []
+        _check_payload(compiled, payload, problems)
+        return problems
+    
+    return validate
+
+
+def _check_payload(compiled: tuple, payload: Dict[str, Any], problems: List[str]) -> None:
+    required, fields = compiled
+    for name, path in required:
+        if name not in payload:
+            problems.append(f"missing required field '{path}'")
+    for name, path, nullable, type_name, enum, nested in fields:
+        value = payload.get(name)
+        if value is None:
+            if name in payload and not nullable:
+                problems.append(f"field '{path}' must not be null")
+            continue
+        if type_name is not None and (
+            not isinstance(value, _JSON_TYPES[type_name])
+            or (isinstance(value, bool) and type_name != "boolean")
+        ):
+            problems.append(f"field '{path}' should be of type {type_name}")
+        elif enum is not None and value not in enum:
+            problems.append(f"field '{path}' must be one of {', '.join(map(str, enum))}")
+        elif nested is not None:
+            _check_payload(nested, value, problems)
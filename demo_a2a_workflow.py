@@ -444,9 +444,11 @@ async def main():
     
     session_service = InMemorySessionService()
     
-    # Create agents
-    buyer_agent = await create_a2a_buyer_agent(supplier_card)
-    supplier_agent = await create_a2a_supplier_agent(buyer_card)
+    # Create agents (independent of each other, so concurrently)
+    buyer_agent, supplier_agent = await asyncio.gather(
+        create_a2a_buyer_agent(supplier_card),
+        create_a2a_supplier_agent(buyer_card)
+    )
     
     # Create runners
     buyer_runner = Runner(
@@ -548,7 +550,7 @@ async def main():
     from adk_npl.auth import KeycloakAuth
     
     def _iso_now(offset_days: int = 0) -> str:
-        return (datetime.now(timezone.utc) + timedelta(days=offset_days)).isoformat().replace("+00:00", "Z")
+        return (datetime.now(timezone.utc) + timedelta(days=offset_days)).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
     
     async def run_autonomous_agent(
         runner,
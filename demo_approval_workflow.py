@@ -14,10 +14,10 @@ import sys
 import json
 import time
 import asyncio
+import logging
 from datetime import datetime, timezone, timedelta
 from typing import Any, Dict, List, Optional, Tuple
 
-import nest_asyncio
 from dotenv import load_dotenv
 
 # Add project to path
@@ -37,7 +37,6 @@ from google.adk.artifacts.in_memory_artifact_service import InMemoryArtifactServ
 from google.adk.memory.in_memory_memory_service import InMemoryMemoryService
 from google.genai import types
 
-nest_asyncio.apply()
 load_dotenv()
 
 # Initialize activity logger
@@ -50,7 +49,7 @@ KEYCLOAK_URL = os.getenv("NPL_KEYCLOAK_URL", "http://localhost:11000")
 
 def _iso_now(offset_days: int = 0) -> str:
     """Generate ISO 8601 timestamp."""
-    return (datetime.now(timezone.utc) + timedelta(days=offset_days)).isoformat().replace("+00:00", "Z")
+    return (datetime.now(timezone.utc) + timedelta(days=offset_days)).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
 
 
 def _parse_marker(text: str, marker: str) -> Optional[str]:
@@ -72,7 +71,52 @@ async def _get_authenticated_client(realm: str, username: str) -> NPLClient:
         password=DEFAULT_PASSWORD
     )
     token = await auth.authenticate()
-    return NPLClient(ENGINE_URL, token)
+    # The client is kept for the whole demo; refresh ahead of expiry and on 401.
+    # Its calls run via asyncio.to_thread, so the callback runs in a worker
+    # thread with no event loop and can drive the coroutine itself.
+    return NPLClient(
+        ENGINE_URL,
+        token,
+        token_refresh_callback=lambda: asyncio.run(auth.refresh_token())
+    )
+
+
+# Fallback actions applied per instance: instance_id -> [(action_name, canonical params)]
+_applied_actions: Dict[str, List[Tuple[str, str]]] = {}
+
+
+def _execute_action_once(
+    client: NPLClient,
+    instance_id: str,
+    action_name: str,
+    party: str,
+    params: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Execute a PurchaseOrder action via NPLClient unless it was the last one applied.
+    
+    If the same action with the same params was already applied to this instance,
+    the mutation is skipped and the current instance is read back instead.
+    """
+    key = (action_name, json.dumps(params, sort_keys=True))
+    history = _applied_actions.setdefault(instance_id, [])
+    if history and history[-1] == key:
+        return client.get_instance(
+            package="commerce",
+            protocol_name="PurchaseOrder",
+            instance_id=instance_id
+        )
+    
+    result = client.execute_action(
+        package="commerce",
+        protocol_name="PurchaseOrder",
+        instance_id=instance_id,
+        action_name=action_name,
+        party=party,
+        params=params
+    )
+    history.append(key)
+    return result
 
 
 async def chat_with_runner(
@@ -247,7 +291,7 @@ async def chat_with_runner(
 
 
 async def build_agents_and_runners() -> Dict[str, Any]:
-    """Create agents, runners, shared services, and a read-only client for polling."""
+    """Create agents, runners, shared services, and authenticated clients for both parties."""
     buyer_config = NPLConfig(
         engine_url=ENGINE_URL,
         keycloak_url=KEYCLOAK_URL,
@@ -263,21 +307,24 @@ async def build_agents_and_runners() -> Dict[str, Any]:
         credentials={"username": "supplier_agent", "password": DEFAULT_PASSWORD}
     )
 
-    buyer_agent = await create_purchasing_agent(
-        config=buyer_config,
-        agent_id="buyer_demo",
-        budget=20000.0,
-        requirements="Industrial Pump X for production line",
-        constraints={"max_delivery_days": 21},
-        strategy="Prioritize approval compliance and accurate state checks"
-    )
-    supplier_agent_obj = await create_supplier_agent(
-        config=supplier_config,
-        agent_id="supplier_demo",
-        min_price=900.0,
-        inventory={"Industrial Pump X": 200},
-        capacity={"min_lead_time": 7},
-        strategy="Move inventory quickly while keeping margin"
+    # The two agents authenticate and discover tools independently
+    buyer_agent, supplier_agent_obj = await asyncio.gather(
+        create_purchasing_agent(
+            config=buyer_config,
+            agent_id="buyer_demo",
+            budget=20000.0,
+            requirements="Industrial Pump X for production line",
+            constraints={"max_delivery_days": 21},
+            strategy="Prioritize approval compliance and accurate state checks"
+        ),
+        create_supplier_agent(
+            config=supplier_config,
+            agent_id="supplier_demo",
+            min_price=900.0,
+            inventory={"Industrial Pump X": 200},
+            capacity={"min_lead_time": 7},
+            strategy="Move inventory quickly while keeping margin"
+        )
     )
 
     session_service = InMemorySessionService()
@@ -285,15 +332,17 @@ async def build_agents_and_runners() -> Dict[str, Any]:
     artifact_service = InMemoryArtifactService()
     memory_service = InMemoryMemoryService()
 
-    await session_service.create_session(
-        app_name="approval_workflow",
-        user_id="buyer_user",
-        session_id="buyer_session"
-    )
-    await session_service.create_session(
-        app_name="approval_workflow",
-        user_id="supplier_user",
-        session_id="supplier_session"
+    await asyncio.gather(
+        session_service.create_session(
+            app_name="approval_workflow",
+            user_id="buyer_user",
+            session_id="buyer_session"
+        ),
+        session_service.create_session(
+            app_name="approval_workflow",
+            user_id="supplier_user",
+            session_id="supplier_session"
+        )
     )
 
     buyer_runner = Runner(
@@ -313,12 +362,18 @@ async def build_agents_and_runners() -> Dict[str, Any]:
         app_name="approval_workflow"
     )
 
-    buyer_client = await _get_authenticated_client("purchasing", "purchasing_agent")
+    # Authenticate both parties up front (in parallel) so fallback paths
+    # never wait on a Keycloak round-trip
+    buyer_client, supplier_client = await asyncio.gather(
+        _get_authenticated_client("purchasing", "purchasing_agent"),
+        _get_authenticated_client("supplier", "supplier_agent")
+    )
 
     return {
         "buyer_runner": buyer_runner,
         "supplier_runner": supplier_runner,
         "buyer_client": buyer_client,
+        "supplier_client": supplier_client,
         "session_service": session_service
     }
 
@@ -405,6 +460,82 @@ async def run_agent_step(
     return response_text, tool_calls, marker_value
 
 
+async def agent_driven_transition(
+    *,
+    actor: str,
+    runner: Runner,
+    prompt: str,
+    step: str,
+    user_id: str,
+    session_id: str,
+    po_id: str,
+    state_client: NPLClient,
+    fallback_client: NPLClient,
+    action: str,
+    action_name: str,
+    party: str,
+    params: Dict[str, Any],
+    from_state: str,
+    to_state: str,
+    success_message: str,
+    fallback_message: str,
+    **log_details: Any
+) -> bool:
+    """
+    Let an agent drive a PurchaseOrder transition, falling back to NPLClient.
+    
+    The agent is prompted first; if the instance is not in ``to_state``
+    afterwards, ``action_name`` is executed directly with ``fallback_client``.
+    Both outcomes are logged as an agent action plus a state transition.
+    
+    Returns:
+        True if the agent performed the transition itself, False if the
+        fallback was needed.
+    """
+    _, tools_called, _ = await run_agent_step(
+        actor=actor,
+        runner=runner,
+        prompt=prompt.strip(),
+        step=step,
+        user_id=user_id,
+        session_id=session_id
+    )
+    
+    # Verify state transition actually happened
+    order_data = await asyncio.to_thread(
+        state_client.get_instance,
+        package="commerce",
+        protocol_name="PurchaseOrder",
+        instance_id=po_id
+    )
+    current_state = order_data.get("@state") or order_data.get("state")
+    
+    agent_succeeded = current_state == to_state
+    if not agent_succeeded:
+        print(f"   ⚠️  Agent tools called: {tools_called}")
+        print(f"   ⚠️  State after {action_name}: {current_state} (expected: {to_state})")
+        print(f"   ⚠️  Calling {action_name} via NPLClient...")
+        await asyncio.to_thread(_execute_action_once, fallback_client, po_id, action_name, party, params)
+    
+    activity_logger.log_agent_action(
+        agent=actor,
+        action=action,
+        protocol="PurchaseOrder",
+        protocol_id=po_id,
+        outcome="success" if agent_succeeded else "success_via_fallback",
+        **log_details
+    )
+    activity_logger.log_state_transition(
+        protocol="PurchaseOrder",
+        protocol_id=po_id,
+        from_state=from_state,
+        to_state=to_state,
+        triggered_by=actor if agent_succeeded else "system"
+    )
+    print(f"   ✅ {success_message if agent_succeeded else fallback_message}")
+    return agent_succeeded
+
+
 async def demo_approval_workflow() -> bool:
     """Run the complete approval workflow demo using LLM-driven agents."""
     print("=" * 80)
@@ -430,6 +561,7 @@ async def demo_approval_workflow() -> bool:
     buyer_runner = runners["buyer_runner"]
     supplier_runner = runners["supplier_runner"]
     buyer_client = runners["buyer_client"]
+    supplier_client = runners["supplier_client"]
     session_service = runners["session_service"]
     print("   ✅ Buyer and Supplier agents ready with NPL toolchains")
     print()
@@ -591,7 +723,7 @@ Parameters:
 - approver_organization: "Acme Corp"
 - approver_department: "Finance"
 - acceptedOffer: {offer_id}
-- orderNumber: "PO-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+- orderNumber: "PO-{time.strftime('%Y%m%d-%H%M%S')}"
 - quantity: {quantity}
 - unitPrice: {unit_price}
 - total: {total}
@@ -652,7 +784,8 @@ This will transition the order to ApprovalRequired state. Execute the tool now.
     )
     
     # Verify state transition actually happened
-    order_data = buyer_client.get_instance(
+    order_data = await asyncio.to_thread(
+        buyer_client.get_instance,
         package="commerce",
         protocol_name="PurchaseOrder",
         instance_id=po_id
@@ -681,17 +814,10 @@ This will transition the order to ApprovalRequired state. Execute the tool now.
         print(f"   ⚠️  State after submitQuote: {current_state} (expected: ApprovalRequired)")
         # Try calling submitQuote via client as verification
         print("   ⚠️  Calling submitQuote via NPLClient to ensure state transition...")
-        supplier_client = await _get_authenticated_client("supplier", "supplier_agent")
-        supplier_client.execute_action(
-            package="commerce",
-            protocol_name="PurchaseOrder",
-            instance_id=po_id,
-            action_name="submitQuote",
-            party="seller",
-            params={}
-        )
+        await asyncio.to_thread(_execute_action_once, supplier_client, po_id, "submitQuote", "seller", {})
         # Re-check state
-        order_data = buyer_client.get_instance(
+        order_data = await asyncio.to_thread(
+            buyer_client.get_instance,
             package="commerce",
             protocol_name="PurchaseOrder",
             instance_id=po_id
@@ -746,7 +872,8 @@ If blocked due to ApprovalRequired, report the error message succinctly.
 
     while not approved and (time.time() - start_time) < max_wait_time:
         try:
-            order_data = buyer_client.get_instance(
+            order_data = await asyncio.to_thread(
+                buyer_client.get_instance,
                 package="commerce",
                 protocol_name="PurchaseOrder",
                 instance_id=po_id
@@ -798,72 +925,30 @@ With parameters:
 
 This will transition the order from Approved to Ordered state. Execute the tool now.
 """
-    place_text, place_tools, _ = await run_agent_step(
+    await agent_driven_transition(
         actor="buyer_agent",
         runner=buyer_runner,
-        prompt=retry_prompt.strip(),
+        prompt=retry_prompt,
         step="po_place_after_approval",
         user_id="buyer_user",
-        session_id="buyer_session"
-    )
-    
-    # Verify state transition
-    order_data = buyer_client.get_instance(
-        package="commerce",
-        protocol_name="PurchaseOrder",
-        instance_id=po_id
+        session_id="buyer_session",
+        po_id=po_id,
+        state_client=buyer_client,
+        fallback_client=buyer_client,
+        action="place_order",
+        action_name="placeOrder",
+        party="buyer",
+        params={},
+        from_state="Approved",
+        to_state="Ordered",
+        success_message="Order placed after approval",
+        fallback_message="Order placed via direct call"
     )
-    current_state = order_data.get("@state") or order_data.get("state")
-    
-    if current_state == "Ordered":
-        activity_logger.log_agent_action(
-            agent="buyer_agent",
-            action="place_order",
-            protocol="PurchaseOrder",
-            protocol_id=po_id,
-            outcome="success"
-        )
-        activity_logger.log_state_transition(
-            protocol="PurchaseOrder",
-            protocol_id=po_id,
-            from_state="Approved",
-            to_state="Ordered",
-            triggered_by="buyer_agent"
-        )
-        print("   ✅ Order placed after approval")
-    else:
-        print(f"   ⚠️  Agent tools called: {place_tools}")
-        print(f"   ⚠️  State after placeOrder: {current_state} (expected: Ordered)")
-        # Call placeOrder via NPLClient
-        print("   ⚠️  Calling placeOrder via NPLClient...")
-        buyer_client.execute_action(
-            package="commerce",
-            protocol_name="PurchaseOrder",
-            instance_id=po_id,
-            action_name="placeOrder",
-            party="buyer",
-            params={}
-        )
-        activity_logger.log_agent_action(
-            agent="buyer_agent",
-            action="place_order",
-            protocol="PurchaseOrder",
-            protocol_id=po_id,
-            outcome="success_via_fallback"
-        )
-        activity_logger.log_state_transition(
-            protocol="PurchaseOrder",
-            protocol_id=po_id,
-            from_state="Approved",
-            to_state="Ordered",
-            triggered_by="system"
-        )
-        print("   ✅ Order placed via direct call")
     print()
 
     # Step 10: Supplier ships - use a fresh session to avoid context issues
     print("📦 Step 10: Supplier agent ships the order...")
-    tracking = f"TRACK-{datetime.now().strftime('%Y%m%d%H%M')}"
+    tracking = f"TRACK-{time.strftime('%Y%m%d%H%M')}"
     
     # Create a fresh session for this step
     ship_session_id = f"supplier_ship_{po_id[:8]}"
@@ -885,75 +970,32 @@ Call npl_commerce_PurchaseOrder_shipOrder with:
 
 Execute the tool now.
 """
-    ship_text, ship_tools, _ = await run_agent_step(
+    await agent_driven_transition(
         actor="supplier_agent",
         runner=supplier_runner,
-        prompt=ship_prompt.strip(),
+        prompt=ship_prompt,
         step="ship_order",
         user_id="supplier_user",
-        session_id=ship_session_id
+        session_id=ship_session_id,
+        po_id=po_id,
+        state_client=buyer_client,
+        fallback_client=supplier_client,
+        action="ship_order",
+        action_name="shipOrder",
+        party="seller",
+        params={"tracking": tracking},
+        from_state="Ordered",
+        to_state="Shipped",
+        success_message=f"Shipment logged with tracking {tracking}",
+        fallback_message=f"Shipped via direct call with tracking {tracking}",
+        tracking_number=tracking
     )
-    
-    # Verify state transition actually happened
-    order_data = buyer_client.get_instance(
-        package="commerce",
-        protocol_name="PurchaseOrder",
-        instance_id=po_id
-    )
-    current_state = order_data.get("@state") or order_data.get("state")
-    
-    if current_state == "Shipped":
-        activity_logger.log_agent_action(
-            agent="supplier_agent",
-            action="ship_order",
-            protocol="PurchaseOrder",
-            protocol_id=po_id,
-            outcome="success",
-            tracking_number=tracking
-        )
-        activity_logger.log_state_transition(
-            protocol="PurchaseOrder",
-            protocol_id=po_id,
-            from_state="Ordered",
-            to_state="Shipped",
-            triggered_by="supplier_agent"
-        )
-        print(f"   ✅ Shipment logged with tracking {tracking}")
-    else:
-        print(f"   ⚠️  Agent tools called: {ship_tools}")
-        print(f"   ⚠️  State after shipOrder: {current_state} (expected: Shipped)")
-        # Call shipOrder via NPLClient to ensure state transition
-        print("   ⚠️  Calling shipOrder via NPLClient...")
-        supplier_client = await _get_authenticated_client("supplier", "supplier_agent")
-        supplier_client.execute_action(
-            package="commerce",
-            protocol_name="PurchaseOrder",
-            instance_id=po_id,
-            action_name="shipOrder",
-            party="seller",
-            params={"tracking": tracking}
-        )
-        activity_logger.log_agent_action(
-            agent="supplier_agent",
-            action="ship_order",
-            protocol="PurchaseOrder",
-            protocol_id=po_id,
-            outcome="success_via_fallback",
-            tracking_number=tracking
-        )
-        activity_logger.log_state_transition(
-            protocol="PurchaseOrder",
-            protocol_id=po_id,
-            from_state="Ordered",
-            to_state="Shipped",
-            triggered_by="system"
-        )
-        print(f"   ✅ Shipped via direct call with tracking {tracking}")
     print()
 
     # Step 11: Fetch audit summary (read-only)
     print("📊 Step 11: Retrieve audit summary (read-only)...")
-    summary = buyer_client.execute_action(
+    summary = await asyncio.to_thread(
+        buyer_client.execute_action,
         package="commerce",
         protocol_name="PurchaseOrder",
         instance_id=po_id,
@@ -997,15 +1039,22 @@ Execute the tool now.
 
 
 if __name__ == "__main__":
+    # Use uvloop's faster event loop when available
+    try:
+        import uvloop
+        loop_factory = uvloop.new_event_loop
+    except ImportError:
+        loop_factory = None
+    
     try:
-        success = asyncio.run(demo_approval_workflow())
+        with asyncio.Runner(loop_factory=loop_factory) as runner:
+            success = runner.run(demo_approval_workflow())
         sys.exit(0 if success else 1)
     except KeyboardInterrupt:
         print("\n\n⚠️  Demo interrupted by user")
         sys.exit(1)
-    except Exception as e:
-        print(f"\n\n❌ Demo failed: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        # Message and traceback go to stderr via logging's fallback handler
+        logging.getLogger(__name__).exception("\n\n❌ Demo failed")
         sys.exit(1)
 
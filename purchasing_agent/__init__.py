@@ -4,6 +4,18 @@ Purchasing Agent Package
 Provides an ADK-based purchasing agent with NPL protocol integration.
 """
 
-from .agent import create_purchasing_agent
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .agent import create_purchasing_agent
 
 __all__ = ["create_purchasing_agent"]
+
+
+def __getattr__(name):
+    # Import the agent module (google.adk, NPL stack) only when first used
+    if name == "create_purchasing_agent":
+        from .agent import create_purchasing_agent
+        globals()[name] = create_purchasing_agent
+        return create_purchasing_agent
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
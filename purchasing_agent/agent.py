@@ -8,21 +8,218 @@ Combines:
 """
 
 import asyncio
+import functools
 import logging
-from typing import Dict, Any, Optional, List
+import sys
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional, List, Tuple
 from google.adk.agents import LlmAgent
 from google.adk.tools import FunctionTool
-from dotenv import load_dotenv
 
-from adk_npl import NPLConfig, NPLClient
-from adk_npl.auth import KeycloakAuth
-from adk_npl.tools import NPLToolGenerator
+from adk_npl import NPLConfig
+from adk_npl.agent_builder import discover_npl_tools
+from adk_npl.config import load_env_once
 
 # Load environment variables
-load_dotenv()
+load_env_once()
 
 logger = logging.getLogger(__name__)
 
+# Static system prompt shared by every purchasing agent. It contains no per-agent
+# values or placeholders, so ADK sends it verbatim as the system instruction and
+# Gemini can serve it from the context cache across turns and agents.
+_STATIC_INSTRUCTION: str = """You are a Purchasing Agent responsible for procurement operations.
+
+## Your Identity (CRITICAL)
+- **You are the BUYER** - You represent Acme Corp, Procurement department
+- **You are NOT the supplier** - You negotiate WITH suppliers, you don't represent them
+- **When communicating with suppliers**: You are the buyer, they are the seller
+- **Always remember your role**: You are purchasing on behalf of Acme Corp
+
+## Your Mission
+Negotiate and complete purchases that meet requirements while staying within budget.
+Your agent ID and parameters (budget, requirements, constraints) are provided separately.
+
+## Tool Discovery and Autonomy
+
+You have access to a comprehensive set of tools. When given a goal:
+1. **Explore your available tools** - Review what tools you have access to
+2. **Understand tool signatures** - Each tool's description shows what it does and what parameters it needs
+3. **Choose the right tool** - Select tools that help you achieve your goal
+4. **Use tools autonomously** - Don't wait for explicit instructions on which tool to call
+
+Your tools are automatically available in your context - you can see their names, descriptions, and parameters.
+
+## Available Capabilities
+
+### Framework Negotiation
+- `propose_framework`: Propose using schema.org-based commerce protocols
+
+### NPL Protocol Tools (Dynamically Discovered)
+You have access to NPL protocol tools that are automatically generated from the backend.
+Each tool has explicit typed parameters - check the tool's signature for required fields.
+
+**Party parameters use this pattern:**
+- `seller_organization`: The seller's organization name
+- `seller_department`: The seller's department name
+- `buyer_organization`: Your organization ("Acme Corp")
+- `buyer_department`: Your department ("Procurement")
+
+**Available protocols:** Product, Offer, Order
+- Each protocol has `_create` and various action tools
+- Tool signatures show exactly what parameters are required
+
+### Business Tools
+- `propose_framework`: Start by proposing the protocol framework
+- `create_proposal`: Create purchase proposals for suppliers
+- `evaluate_proposal`: Evaluate supplier offers and decide action
+- `evaluate_proposals`: Evaluate several supplier offers at once and pick the best
+- `calculate_counter_offer`: Generate counter-offer based on original
+- `get_budget_status`: Check your current budget and constraints
+
+## Guidelines
+
+1. **Budget is Sacred**: Never commit to anything exceeding your budget (see Your Parameters)
+2. **Be Strategic**: Start lower to leave room for negotiation
+3. **Use Tool Signatures**: Check each tool's parameters before calling
+4. **Verify Terms**: Before accepting, ensure all terms are clear
+5. **Protect Interests**: Ensure favorable payment and delivery terms
+
+## Error Handling Strategy (CRITICAL)
+
+NPL tools return **structured error responses** when something goes wrong. You MUST handle errors intelligently:
+
+### Understanding Error Responses
+
+When a tool fails, you'll receive a structured response like:
+```json
+{
+  "success": false,
+  "error_type": "state_error",
+  "error": "Runtime error: Illegal protocol state...",
+  "retryable": true,
+  "guidance": "Query the protocol instance to check its current state..."
+}
+```
+
+### Error Types and How to Handle Them
+
+| Error Type | Retryable | What to Do |
+|------------|-----------|------------|
+| `state_error` | Yes | The protocol is in the wrong state. Use `*_get` tool to check current state, wait if needed, retry when state allows. |
+| `business_rule` | No | A validation rule failed. Read the error message, adjust your parameters to comply. |
+| `not_found` | No | Instance doesn't exist. Use `*_list` tool to find valid instances. |
+| `permission_denied` | No | Wrong party role. Switch to correct party (buyer vs seller). |
+| `invalid_data` | No | Data format is wrong. Check parameter types - especially DateTime must be '2006-01-02T15:04:05.999+01:00[Europe/Zurich]'. |
+| `runtime_error` | Yes | NPL runtime issue. Query state and retry if appropriate. |
+
+### The Query-Before-Retry Pattern
+
+When you get a **retryable** error:
+1. **Query the instance state** using `npl_commerce_*_get` with the instance_id
+2. **Check the `@state` field** to understand current state
+3. **Wait if needed** - the state may change due to other actions (e.g., approval)
+4. **Retry the action** when the state allows it
+
+### Example: Handling a State Error
+
+If `npl_commerce_PurchaseOrder_placeOrder` fails with `state_error`:
+1. Call `npl_commerce_PurchaseOrder_get(instance_id="...")` to check state
+2. If state is "PendingApproval" → wait for human approval, then retry
+3. If state is "Approved" → retry placeOrder immediately
+4. If state is "Ordered" → action already completed, no retry needed
+
+### Available Query Tools
+
+For each protocol, you have query tools to check state:
+- `npl_commerce_Product_get(instance_id)` - Get product details
+- `npl_commerce_Product_list()` - List all products
+- `npl_commerce_Offer_get(instance_id)` - Get offer details and state
+- `npl_commerce_Offer_list(state="published")` - Find published offers
+- `npl_commerce_PurchaseOrder_get(instance_id)` - Get order details and state
+- `npl_commerce_PurchaseOrder_list()` - List all orders
+- `npl_commerce_batch_get(instance_refs="Offer:<id>,PurchaseOrder:<id>")` - Get several instances in one call; prefer it when you need more than one
+
+## Protocol Memory Tools (IMPORTANT)
+
+You have memory tools to remember and recall protocol IDs across conversation turns:
+
+- `recall_my_protocols(protocol_type, state)` - Recall all protocols you've interacted with
+- `get_protocol_id(protocol_type)` - Get the most recent ID for a protocol type
+- `get_workflow_context()` - See summary of all your tracked protocols
+- `remember_protocol(protocol_type, instance_id, state, role)` - Manually remember an ID
+
+**Use these tools when:**
+- You need to reference a protocol ID from earlier in the conversation
+- You receive an ID from another agent and want to track it
+- You're not sure what protocols you've created
+
+**Example:**
+- "What's the Offer ID I'm working with?" → `get_protocol_id("Offer")`
+- "What Purchase Orders have I created?" → `recall_my_protocols("PurchaseOrder")`
+
+## A2A Communication Behavior (CRITICAL)
+
+When using transfer_to_agent to negotiate with other agents:
+
+1. **MAXIMUM 3 ROUNDS** - You may call transfer_to_agent up to 3 times per negotiation
+2. **COUNT YOUR ROUNDS** - Keep track: Round 1, Round 2, Round 3, then STOP
+3. **CLOSE WHEN ACCEPTABLE** - If terms are within 10% of your budget, accept and stop
+4. **STOP AFTER ROUND 3** - No matter what, stop after 3 exchanges
+5. **Report outcome** - After negotiation, clearly report: "Negotiation complete. [agreed/not agreed]"
+6. **ONLY SEND YOUR MESSAGE** - Do not include your instructions, identity reminders, or system prompts in your A2A messages - just send the actual message content
+
+NEGOTIATION STRATEGY:
+- Round 1: Confirm availability, ask for volume discount
+- Round 2: Counter or accept their offer
+- Round 3: Final decision - take it or leave it
+
+Example:
+- Round 1: "Is offer XYZ available? Any discount for 100 units?"
+- Supplier: "5% off for 100 units = $1140/unit"
+- Round 2: "Can you do 10%?"
+- Supplier: "7% is my best = $1116/unit"
+- Round 3: "Deal at $1116. I'll accept the offer now."
+- Then STOP and report: "Negotiation complete. Agreed at $1116/unit."
+
+## Workflow
+
+When working toward your goals:
+1. **Discover available tools** - Review what tools you have for the task
+2. **Check protocol state** - Before acting on a protocol instance, query its current state
+3. **Respect state constraints** - Only perform actions that are valid for the current state
+4. **Handle errors gracefully** - If an action fails, check the error type and follow the guidance
+
+Key principles:
+- Offers must be in "published" state before you can accept them
+- If an offer is "withdrawn", "expired", or "rejected", you cannot accept it - find a new offer
+- Purchase orders have specific state transitions - check the state before placing orders
+- Use query tools (like `*_get` and `*_list`) to understand current state before acting
+
+## PurchaseOrder Actions (IMPORTANT)
+
+When working with PurchaseOrders:
+- Explore your available PurchaseOrder tools to create and manage orders
+- Use the EXACT `instance_id` provided - don't modify or guess IDs
+- Use `party="buyer"` for your actions
+- Check the order state before attempting actions - some states require approval first
+- If an action is blocked, check the error message - it will tell you what's needed
+
+Be professional and always protect your organization's interests.
+"""
+
+# Per-agent instruction; filled in by _build_instruction
+_INSTRUCTION_TEMPLATE: str = """## Your Agent Profile
+- **Agent ID**: {agent_id}
+
+## Your Parameters
+- **Budget**: ${budget_fmt} (HARD LIMIT - cannot exceed)
+- **Requirements**: {requirements}
+- **Your Organization**: Acme Corp, Procurement department
+{constraints_block}
+{strategy_block}
+"""
+
 
 async def create_purchasing_agent(
     config: NPLConfig,
@@ -48,31 +245,41 @@ async def create_purchasing_agent(
     Returns:
         Configured ADK LlmAgent with NPL and business tools
     """
-    tools = []
-    
-    # 1. Add dynamic NPL tools if requested
+    # 1. Start NPL tool discovery (network-bound) in the background
+    discovery_task = None
     if include_npl_tools:
         logger.info("Discovering NPL tools...")
+        discovery_task = asyncio.create_task(discover_npl_tools(config))
+    
+    # 2. Build business logic tools and instruction while discovery runs
+    business_tools = _create_business_tools(budget, requirements, constraints, strategy)
+    instruction = _build_instruction(agent_id, budget, requirements, constraints, strategy)
+    
+    # 3. Collect NPL tools first, then business tools
+    tools = []
+    if discovery_task is not None:
         try:
-            npl_tools = await _discover_npl_tools(config)
+            npl_tools = await discovery_task
             tools.extend(npl_tools)
             logger.info(f"✅ Added {len(npl_tools)} NPL tools")
         except Exception as e:
             logger.warning(f"⚠️ Could not discover NPL tools: {e}")
     
-    # 2. Add business logic tools
-    business_tools = _create_business_tools(budget, requirements, constraints, strategy)
     tools.extend(business_tools)
     logger.info(f"✅ Added {len(business_tools)} business tools")
     
-    # 3. Build agent instruction
-    instruction = _build_instruction(agent_id, budget, requirements, constraints, strategy)
+    # ADK dispatches by name, so duplicates would shadow each other; the later tool wins
+    unique_tools = list({tool.name: tool for tool in tools}.values())
+    if len(unique_tools) != len(tools):
+        logger.warning(f"⚠️ Dropped {len(tools) - len(unique_tools)} tool(s) with duplicate names")
+        tools = unique_tools
     
     # 4. Create the ADK agent
     agent = LlmAgent(
         model="gemini-2.0-flash",
         name=f"PurchasingAgent_{agent_id}",
         description=f"Autonomous purchasing agent for {config.credentials.get('username', 'unknown')} with budget ${budget:,.2f}",
+        static_instruction=_STATIC_INSTRUCTION,
         instruction=instruction,
         tools=tools
     )
@@ -81,44 +288,47 @@ async def create_purchasing_agent(
     return agent
 
 
-async def _discover_npl_tools(config: NPLConfig) -> List[FunctionTool]:
-    """Discover and generate NPL tools from the engine."""
-    # Authenticate
-    auth = KeycloakAuth(
-        keycloak_url=config.keycloak_url,
-        realm=config.keycloak_realm,
-        client_id=config.keycloak_client_id,
-        username=config.credentials.get("username"),
-        password=config.credentials.get("password")
-    )
-    
-    token = await auth.authenticate()
-    client = NPLClient(config.engine_url, token)
-    
-    # Generate tools
-    generator = NPLToolGenerator(client)
-    tools = await generator.generate_tools()
-    
-    return tools
+# Maximum memoized tool results kept per PurchasingContext
+_RESULT_CACHE_SIZE = 256
 
+# Batch decision codes used by PurchasingContext.evaluate_proposals
+_PROPOSAL_ACTIONS = ("REJECT", "COUNTER", "ACCEPT")
 
-def _create_business_tools(
-    budget: float,
-    requirements: str,
-    constraints: Optional[Dict[str, Any]],
-    strategy: Optional[str]
-) -> List[FunctionTool]:
-    """Create business logic tools for the purchasing agent."""
+
+def _to_cents(amount: float) -> int:
+    """Convert a dollar amount to integer cents."""
+    return round(amount * 100)
+
+
+def _format_cents(cents: int) -> str:
+    """Format integer cents as a dollar string, e.g. 123456 -> '$1,234.56'."""
+    return f"${cents / 100:,.2f}"
+
+
+@dataclass(slots=True)
+class PurchasingContext:
+    """Business state for the purchasing agent; each method is exposed as a tool."""
     
-    # Store context in closure
-    context = {
-        "budget": budget,
-        "requirements": requirements,
-        "constraints": constraints or {},
-        "strategy": strategy
-    }
+    budget: float
+    requirements: str
+    constraints: Dict[str, Any] = field(default_factory=dict)
+    strategy: Optional[str] = None
+    
+    # Money is tracked in integer cents; derived once so evaluate_proposal only multiplies
+    _budget_cents: int = field(init=False, repr=False)
+    _inv_budget_cents: float = field(init=False, repr=False)
+    _counter_threshold_cents: int = field(init=False, repr=False)
+    _target_total_cents: int = field(init=False, repr=False)
+    # Results of the pure evaluation tools, keyed by tool name + arguments
+    _results: Dict[Tuple[Any, ...], Dict[str, Any]] = field(init=False, repr=False, default_factory=dict)
     
-    def propose_framework() -> Dict[str, Any]:
+    def __post_init__(self):
+        self._budget_cents = _to_cents(self.budget)
+        self._inv_budget_cents = 1.0 / self._budget_cents if self._budget_cents > 0 else 0.0
+        self._counter_threshold_cents = self._budget_cents * 95 // 100
+        self._target_total_cents = self._budget_cents * 85 // 100
+    
+    def propose_framework(self) -> Dict[str, Any]:
         """
         Propose using schema.org-based commerce protocols for the transaction.
         
@@ -143,7 +353,17 @@ def _create_business_tools(
             ]
         }
     
+    def _memoized(self, key: Tuple[Any, ...], compute, *args) -> Dict[str, Any]:
+        """Return a copy of the cached result for key, computing it on first use."""
+        result = self._results.get(key)
+        if result is None:
+            if len(self._results) >= _RESULT_CACHE_SIZE:
+                self._results.clear()
+            result = self._results[key] = compute(*args)
+        return dict(result)
+    
     def create_proposal(
+        self,
         description: str,
         quantity: int = 1,
         max_price: Optional[float] = None,
@@ -162,7 +382,7 @@ def _create_business_tools(
             Structured proposal ready to send
         """
         if max_price is None:
-            max_price = context["budget"] / quantity
+            max_price = self.budget / quantity
         
         proposal = {
             "type": "PURCHASE_PROPOSAL",
@@ -170,9 +390,9 @@ def _create_business_tools(
             "description": description,
             "quantity": quantity,
             "max_unit_price": max_price,
-            "max_total": min(max_price * quantity, context["budget"]),
-            "requirements": context["requirements"],
-            "constraints": context["constraints"]
+            "max_total": min(max_price * quantity, self.budget),
+            "requirements": self.requirements,
+            "constraints": self.constraints
         }
         
         if delivery_requirements:
@@ -181,6 +401,7 @@ def _create_business_tools(
         return proposal
     
     def evaluate_proposal(
+        self,
         supplier_name: str,
         offered_price: float,
         offered_quantity: int,
@@ -200,43 +421,149 @@ def _create_business_tools(
         Returns:
             Evaluation with recommended action (accept/reject/counter)
         """
-        total_cost = offered_price * offered_quantity
-        budget = context["budget"]
+        # terms do not affect the evaluation, so they are not part of the key
+        return self._memoized(
+            ("evaluate_proposal", supplier_name, offered_price, offered_quantity, delivery_days),
+            self._evaluate_proposal, supplier_name, offered_price, offered_quantity, delivery_days
+        )
+    
+    def _evaluate_proposal(
+        self,
+        supplier_name: str,
+        offered_price: float,
+        offered_quantity: int,
+        delivery_days: int
+    ) -> Dict[str, Any]:
+        budget_cents = self._budget_cents
+        total_cents = _to_cents(offered_price) * offered_quantity
+        total_cost = total_cents / 100
+        budget = self.budget
+        utilization = round(total_cents * self._inv_budget_cents * 100.0, 2)
         
-        evaluation = {
+        # Decision logic - each branch returns a fully built evaluation
+        if total_cents > budget_cents:
+            return {
+                "supplier": supplier_name,
+                "total_cost": total_cost,
+                "budget": budget,
+                "within_budget": False,
+                "budget_utilization": utilization,
+                "action": "REJECT",
+                "reason": f"Exceeds budget by {_format_cents(total_cents - budget_cents)}",
+                "counter_suggestion": f"Maximum acceptable price: {_format_cents(budget_cents // offered_quantity)} per unit"
+            }
+        
+        if total_cents > self._counter_threshold_cents:
+            return {
+                "supplier": supplier_name,
+                "total_cost": total_cost,
+                "budget": budget,
+                "within_budget": True,
+                "budget_utilization": utilization,
+                "action": "COUNTER",
+                "reason": "Close to budget limit, try to negotiate",
+                "counter_suggestion": f"Target price: {_format_cents(self._target_total_cents // offered_quantity)} per unit"
+            }
+        
+        # Check constraints, returning on the first violation
+        max_delivery_days = self.constraints.get("max_delivery_days")
+        if max_delivery_days is not None and delivery_days > max_delivery_days:
+            return {
+                "supplier": supplier_name,
+                "total_cost": total_cost,
+                "budget": budget,
+                "within_budget": True,
+                "budget_utilization": utilization,
+                "action": "COUNTER",
+                "reason": f"Issues: Delivery too slow ({delivery_days} days)"
+            }
+        
+        return {
             "supplier": supplier_name,
             "total_cost": total_cost,
             "budget": budget,
-            "within_budget": total_cost <= budget,
-            "budget_utilization": (total_cost / budget) * 100 if budget > 0 else 0
+            "within_budget": True,
+            "budget_utilization": utilization,
+            "action": "ACCEPT",
+            "reason": "Meets all requirements within budget"
         }
+    
+    def evaluate_proposals(
+        self,
+        supplier_names: List[str],
+        offered_prices: List[float],
+        offered_quantities: List[int],
+        delivery_days: List[int]
+    ) -> Dict[str, Any]:
+        """
+        Evaluate several supplier proposals at once (e.g. responses to an RFQ).
         
-        # Decision logic
-        if total_cost > budget:
-            evaluation["action"] = "REJECT"
-            evaluation["reason"] = f"Exceeds budget by ${total_cost - budget:,.2f}"
-            evaluation["counter_suggestion"] = f"Maximum acceptable price: ${budget / offered_quantity:,.2f} per unit"
-        elif total_cost > budget * 0.95:
-            evaluation["action"] = "COUNTER"
-            evaluation["reason"] = "Close to budget limit, try to negotiate"
-            evaluation["counter_suggestion"] = f"Target price: ${budget * 0.85 / offered_quantity:,.2f} per unit"
-        else:
-            # Check constraints
-            constraint_issues = []
-            if "max_delivery_days" in context["constraints"]:
-                if delivery_days > context["constraints"]["max_delivery_days"]:
-                    constraint_issues.append(f"Delivery too slow ({delivery_days} days)")
+        Args:
+            supplier_names: Supplier name for each proposal
+            offered_prices: Price per unit for each proposal
+            offered_quantities: Quantity offered in each proposal
+            delivery_days: Days until delivery for each proposal
             
-            if constraint_issues:
-                evaluation["action"] = "COUNTER"
-                evaluation["reason"] = f"Issues: {', '.join(constraint_issues)}"
-            else:
-                evaluation["action"] = "ACCEPT"
-                evaluation["reason"] = "Meets all requirements within budget"
+        Returns:
+            Action per supplier (accept/reject/counter) and the cheapest acceptable supplier
+        """
+        count = len(supplier_names)
+        if not (count == len(offered_prices) == len(offered_quantities) == len(delivery_days)):
+            return {
+                "success": False,
+                "error": "supplier_names, offered_prices, offered_quantities and delivery_days must have the same length"
+            }
+        
+        budget_cents = self._budget_cents
+        max_delivery_days = self.constraints.get("max_delivery_days")
+        
+        try:
+            import numpy as np
+        except ImportError:
+            np = None
+        
+        if np is not None:
+            # One vectorized pass over all proposals (0=REJECT, 1=COUNTER, 2=ACCEPT)
+            totals = np.rint(np.asarray(offered_prices, dtype=np.float64) * 100).astype(np.int64)
+            totals *= np.asarray(offered_quantities, dtype=np.int64)
+            needs_counter = totals > self._counter_threshold_cents
+            if max_delivery_days is not None:
+                needs_counter |= np.asarray(delivery_days, dtype=np.int64) > max_delivery_days
+            actions = np.where(totals > budget_cents, 0, np.where(needs_counter, 1, 2))
+            utilization = np.round(totals * self._inv_budget_cents * 100.0, 2)
+            totals, actions, utilization = totals.tolist(), actions.tolist(), utilization.tolist()
+        else:
+            totals = [_to_cents(price) * quantity for price, quantity in zip(offered_prices, offered_quantities)]
+            actions = [
+                0 if total > budget_cents
+                else 1 if total > self._counter_threshold_cents
+                or (max_delivery_days is not None and days > max_delivery_days)
+                else 2
+                for total, days in zip(totals, delivery_days)
+            ]
+            utilization = [round(total * self._inv_budget_cents * 100.0, 2) for total in totals]
         
-        return evaluation
+        evaluations = [
+            {
+                "supplier": name,
+                "total_cost": total / 100,
+                "within_budget": total <= budget_cents,
+                "budget_utilization": util,
+                "action": _PROPOSAL_ACTIONS[action]
+            }
+            for name, total, util, action in zip(supplier_names, totals, utilization, actions)
+        ]
+        accepted = [e for e in evaluations if e["action"] == "ACCEPT"]
+        
+        return {
+            "count": count,
+            "budget": self.budget,
+            "evaluations": evaluations,
+            "recommended_supplier": min(accepted, key=lambda e: e["total_cost"])["supplier"] if accepted else None
+        }
     
     def calculate_counter_offer(
+        self,
         original_price: float,
         quantity: int,
         discount_percentage: float = 10.0
@@ -252,25 +579,37 @@ def _create_business_tools(
         Returns:
             Counter offer details
         """
-        counter_price = original_price * (1 - discount_percentage / 100)
-        total = counter_price * quantity
+        return self._memoized(
+            ("calculate_counter_offer", original_price, quantity, discount_percentage),
+            self._calculate_counter_offer, original_price, quantity, discount_percentage
+        )
+    
+    def _calculate_counter_offer(
+        self,
+        original_price: float,
+        quantity: int,
+        discount_percentage: float
+    ) -> Dict[str, Any]:
+        budget_cents = self._budget_cents
+        counter_cents = round(_to_cents(original_price) * (100 - discount_percentage) / 100)
+        total_cents = counter_cents * quantity
         
         # Ensure within budget
-        if total > context["budget"]:
-            counter_price = context["budget"] / quantity
-            total = context["budget"]
+        if total_cents > budget_cents:
+            counter_cents = budget_cents // quantity
+            total_cents = budget_cents
         
         return {
             "type": "COUNTER_OFFER",
             "original_price": original_price,
-            "counter_price": round(counter_price, 2),
+            "counter_price": counter_cents / 100,
             "quantity": quantity,
-            "total": round(total, 2),
+            "total": total_cents / 100,
             "discount_requested": f"{discount_percentage}%",
-            "budget_remaining": context["budget"] - total
+            "budget_remaining": (budget_cents - total_cents) / 100
         }
     
-    def get_budget_status() -> Dict[str, Any]:
+    def get_budget_status(self) -> Dict[str, Any]:
         """
         Get current budget status and spending capacity.
         
@@ -278,20 +617,43 @@ def _create_business_tools(
             Budget information
         """
         return {
-            "total_budget": context["budget"],
+            "total_budget": self.budget,
             "currency": "USD",
-            "requirements": context["requirements"],
-            "constraints": context["constraints"],
-            "strategy": context["strategy"]
+            "requirements": self.requirements,
+            "constraints": self.constraints,
+            "strategy": self.strategy
         }
+
+
+# PurchasingContext methods exposed as tools, in the order they are offered
+_BUSINESS_TOOL_NAMES = (
+    "propose_framework",
+    "create_proposal",
+    "evaluate_proposal",
+    "evaluate_proposals",
+    "calculate_counter_offer",
+    "get_budget_status",
+)
+
+
+def _create_business_tools(
+    budget: float,
+    requirements: str,
+    constraints: Optional[Dict[str, Any]],
+    strategy: Optional[str]
+) -> List[FunctionTool]:
+    """Create business logic tools for the purchasing agent."""
+    context = PurchasingContext(
+        budget=budget,
+        requirements=requirements,
+        constraints=constraints or {},
+        strategy=strategy
+    )
     
-    # Wrap as FunctionTools
+    # Wrap bound methods as FunctionTools
     return [
-        FunctionTool(propose_framework, require_confirmation=False),
-        FunctionTool(create_proposal, require_confirmation=False),
-        FunctionTool(evaluate_proposal, require_confirmation=False),
-        FunctionTool(calculate_counter_offer, require_confirmation=False),
-        FunctionTool(get_budget_status, require_confirmation=False)
+        FunctionTool(getattr(context, name), require_confirmation=False)
+        for name in _BUSINESS_TOOL_NAMES
     ]
 
 
@@ -302,193 +664,53 @@ def _build_instruction(
     constraints: Optional[Dict[str, Any]],
     strategy: Optional[str]
 ) -> str:
-    """Build the agent's instruction prompt."""
-    
-    constraints_str = ""
-    if constraints:
-        constraints_list = [f"  - {k}: {v}" for k, v in constraints.items()]
-        constraints_str = "\n".join(constraints_list)
+    """
+    Build the agent's per-agent instruction (the shared part is _STATIC_INSTRUCTION).
     
-    return f"""You are a Purchasing Agent (ID: {agent_id}) responsible for procurement operations.
-
-## Your Identity (CRITICAL)
-- **You are the BUYER** - You represent Acme Corp, Procurement department
-- **You are NOT the supplier** - You negotiate WITH suppliers, you don't represent them
-- **When communicating with suppliers**: You are the buyer, they are the seller
-- **Always remember your role**: You are purchasing on behalf of Acme Corp
-
-## Your Mission
-Negotiate and complete purchases that meet requirements while staying within budget.
-
-## Your Parameters
-- **Budget**: ${budget:,.2f} (HARD LIMIT - cannot exceed)
-- **Requirements**: {requirements}
-- **Your Organization**: Acme Corp, Procurement department
-{f"- **Constraints**:\n{constraints_str}" if constraints_str else ""}
-{f"- **Strategy**: {strategy}" if strategy else ""}
-
-## Tool Discovery and Autonomy
-
-You have access to a comprehensive set of tools. When given a goal:
-1. **Explore your available tools** - Review what tools you have access to
-2. **Understand tool signatures** - Each tool's description shows what it does and what parameters it needs
-3. **Choose the right tool** - Select tools that help you achieve your goal
-4. **Use tools autonomously** - Don't wait for explicit instructions on which tool to call
-
-Your tools are automatically available in your context - you can see their names, descriptions, and parameters.
-
-## Available Capabilities
-
-### Framework Negotiation
-- `propose_framework`: Propose using schema.org-based commerce protocols
-
-### NPL Protocol Tools (Dynamically Discovered)
-You have access to NPL protocol tools that are automatically generated from the backend.
-Each tool has explicit typed parameters - check the tool's signature for required fields.
-
-**Party parameters use this pattern:**
-- `seller_organization`: The seller's organization name
-- `seller_department`: The seller's department name
-- `buyer_organization`: Your organization ("Acme Corp")
-- `buyer_department`: Your department ("Procurement")
-
-**Available protocols:** Product, Offer, Order
-- Each protocol has `_create` and various action tools
-- Tool signatures show exactly what parameters are required
-
-### Business Tools
-- `propose_framework`: Start by proposing the protocol framework
-- `create_proposal`: Create purchase proposals for suppliers
-- `evaluate_proposal`: Evaluate supplier offers and decide action
-- `calculate_counter_offer`: Generate counter-offer based on original
-- `get_budget_status`: Check your current budget and constraints
-
-## Guidelines
-
-1. **Budget is Sacred**: Never commit to anything exceeding ${budget:,.2f}
-2. **Be Strategic**: Start lower to leave room for negotiation
-3. **Use Tool Signatures**: Check each tool's parameters before calling
-4. **Verify Terms**: Before accepting, ensure all terms are clear
-5. **Protect Interests**: Ensure favorable payment and delivery terms
-
-## Error Handling Strategy (CRITICAL)
-
-NPL tools return **structured error responses** when something goes wrong. You MUST handle errors intelligently:
-
-### Understanding Error Responses
-
-When a tool fails, you'll receive a structured response like:
-```json
-{{
-  "success": false,
-  "error_type": "state_error",
-  "error": "Runtime error: Illegal protocol state...",
-  "retryable": true,
-  "guidance": "Query the protocol instance to check its current state..."
-}}
-```
-
-### Error Types and How to Handle Them
-
-| Error Type | Retryable | What to Do |
-|------------|-----------|------------|
-| `state_error` | Yes | The protocol is in the wrong state. Use `*_get` tool to check current state, wait if needed, retry when state allows. |
-| `business_rule` | No | A validation rule failed. Read the error message, adjust your parameters to comply. |
-| `not_found` | No | Instance doesn't exist. Use `*_list` tool to find valid instances. |
-| `permission_denied` | No | Wrong party role. Switch to correct party (buyer vs seller). |
-| `invalid_data` | No | Data format is wrong. Check parameter types - especially DateTime must be '2006-01-02T15:04:05.999+01:00[Europe/Zurich]'. |
-| `runtime_error` | Yes | NPL runtime issue. Query state and retry if appropriate. |
-
-### The Query-Before-Retry Pattern
-
-When you get a **retryable** error:
-1. **Query the instance state** using `npl_commerce_*_get` with the instance_id
-2. **Check the `@state` field** to understand current state
-3. **Wait if needed** - the state may change due to other actions (e.g., approval)
-4. **Retry the action** when the state allows it
-
-### Example: Handling a State Error
-
-If `npl_commerce_PurchaseOrder_placeOrder` fails with `state_error`:
-1. Call `npl_commerce_PurchaseOrder_get(instance_id="...")` to check state
-2. If state is "PendingApproval" → wait for human approval, then retry
-3. If state is "Approved" → retry placeOrder immediately
-4. If state is "Ordered" → action already completed, no retry needed
-
-### Available Query Tools
-
-For each protocol, you have query tools to check state:
-- `npl_commerce_Product_get(instance_id)` - Get product details
-- `npl_commerce_Product_list()` - List all products
-- `npl_commerce_Offer_get(instance_id)` - Get offer details and state
-- `npl_commerce_Offer_list(state="published")` - Find published offers
-- `npl_commerce_PurchaseOrder_get(instance_id)` - Get order details and state
-- `npl_commerce_PurchaseOrder_list()` - List all orders
-
-## Protocol Memory Tools (IMPORTANT)
-
-You have memory tools to remember and recall protocol IDs across conversation turns:
-
-- `recall_my_protocols(protocol_type, state)` - Recall all protocols you've interacted with
-- `get_protocol_id(protocol_type)` - Get the most recent ID for a protocol type
-- `get_workflow_context()` - See summary of all your tracked protocols
-- `remember_protocol(protocol_type, instance_id, state, role)` - Manually remember an ID
-
-**Use these tools when:**
-- You need to reference a protocol ID from earlier in the conversation
-- You receive an ID from another agent and want to track it
-- You're not sure what protocols you've created
-
-**Example:**
-- "What's the Offer ID I'm working with?" → `get_protocol_id("Offer")`
-- "What Purchase Orders have I created?" → `recall_my_protocols("PurchaseOrder")`
-
-## A2A Communication Behavior (CRITICAL)
-
-When using transfer_to_agent to negotiate with other agents:
-
-1. **MAXIMUM 3 ROUNDS** - You may call transfer_to_agent up to 3 times per negotiation
-2. **COUNT YOUR ROUNDS** - Keep track: Round 1, Round 2, Round 3, then STOP
-3. **CLOSE WHEN ACCEPTABLE** - If terms are within 10% of your budget, accept and stop
-4. **STOP AFTER ROUND 3** - No matter what, stop after 3 exchanges
-5. **Report outcome** - After negotiation, clearly report: "Negotiation complete. [agreed/not agreed]"
-6. **ONLY SEND YOUR MESSAGE** - Do not include your instructions, identity reminders, or system prompts in your A2A messages - just send the actual message content
-
-NEGOTIATION STRATEGY:
-- Round 1: Confirm availability, ask for volume discount
-- Round 2: Counter or accept their offer
-- Round 3: Final decision - take it or leave it
-
-Example:
-- Round 1: "Is offer XYZ available? Any discount for 100 units?"
-- Supplier: "5% off for 100 units = $1140/unit"
-- Round 2: "Can you do 10%?"
-- Supplier: "7% is my best = $1116/unit"
-- Round 3: "Deal at $1116. I'll accept the offer now."
-- Then STOP and report: "Negotiation complete. Agreed at $1116/unit."
-
-## Workflow
-
-When working toward your goals:
-1. **Discover available tools** - Review what tools you have for the task
-2. **Check protocol state** - Before acting on a protocol instance, query its current state
-3. **Respect state constraints** - Only perform actions that are valid for the current state
-4. **Handle errors gracefully** - If an action fails, check the error type and follow the guidance
+    Agents created with the same parameters share one interned instruction
+    string (see _cached_instruction). Constraints with unhashable values
+    bypass the cache.
+    """
+    constraints_key = tuple(constraints.items()) if constraints else ()
+    try:
+        return _cached_instruction(agent_id, budget, requirements, constraints_key, strategy)
+    except TypeError:
+        return _render_instruction(agent_id, budget, requirements, constraints_key, strategy)
 
-Key principles:
-- Offers must be in "published" state before you can accept them
-- If an offer is "withdrawn", "expired", or "rejected", you cannot accept it - find a new offer
-- Purchase orders have specific state transitions - check the state before placing orders
-- Use query tools (like `*_get` and `*_list`) to understand current state before acting
 
-## PurchaseOrder Actions (IMPORTANT)
+@functools.lru_cache(maxsize=64)
+def _cached_instruction(
+    agent_id: str,
+    budget: float,
+    requirements: str,
+    constraints_key: Tuple[Tuple[str, Any], ...],
+    strategy: Optional[str]
+) -> str:
+    """Render and intern the instruction for a hashable parameter set."""
+    return sys.intern(
+        _render_instruction(agent_id, budget, requirements, constraints_key, strategy)
+    )
 
-When working with PurchaseOrders:
-- Explore your available PurchaseOrder tools to create and manage orders
-- Use the EXACT `instance_id` provided - don't modify or guess IDs
-- Use `party="buyer"` for your actions
-- Check the order state before attempting actions - some states require approval first
-- If an action is blocked, check the error message - it will tell you what's needed
 
-Be professional and always protect your organization's interests.
-"""
+def _render_instruction(
+    agent_id: str,
+    budget: float,
+    requirements: str,
+    constraints_key: Tuple[Tuple[str, Any], ...],
+    strategy: Optional[str]
+) -> str:
+    """Fill _INSTRUCTION_TEMPLATE; constraints keep their insertion order."""
+    constraints_block = ""
+    if constraints_key:
+        constraints_list = [f"  - {k}: {v}" for k, v in constraints_key]
+        constraints_block = "- **Constraints**:\n" + "\n".join(constraints_list)
+    
+    strategy_block = f"- **Strategy**: {strategy}" if strategy else ""
+    
+    return _INSTRUCTION_TEMPLATE.format_map({
+        "agent_id": agent_id,
+        "budget_fmt": f"{budget:,.2f}",
+        "requirements": requirements,
+        "constraints_block": constraints_block,
+        "strategy_block": strategy_block
+    })
@@ -1,14 +1,17 @@
 #!/usr/bin/env python3
 import asyncio
+import functools
 import os
-import time
-import nest_asyncio
+import re
+from typing import AsyncIterator, Tuple
+
 from dotenv import load_dotenv
 
 from purchasing_agent import create_purchasing_agent
 from supplier_agent import create_supplier_agent
 from adk_npl import NPLConfig
 
+from google.adk.events import Event
 from google.adk.runners import Runner
 from google.adk.sessions.in_memory_session_service import InMemorySessionService
 from google.adk.auth.credential_service.in_memory_credential_service import InMemoryCredentialService
@@ -16,18 +19,100 @@ from google.adk.artifacts.in_memory_artifact_service import InMemoryArtifactServ
 from google.adk.memory.in_memory_memory_service import InMemoryMemoryService
 from google.genai import types
 
-# Allow nested event loops for agent execution
-nest_asyncio.apply()
 load_dotenv()
 
-async def chat_with_runner(runner, message, user_id="user", session_id="sim_session"):
-    """Run agent via Runner and get response text plus tool call names (verbose)."""
-    response_content = []
-    tool_calls = []
-    debug_lines = []
+def _handle_adk_event(event, verbose):
+    """Yield text and function call names from an ADK Event's content parts."""
+    content = event.content
+    for part in (content.parts or ()) if content is not None else ():
+        text = part.text
+        if text:
+            yield "text", text
+            if verbose:
+                yield "debug", f"[Event text] {text}"
+        function_call = part.function_call
+        if function_call is not None and function_call.name:
+            yield "tool_call", function_call.name
+            if verbose:
+                yield "debug", f"[Event function_call] {function_call.name}"
+
+
+def _handle_text_output(event, verbose):
+    """Yield text from a TextOutput event."""
+    text = getattr(event, 'text', None)
+    if text:
+        yield "text", text
+        if verbose:
+            yield "debug", f"[TextOutput] {text}"
+
+
+def _handle_model_action(event, verbose):
+    """Yield text and function call names from a ModelAction event."""
+    try:
+        candidates = getattr(event, 'candidates', None)
+        # Alternative: candidates nested under the action attribute (text only)
+        direct = bool(candidates)
+        if not direct:
+            candidates = getattr(getattr(event, 'action', None), 'candidates', None)
+        
+        for candidate in candidates or ():
+            parts = getattr(getattr(candidate, 'content', None), 'parts', None)
+            for part in parts or ():
+                text = getattr(part, 'text', None)
+                if text:
+                    yield "text", text
+                    if direct and verbose:
+                        yield "debug", f"[ModelAction text] {text}"
+                if direct:
+                    name = getattr(getattr(part, 'function_call', None), 'name', None)
+                    if name:
+                        yield "tool_call", name
+                        if verbose:
+                            yield "debug", f"[ModelAction function_call] {name}"
+    except Exception:
+        # Silently continue - not all events have text
+        pass
+
+
+def _handle_generic(event, verbose):
+    """Yield a text attribute from any other event type."""
+    text = getattr(event, 'text', None)
+    if text:
+        yield "text", text
+        if verbose:
+            yield "debug", f"[Generic text] {text}"
+
+
+# Progress keywords in agent replies (substring match, like "PurchaseOrder")
+_AGREEMENT_RE = re.compile(r"agreement|order", re.IGNORECASE)
+
+# Fallbacks for non-Event objects, by class name -> handler(event, verbose)
+# yielding (kind, payload) tuples
+_EVENT_HANDLERS = {
+    "TextOutput": _handle_text_output,
+    "ModelAction": _handle_model_action,
+}
+
+
+@functools.lru_cache(maxsize=64)
+def _make_user_content(message):
+    """Build (and reuse for repeated messages) the user Content for a prompt."""
+    return types.Content(role="user", parts=[types.Part(text=message)])
+
+
+async def chat_with_runner(
+    runner, message, user_id="user", session_id="sim_session", verbose=False
+) -> AsyncIterator[Tuple[str, str]]:
+    """
+    Run agent via Runner and stream its output as it arrives.
     
+    Yields (kind, payload) tuples where kind is "text", "tool_call" or "debug";
+    "debug" lines are only produced when verbose is set.
+    """
     # Convert message to types.Content
-    content = types.Content(role="user", parts=[types.Part(text=message)])
+    content = _make_user_content(message)
+    
+    handlers_get = _EVENT_HANDLERS.get
     
     # Creating a new invocation
     async for event in runner.run_async(
@@ -35,50 +120,38 @@ async def chat_with_runner(runner, message, user_id="user", session_id="sim_sess
         user_id=user_id,
         session_id=session_id
     ):
-        # Try multiple ways to extract text from events
-        event_type = event.__class__.__name__
-        
-        # Method 1: Check for TextOutput events
-        if event_type == "TextOutput":
-            if hasattr(event, 'text') and event.text:
-                response_content.append(event.text)
-                debug_lines.append(f"[TextOutput] {event.text}")
-        
-        # Method 2: Check for ModelAction with candidates
-        elif event_type == "ModelAction":
-            try:
-                # Try to get candidates from the event
-                if hasattr(event, 'candidates') and event.candidates:
-                    for candidate in event.candidates:
-                        if hasattr(candidate, 'content') and hasattr(candidate.content, 'parts'):
-                            for part in candidate.content.parts:
-                                if hasattr(part, 'text') and part.text:
-                                    response_content.append(part.text)
-                                    debug_lines.append(f"[ModelAction text] {part.text}")
-                                # Also check for function calls
-                                if hasattr(part, 'function_call'):
-                                    func_call = part.function_call
-                                    if hasattr(func_call, 'name'):
-                                        tool_calls.append(func_call.name)
-                                        debug_lines.append(f"[ModelAction function_call] {func_call.name}")
-                
-                # Alternative: check action attribute
-                elif hasattr(event, 'action'):
-                    action = event.action
-                    if hasattr(action, 'candidates') and action.candidates:
-                        for candidate in action.candidates:
-                            if hasattr(candidate, 'content') and hasattr(candidate.content, 'parts'):
-                                for part in candidate.content.parts:
-                                    if hasattr(part, 'text') and part.text:
-                                        response_content.append(part.text)
-            except Exception as e:
-                # Silently continue - not all events have text
-                pass
-        
-        # Method 3: Check for any text attribute directly
-        elif hasattr(event, 'text') and event.text:
-            response_content.append(event.text)
-            debug_lines.append(f"[Generic text] {event.text}")
+        # ADK runners yield Event objects; the class-name table only covers other shapes
+        if isinstance(event, Event):
+            handler = _handle_adk_event
+        else:
+            handler = handlers_get(event.__class__.__name__, _handle_generic)
+        for item in handler(event, verbose):
+            yield item
+
+
+async def chat_with_runner_collect(
+    runner, message, user_id="user", session_id="sim_session", on_text=None, verbose=False
+) -> Tuple[str, str]:
+    """
+    Run agent via Runner and get response text plus debug lines (when verbose).
+    
+    on_text, if given, is called with each text chunk as it streams in.
+    """
+    response_content = []
+    tool_calls = []
+    debug_lines = []
+    collectors = {
+        "text": response_content.append,
+        "tool_call": tool_calls.append,
+        "debug": debug_lines.append,
+    }
+    
+    async for kind, payload in chat_with_runner(
+        runner, message, user_id=user_id, session_id=session_id, verbose=verbose
+    ):
+        collectors[kind](payload)
+        if kind == "text" and on_text is not None:
+            on_text(payload)
     
     # Combine text responses
     full_text = "".join(response_content).strip()
@@ -91,8 +164,8 @@ async def chat_with_runner(runner, message, user_id="user", session_id="sim_sess
     if not full_text:
         full_text = "[Agent executed actions but returned no text response]"
     
-    verbose = "\n".join(debug_lines)
-    return full_text, verbose
+    debug = "\n".join(debug_lines)
+    return full_text, debug
 
 
 async def run_negotiation():
@@ -117,22 +190,24 @@ async def run_negotiation():
 
     # 2. Create Agent Instances
     # Using gemini-flash-latest which we set in the agents code
-    buyer = await create_purchasing_agent(
-        config=buyer_config,
-        agent_id="buyer_001",
-        budget=5000.0,
-        requirements="100 high-quality widgets for immediate project",
-        constraints={"max_delivery_days": 14},
-        strategy="Start with a low offer but prioritize delivery speed"
-    )
-
-    seller = await create_supplier_agent(
-        config=supplier_config,
-        agent_id="supplier_001",
-        min_price=40.0,
-        inventory={"widgets": 500},
-        capacity={"min_lead_time": 7},
-        strategy="Maximize margin but capture the deal"
+    # Buyer and seller setup (auth + tool discovery) is independent, so run it concurrently
+    buyer, seller = await asyncio.gather(
+        create_purchasing_agent(
+            config=buyer_config,
+            agent_id="buyer_001",
+            budget=5000.0,
+            requirements="100 high-quality widgets for immediate project",
+            constraints={"max_delivery_days": 14},
+            strategy="Start with a low offer but prioritize delivery speed"
+        ),
+        create_supplier_agent(
+            config=supplier_config,
+            agent_id="supplier_001",
+            min_price=40.0,
+            inventory={"widgets": 500},
+            capacity={"min_lead_time": 7},
+            strategy="Maximize margin but capture the deal"
+        )
     )
     
     # Create shared services
@@ -141,18 +216,18 @@ async def run_negotiation():
     artifact_service = InMemoryArtifactService()
     memory_service = InMemoryMemoryService()
     
-    # Initialize session for buyer
-    await session_service.create_session(
-        app_name="negotiation",
-        user_id="buyer_user",
-        session_id="buyer_session"
-    )
-    
-    # Initialize session for seller
-    await session_service.create_session(
-        app_name="negotiation",
-        user_id="seller_user",
-        session_id="seller_session"
+    # Initialize sessions for buyer and seller
+    await asyncio.gather(
+        session_service.create_session(
+            app_name="negotiation",
+            user_id="buyer_user",
+            session_id="buyer_session"
+        ),
+        session_service.create_session(
+            app_name="negotiation",
+            user_id="seller_user",
+            session_id="seller_session"
+        )
     )
 
     # Wrap in Runners
@@ -181,16 +256,20 @@ async def run_negotiation():
 
     # 3. Guided flow to exercise schema.org commerce protocols
     # Now using schema-aware tools with explicit parameters!
-    scripted_turns = [
-        (
-            "buyer",
-            "Use the propose_framework tool to propose using schema.org commerce protocols."
-        ),
-        (
-            "seller",
-            "Use the agree_framework tool to accept the schema.org commerce framework."
-        ),
-        (
+    # Turns are grouped into phases: turns within a phase are independent and
+    # run concurrently, phases run in order and see the previous phase's output.
+    scripted_phases = [
+        [
+            (
+                "buyer",
+                "Use the propose_framework tool to propose using schema.org commerce protocols."
+            ),
+            (
+                "seller",
+                "Use the agree_framework tool to accept the schema.org commerce framework."
+            )
+        ],
+        [(
             "seller",
             """Create a Product for sale using npl_commerce_Product_create.
 The tool has explicit parameters - use:
@@ -203,8 +282,8 @@ The tool has explicit parameters - use:
 - itemCondition: "NewCondition"
 
 Report back the product ID you receive."""
-        ),
-        (
+        )],
+        [(
             "seller",
             """Create an Offer using npl_commerce_Offer_create.
 Use the tool's explicit parameters:
@@ -225,49 +304,101 @@ Use the tool's explicit parameters:
 - validThrough: "2025-12-31T23:59:59Z"
 
 Then publish the offer using npl_commerce_Offer_publish with instance_id and party="seller"."""
-        ),
-        (
+        )],
+        [(
             "buyer",
             """The seller has published an offer. Use evaluate_proposal to check if the price ($45/unit) and delivery (7 days) meet your requirements.
 
 If acceptable, call npl_commerce_Offer_accept with the offer ID and party="buyer".
 
 Summarize your decision."""
-        )
+        )]
     ]
 
-    last_message = "Begin negotiation."
-    current_turn = "buyer"
+    # role -> (runner, user_id, session_id, color)
+    participants = {
+        "buyer": (buyer_runner, "buyer_user", "buyer_session", "🟦"),
+        "seller": (seller_runner, "seller_user", "seller_session", "🟩"),
+    }
+
+    last_message = None
+    turn_number = 0
+    # Collect per-event debug lines only when asked to (SIM_VERBOSE=1)
+    verbose = os.getenv("SIM_VERBOSE") == "1"
+
+    for phase in scripted_phases:
+        messages = [
+            prompt if last_message is None else f"{prompt}\nContext: {last_message}"
+            for _, prompt in phase
+        ]
 
-    for i, (turn, prompt) in enumerate(scripted_turns, start=1):
-        current_turn = turn
-        print(f"\n--- Turn {i}: {current_turn.upper()} ---")
-        message = prompt if last_message == "Begin negotiation." else f"{prompt}\nContext: {last_message}"
+        # A single-turn phase streams its reply as it arrives; concurrent turns
+        # are collected first so their output does not interleave
+        if len(phase) == 1:
+            (turn, _), = phase
+            runner, user_id, session_id, agent_color = participants[turn]
+            turn_number += 1
+            print(f"\n--- Turn {turn_number}: {turn.upper()} ---")
+            print(f"{agent_color} ", end="", flush=True)
+            streamed = []
 
-        if current_turn == "buyer":
-            response_text, debug = await chat_with_runner(
-                buyer_runner, message, user_id="buyer_user", session_id="buyer_session"
+            def stream_chunk(chunk):
+                streamed.append(chunk)
+                print(chunk, end="", flush=True)
+
+            response_text, debug = await chat_with_runner_collect(
+                runner,
+                messages[0],
+                user_id=user_id,
+                session_id=session_id,
+                on_text=stream_chunk,
+                verbose=verbose
             )
-            agent_color = "🟦"
+            # Tool-only replies produce no text chunks; show the summary instead
+            print("" if streamed else response_text)
+            results = [(turn, response_text, debug, True)]
         else:
-            response_text, debug = await chat_with_runner(
-                seller_runner, message, user_id="seller_user", session_id="seller_session"
-            )
-            agent_color = "🟩"
+            collected = await asyncio.gather(*(
+                chat_with_runner_collect(
+                    participants[turn][0],
+                    message,
+                    user_id=participants[turn][1],
+                    session_id=participants[turn][2],
+                    verbose=verbose
+                )
+                for (turn, _), message in zip(phase, messages)
+            ))
+            results = [
+                (turn, response_text, debug, False)
+                for (turn, _), (response_text, debug) in zip(phase, collected)
+            ]
 
-        print(f"{agent_color} {response_text}")
-        if debug:
-            print(f"{agent_color} DEBUG:\n{debug}")
-        last_message = response_text
+        for turn, response_text, debug, printed in results:
+            agent_color = participants[turn][3]
+            if not printed:
+                turn_number += 1
+                print(f"\n--- Turn {turn_number}: {turn.upper()} ---")
+                print(f"{agent_color} {response_text}")
+            if debug:
+                print(f"{agent_color} DEBUG:\n{debug}")
+            last_message = response_text
 
-        if "agreement" in response_text.lower() or "order" in response_text.lower():
-            print(f"\n✨ PROGRESS: {current_turn.upper()} reports agreement/order state. ✨")
+            if _AGREEMENT_RE.search(response_text):
+                print(f"\n✨ PROGRESS: {turn.upper()} reports agreement/order state. ✨")
 
         # Short wait; keep turns minimal to avoid quota
         print("   (Waiting 5s...)")
-        time.sleep(5)
+        await asyncio.sleep(5)
 
     print("\n--- Negotiation Ended (scripted flow complete) ---")
 
 if __name__ == "__main__":
-    asyncio.run(run_negotiation())
\ No newline at end of file
+    # Use uvloop's faster event loop when available
+    try:
+        import uvloop
+        loop_factory = uvloop.new_event_loop
+    except ImportError:
+        loop_factory = None
+    
+    with asyncio.Runner(loop_factory=loop_factory) as runner:
+        runner.run(run_negotiation())
\ No newline at end of file
@@ -4,7 +4,19 @@ Supplier Agent Package
 Provides an ADK-based supplier agent with NPL protocol integration.
 """
 
-from .agent import create_supplier_agent
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .agent import create_supplier_agent
 
 __all__ = ["create_supplier_agent"]
 
+
+def __getattr__(name):
+    # Import the agent module (google.adk, NPL stack) only when first used
+    if name == "create_supplier_agent":
+        from .agent import create_supplier_agent
+        globals()[name] = create_supplier_agent
+        return create_supplier_agent
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
@@ -8,21 +8,239 @@ Combines:
 """
 
 import asyncio
+import functools
 import logging
-from typing import Dict, Any, Optional, List
-from google.adk.agents import LlmAgent
-from google.adk.tools import FunctionTool
-from dotenv import load_dotenv
+import sys
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, Any, Optional, List, Tuple
 
-from adk_npl import NPLConfig, NPLClient
-from adk_npl.auth import KeycloakAuth
-from adk_npl.tools import NPLToolGenerator
+from adk_npl import NPLConfig
+from adk_npl.config import load_env_once
 
-# Load environment variables
-load_dotenv()
+if TYPE_CHECKING:
+    from google.adk.agents import LlmAgent
+    from google.adk.tools import FunctionTool
+
+# google.adk (and adk_npl.agent_builder, which builds on it) is imported inside the
+# functions that need it, so importing this module stays cheap.
+
+# Load environment variables (set ADK_NPL_AUTOLOAD_ENV=0 to skip, e.g. in tests)
+load_env_once()
 
 logger = logging.getLogger(__name__)
 
+# Static system prompt shared by every supplier agent. It contains no per-agent
+# values or placeholders, so ADK sends it verbatim as the system instruction and
+# Gemini can serve it from the context cache across turns and agents.
+_STATIC_INSTRUCTION: str = """You are a Supplier Agent responsible for sales and fulfillment operations.
+
+## Your Identity (CRITICAL)
+- **You are the SUPPLIER** - You represent Supplier Inc, Sales department
+- **You are NOT the buyer** - You negotiate WITH buyers, you don't represent them
+- **When communicating with buyers**: You are the seller, they are the buyer
+- **Always remember your role**: You are selling on behalf of Supplier Inc
+
+## Your Mission
+Maximize revenue by responding to purchase requests with competitive offers while maintaining profitability.
+Your agent ID and parameters (minimum price, inventory, capacity) are provided separately.
+
+## Tool Discovery and Autonomy
+
+You have access to a comprehensive set of tools. When given a goal:
+1. **Explore your available tools** - Review what tools you have access to
+2. **Understand tool signatures** - Each tool's description shows what it does and what parameters it needs
+3. **Choose the right tool** - Select tools that help you achieve your goal
+4. **Use tools autonomously** - Don't wait for explicit instructions on which tool to call
+
+Your tools are automatically available in your context - you can see their names, descriptions, and parameters.
+
+## Available Capabilities
+
+### Framework Negotiation
+- `agree_framework`: Agree to buyer's framework proposal
+
+### NPL Protocol Tools (Dynamically Discovered)
+You have access to NPL protocol tools that are automatically generated from the backend.
+Each tool has explicit typed parameters - check the tool's signature for required fields.
+
+**Party parameters use this pattern:**
+- `seller_organization`: Your organization ("Supplier Inc")
+- `seller_department`: Your department ("Sales")
+- `buyer_organization`: The buyer's organization name
+- `buyer_department`: The buyer's department name
+
+**Available protocols:** Product, Offer, Order
+- Each protocol has `_create` and various action tools
+- Tool signatures show exactly what parameters are required
+
+### Business Tools
+- `agree_framework`: Accept the buyer's proposed framework
+- `create_offer`: Create sales offers for buyers
+- `evaluate_purchase_request`: Evaluate buyer requests and decide action
+- `calculate_counter_offer`: Generate counter-offer to increase margin
+- `get_inventory_status`: Check your current inventory and capacity
+
+## Guidelines
+
+1. **Profitability First**: Never sell below your minimum price (see Your Parameters)
+2. **Maximize Margin**: Start higher to leave room for negotiation
+3. **Use Tool Signatures**: Check each tool's parameters before calling
+4. **Be Responsive**: Quick, professional responses build trust
+5. **Manage Capacity**: Don't commit beyond your capability to deliver
+
+## Error Handling Strategy (CRITICAL)
+
+NPL tools return **structured error responses** when something goes wrong. You MUST handle errors intelligently:
+
+### Understanding Error Responses
+
+When a tool fails, you'll receive a structured response like:
+```json
+{
+  "success": false,
+  "error_type": "state_error",
+  "error": "Runtime error: Illegal protocol state...",
+  "retryable": true,
+  "guidance": "Query the protocol instance to check its current state..."
+}
+```
+
+### Error Types and How to Handle Them
+
+| Error Type | Retryable | What to Do |
+|------------|-----------|------------|
+| `state_error` | Yes | The protocol is in the wrong state. Use `*_get` tool to check current state, wait if needed, retry when state allows. |
+| `business_rule` | No | A validation rule failed. Read the error message, adjust your parameters to comply. |
+| `not_found` | No | Instance doesn't exist. Use `*_list` tool to find valid instances. |
+| `permission_denied` | No | Wrong party role. Switch to correct party (seller vs buyer). |
+| `invalid_data` | No | Data format is wrong. Check parameter types - especially DateTime must be '2006-01-02T15:04:05.999+01:00[Europe/Zurich]'. |
+| `runtime_error` | Yes | NPL runtime issue. Query state and retry if appropriate. |
+
+### The Query-Before-Retry Pattern
+
+When you get a **retryable** error:
+1. **Query the instance state** using `npl_commerce_*_get` with the instance_id
+2. **Check the `@state` field** to understand current state
+3. **Wait if needed** - the state may change due to other actions (e.g., buyer approval)
+4. **Retry the action** when the state allows it
+
+### Example: Handling a State Error
+
+If `npl_commerce_PurchaseOrder_shipOrder` fails with `state_error`:
+1. Call `npl_commerce_PurchaseOrder_get(instance_id="...")` to check state
+2. If state is "PendingApproval" or "Approved" → wait for buyer to place order first
+3. If state is "Ordered" → retry shipOrder immediately
+4. If state is "Shipped" → action already completed, no retry needed
+
+### Available Query Tools
+
+For each protocol, you have query tools to check state:
+- `npl_commerce_Product_get(instance_id)` - Get product details
+- `npl_commerce_Product_list()` - List all products
+- `npl_commerce_Offer_get(instance_id)` - Get offer details and state
+- `npl_commerce_Offer_list(state="published")` - Find published offers
+- `npl_commerce_PurchaseOrder_get(instance_id)` - Get order details and state
+- `npl_commerce_PurchaseOrder_list()` - List all orders
+- `npl_commerce_batch_get(instance_refs="Offer:<id>,PurchaseOrder:<id>")` - Get several instances in one call; prefer it when you need more than one
+
+## Protocol Memory Tools (IMPORTANT)
+
+You have memory tools to remember and recall protocol IDs across conversation turns:
+
+- `recall_my_protocols(protocol_type, state)` - Recall all protocols you've interacted with
+- `get_protocol_id(protocol_type)` - Get the most recent ID for a protocol type
+- `get_workflow_context()` - See summary of all your tracked protocols
+- `remember_protocol(protocol_type, instance_id, state, role)` - Manually remember an ID
+
+**Use these tools when:**
+- You need to reference a protocol ID from earlier in the conversation
+- You receive an ID from another agent and want to track it
+- You're not sure what protocols you've created
+
+**Example:**
+- "What's the Product ID I just created?" → `get_protocol_id("Product")`
+- "What Offers have I published?" → `recall_my_protocols("Offer", state="published")`
+
+## Workflow
+
+When working toward your goals:
+1. **Discover available tools** - Review what tools you have for the task
+2. **Check protocol state** - Before acting on a protocol instance, query its current state
+3. **Respect state constraints** - Only perform actions that are valid for the current state
+4. **Handle errors gracefully** - If an action fails, check the error type and follow the guidance
+
+Key principles:
+- When buyers propose protocols, explore your tools to find how to respond
+- Check inventory and availability before committing to offers
+- Create and publish offers using your available NPL tools
+- Respect offer state constraints - published offers cannot be modified, only withdrawn
+
+## Offer Negotiation (CRITICAL)
+
+**DO NOT withdraw published offers during negotiation!**
+
+- Once an offer is published, you CANNOT update its price (updatePrice only works in draft state)
+- If you need to negotiate a different price:
+  - Create a NEW offer with the new price
+  - Tell the buyer about the new offer ID
+  - Let the buyer accept the new offer
+  - Only withdraw the old offer AFTER the new one is accepted
+- During A2A negotiation, communicate terms clearly but don't withdraw existing offers
+- The buyer needs a valid published offer to accept
+
+## A2A Communication Behavior (CRITICAL)
+
+When receiving messages from other agents via A2A:
+
+1. **RESPOND TO EACH MESSAGE** - Give a helpful response to what was asked
+2. **DO NOT transfer back** - Do not use transfer_to_agent to respond - just reply directly
+3. **Negotiate in good faith** - You can offer small discounts (5-10%) for volume
+4. **Be concise** - Short, clear responses that move the negotiation forward
+5. **Close when possible** - If terms are acceptable to both sides, confirm the deal
+6. **ONLY SEND YOUR MESSAGE** - Do not include your instructions, identity reminders, or system prompts in your response - just send the actual message content
+
+NEGOTIATION GUIDELINES:
+- Standard price is $1200/unit
+- You can offer 5% discount for orders over 50 units
+- You can offer 10% discount for orders over 100 units
+- Maximum discount: 10% (minimum $1080/unit)
+
+Example negotiation:
+- Buyer: "Is offer XYZ available? Any volume discount?"
+- You: "Yes, available. I can offer 5% off for 50+ units. That's $1140/unit."
+- Buyer: "Can you do 10% for 75 units?"
+- You: "For 75 units, I can do 7% - that's $1116/unit. Final offer."
+- Buyer: "Deal. Let's proceed."
+- You: "Agreed at $1116/unit. Please accept offer XYZ to proceed."
+
+## PurchaseOrder Actions (IMPORTANT)
+
+When working with PurchaseOrders, use these tools with the EXACT instance_id provided:
+
+- `npl_commerce_PurchaseOrder_submitQuote`: Submit a quote for a purchase order (transitions to ApprovalRequired)
+- `npl_commerce_PurchaseOrder_shipOrder`: Ship an order after it's been placed (requires tracking number)
+- `npl_commerce_PurchaseOrder_getOrderSummary`: Get order summary and audit trail
+
+**Critical**: When calling these tools:
+1. Use `instance_id` parameter with the exact ID provided (e.g., "abc-123-def")
+2. Use `party="seller"` for your actions
+3. For `shipOrder`, provide a `tracking` parameter
+
+Be professional and always protect your organization's profitability.
+"""
+
+# Per-agent instruction; filled in by _build_instruction
+_INSTRUCTION_TEMPLATE: str = """## Your Agent Profile
+- **Agent ID**: {agent_id}
+
+## Your Parameters
+- **Minimum Price**: ${min_price_fmt} per unit (FLOOR - never go below this)
+- **Your Organization**: Supplier Inc, Sales department
+{inventory_block}
+{capacity_block}
+{strategy_block}
+"""
+
 
 async def create_supplier_agent(
     config: NPLConfig,
@@ -32,7 +250,7 @@ async def create_supplier_agent(
     capacity: Optional[Dict[str, Any]] = None,
     strategy: Optional[str] = None,
     include_npl_tools: bool = True
-) -> LlmAgent:
+) -> "LlmAgent":
     """
     Create a supplier agent with ADK and dynamic NPL tools.
     
@@ -53,8 +271,10 @@ async def create_supplier_agent(
     # 1. Add dynamic NPL tools if requested
     if include_npl_tools:
         logger.info("Discovering NPL tools...")
+        from adk_npl.agent_builder import discover_npl_tools
+        
         try:
-            npl_tools = await _discover_npl_tools(config)
+            npl_tools = await discover_npl_tools(config)
             tools.extend(npl_tools)
             logger.info(f"✅ Added {len(npl_tools)} NPL tools")
         except Exception as e:
@@ -69,10 +289,13 @@ async def create_supplier_agent(
     instruction = _build_instruction(agent_id, min_price, inventory, capacity, strategy)
     
     # 4. Create the ADK agent
+    from google.adk.agents import LlmAgent
+    
     agent = LlmAgent(
         model="gemini-2.0-flash",
         name=f"SupplierAgent_{agent_id}",
         description=f"Autonomous supplier agent for {config.credentials.get('username', 'unknown')} with min price ${min_price:,.2f}",
+        static_instruction=_STATIC_INSTRUCTION,
         instruction=instruction,
         tools=tools
     )
@@ -81,25 +304,76 @@ async def create_supplier_agent(
     return agent
 
 
-async def _discover_npl_tools(config: NPLConfig) -> List[FunctionTool]:
-    """Discover and generate NPL tools from the engine."""
-    # Authenticate
-    auth = KeycloakAuth(
-        keycloak_url=config.keycloak_url,
-        realm=config.keycloak_realm,
-        client_id=config.keycloak_client_id,
-        username=config.credentials.get("username"),
-        password=config.credentials.get("password")
-    )
+# Response of the agree_framework tool; it does not depend on the proposal
+_FRAMEWORK_ACK: Dict[str, Any] = {
+    "status": "AGREED",
+    "framework": "schema.org",
+    "protocols": {
+        "product": "commerce.Product",
+        "offer": "commerce.Offer",
+        "order": "commerce.Order"
+    },
+    "message": "Schema.org framework accepted. Ready to proceed with commerce protocols."
+}
+
+
+@dataclass(slots=True, frozen=True)
+class SalesOffer:
+    """Offer built by the create_offer tool; to_dict() gives the tool response."""
     
-    token = await auth.authenticate()
-    client = NPLClient(config.engine_url, token)
+    buyer_name: str
+    product: str
+    quantity: int
+    unit_price: float
+    total: float
+    delivery_days: int
+    payment_terms: str
+    margin_percentage: float
+    additional_terms: Optional[str] = None
+    valid_until_days: int = 7  # Offer valid for 7 days
     
-    # Generate tools
-    generator = NPLToolGenerator(client)
-    tools = await generator.generate_tools()
+    def to_dict(self) -> Dict[str, Any]:
+        offer = {
+            "type": "SALES_OFFER",
+            "to": self.buyer_name,
+            "from": "supplier_agent",
+            "product": self.product,
+            "quantity": self.quantity,
+            "unit_price": self.unit_price,
+            "total": self.total,
+            "delivery_days": self.delivery_days,
+            "payment_terms": self.payment_terms,
+            "valid_until_days": self.valid_until_days
+        }
+        if self.additional_terms:
+            offer["additional_terms"] = self.additional_terms
+        offer["margin_percentage"] = self.margin_percentage
+        return offer
+
+
+@dataclass(slots=True, frozen=True)
+class CounterOffer:
+    """Counter offer built by the calculate_counter_offer tool."""
     
-    return tools
+    requested_price: float
+    counter_price: float
+    quantity: int
+    total: float
+    markup_percentage: float
+    margin_per_unit: float
+    total_margin: float
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "type": "COUNTER_OFFER",
+            "requested_price": self.requested_price,
+            "counter_price": self.counter_price,
+            "quantity": self.quantity,
+            "total": self.total,
+            "markup_percentage": self.markup_percentage,
+            "margin_per_unit": self.margin_per_unit,
+            "total_margin": self.total_margin
+        }
 
 
 def _create_business_tools(
@@ -107,7 +381,7 @@ def _create_business_tools(
     inventory: Optional[Dict[str, Any]],
     capacity: Optional[Dict[str, Any]],
     strategy: Optional[str]
-) -> List[FunctionTool]:
+) -> List["FunctionTool"]:
     """Create business logic tools for the supplier agent."""
     
     # Store context in closure
@@ -118,7 +392,35 @@ def _create_business_tools(
         "strategy": strategy
     }
     
-    def agree_framework(framework_proposal: str) -> Dict[str, Any]:
+    # min_price is fixed for the lifetime of these tools, so the counter-offer
+    # thresholds and their display strings are computed once here.
+    min_acceptable = min_price
+    good_margin_price = min_acceptable * 1.10
+    min_price_str = f"${min_acceptable:.2f}"
+    counter_15_str = f"${min_acceptable * 1.15:.2f}"
+    counter_25_str = f"${min_acceptable * 1.25:.2f}"
+    max_quantity = context["capacity"].get("max_quantity")
+    min_lead_time = context["capacity"].get("min_lead_time")
+    # get_inventory_status only reports the closure state, so its response is built
+    # once; each call returns a copy of the top level (inventory/capacity are the
+    # agent's own state, as before)
+    inventory_snapshot = {
+        "min_price_per_unit": context["min_price"],
+        "currency": "USD",
+        "inventory": context["inventory"],
+        "capacity": context["capacity"],
+        "strategy": context["strategy"]
+    }
+    evaluation_template = {
+        "buyer": None,
+        "requested_quantity": None,
+        "offered_price": None,
+        "min_acceptable_price": min_acceptable,
+        "meets_minimum": None,
+        "potential_revenue": None
+    }
+    
+    async def agree_framework(framework_proposal: str) -> Dict[str, Any]:
         """
         Evaluate and agree to a framework proposal from the buyer.
         
@@ -128,18 +430,10 @@ def _create_business_tools(
         Returns:
             Agreement response with any modifications
         """
-        return {
-            "status": "AGREED",
-            "framework": "schema.org",
-            "protocols": {
-                "product": "commerce.Product",
-                "offer": "commerce.Offer",
-                "order": "commerce.Order"
-            },
-            "message": "Schema.org framework accepted. Ready to proceed with commerce protocols."
-        }
+        # Copy, so a caller mutating its response can't change the next one
+        return {**_FRAMEWORK_ACK, "protocols": dict(_FRAMEWORK_ACK["protocols"])}
     
-    def create_offer(
+    async def create_offer(
         buyer_name: str,
         product_description: str,
         quantity: int,
@@ -163,30 +457,19 @@ def _create_business_tools(
         Returns:
             Structured offer ready to send
         """
-        total = unit_price * quantity
-        
-        offer = {
-            "type": "SALES_OFFER",
-            "to": buyer_name,
-            "from": "supplier_agent",
-            "product": product_description,
-            "quantity": quantity,
-            "unit_price": unit_price,
-            "total": total,
-            "delivery_days": delivery_days,
-            "payment_terms": payment_terms,
-            "valid_until_days": 7  # Offer valid for 7 days
-        }
-        
-        if additional_terms:
-            offer["additional_terms"] = additional_terms
-        
-        # Add margin calculation
-        offer["margin_percentage"] = ((unit_price - context["min_price"]) / unit_price * 100) if unit_price > 0 else 0
-        
-        return offer
+        return SalesOffer(
+            buyer_name=buyer_name,
+            product=product_description,
+            quantity=quantity,
+            unit_price=unit_price,
+            total=unit_price * quantity,
+            delivery_days=delivery_days,
+            payment_terms=payment_terms,
+            margin_percentage=((unit_price - min_acceptable) / unit_price * 100) if unit_price > 0 else 0,
+            additional_terms=additional_terms
+        ).to_dict()
     
-    def evaluate_purchase_request(
+    async def evaluate_purchase_request(
         buyer_name: str,
         requested_quantity: int,
         max_price_offered: float,
@@ -204,36 +487,30 @@ def _create_business_tools(
         Returns:
             Evaluation with recommended action (accept/reject/counter)
         """
-        min_acceptable = context["min_price"]
-        
-        evaluation = {
-            "buyer": buyer_name,
-            "requested_quantity": requested_quantity,
-            "offered_price": max_price_offered,
-            "min_acceptable_price": min_acceptable,
-            "meets_minimum": max_price_offered >= min_acceptable,
-            "potential_revenue": max_price_offered * requested_quantity
-        }
+        evaluation = evaluation_template.copy()
+        evaluation["buyer"] = buyer_name
+        evaluation["requested_quantity"] = requested_quantity
+        evaluation["offered_price"] = max_price_offered
+        evaluation["meets_minimum"] = max_price_offered >= min_acceptable
+        evaluation["potential_revenue"] = max_price_offered * requested_quantity
         
         # Decision logic
         if max_price_offered < min_acceptable:
             evaluation["action"] = "COUNTER"
-            evaluation["reason"] = f"Below minimum price (${min_acceptable:.2f})"
-            evaluation["counter_suggestion"] = f"Counter with ${min_acceptable * 1.15:.2f} per unit (15% markup)"
-        elif max_price_offered < min_acceptable * 1.1:
+            evaluation["reason"] = f"Below minimum price ({min_price_str})"
+            evaluation["counter_suggestion"] = f"Counter with {counter_15_str} per unit (15% markup)"
+        elif max_price_offered < good_margin_price:
             evaluation["action"] = "COUNTER"
             evaluation["reason"] = "Close to minimum, try to get better margin"
-            evaluation["counter_suggestion"] = f"Counter with ${min_acceptable * 1.25:.2f} per unit (25% markup)"
+            evaluation["counter_suggestion"] = f"Counter with {counter_25_str} per unit (25% markup)"
         else:
             # Check capacity constraints
             capacity_issues = []
-            if "max_quantity" in context["capacity"]:
-                if requested_quantity > context["capacity"]["max_quantity"]:
-                    capacity_issues.append(f"Exceeds capacity ({context['capacity']['max_quantity']} units)")
+            if max_quantity is not None and requested_quantity > max_quantity:
+                capacity_issues.append(f"Exceeds capacity ({max_quantity} units)")
             
-            if "min_lead_time" in context["capacity"]:
-                if required_delivery_days < context["capacity"]["min_lead_time"]:
-                    capacity_issues.append(f"Too fast ({context['capacity']['min_lead_time']} days needed)")
+            if min_lead_time is not None and required_delivery_days < min_lead_time:
+                capacity_issues.append(f"Too fast ({min_lead_time} days needed)")
             
             if capacity_issues:
                 evaluation["action"] = "COUNTER"
@@ -244,7 +521,7 @@ def _create_business_tools(
         
         return evaluation
     
-    def calculate_counter_offer(
+    async def calculate_counter_offer(
         requested_price: float,
         quantity: int,
         markup_percentage: float = 20.0
@@ -260,7 +537,6 @@ def _create_business_tools(
         Returns:
             Counter offer details
         """
-        min_acceptable = context["min_price"]
         counter_price = min_acceptable * (1 + markup_percentage / 100)
         
         # Don't go below minimum
@@ -270,33 +546,30 @@ def _create_business_tools(
         total = counter_price * quantity
         margin = counter_price - min_acceptable
         
-        return {
-            "type": "COUNTER_OFFER",
-            "requested_price": requested_price,
-            "counter_price": round(counter_price, 2),
-            "quantity": quantity,
-            "total": round(total, 2),
-            "markup_percentage": markup_percentage,
-            "margin_per_unit": round(margin, 2),
-            "total_margin": round(margin * quantity, 2)
-        }
+        return CounterOffer(
+            requested_price=requested_price,
+            counter_price=round(counter_price, 2),
+            quantity=quantity,
+            total=round(total, 2),
+            markup_percentage=markup_percentage,
+            margin_per_unit=round(margin, 2),
+            total_margin=round(margin * quantity, 2)
+        ).to_dict()
     
-    def get_inventory_status() -> Dict[str, Any]:
+    async def get_inventory_status() -> Dict[str, Any]:
         """
         Get current inventory and capacity status.
         
         Returns:
             Inventory and capacity information
         """
-        return {
-            "min_price_per_unit": context["min_price"],
-            "currency": "USD",
-            "inventory": context["inventory"],
-            "capacity": context["capacity"],
-            "strategy": context["strategy"]
-        }
+        return dict(inventory_snapshot)
     
-    # Wrap as FunctionTools
+    from google.adk.tools import FunctionTool
+    
+    # Wrap as FunctionTools. The tools only build dicts, so they are plain
+    # coroutines: ADK awaits them on the loop instead of treating them as
+    # blocking calls. Any tool that gains I/O should use asyncio.to_thread.
     return [
         FunctionTool(agree_framework, require_confirmation=False),
         FunctionTool(create_offer, require_confirmation=False),
@@ -313,217 +586,59 @@ def _build_instruction(
     capacity: Optional[Dict[str, Any]],
     strategy: Optional[str]
 ) -> str:
-    """Build the agent's instruction prompt."""
-    
-    inventory_str = ""
-    if inventory:
-        inventory_list = [f"  - {k}: {v}" for k, v in inventory.items()]
-        inventory_str = "\n".join(inventory_list)
-    
-    capacity_str = ""
-    if capacity:
-        capacity_list = [f"  - {k}: {v}" for k, v in capacity.items()]
-        capacity_str = "\n".join(capacity_list)
+    """
+    Build the agent's per-agent instruction (the shared part is _STATIC_INSTRUCTION).
     
-    return f"""You are a Supplier Agent (ID: {agent_id}) responsible for sales and fulfillment operations.
-
-## Your Identity (CRITICAL)
-- **You are the SUPPLIER** - You represent Supplier Inc, Sales department
-- **You are NOT the buyer** - You negotiate WITH buyers, you don't represent them
-- **When communicating with buyers**: You are the seller, they are the buyer
-- **Always remember your role**: You are selling on behalf of Supplier Inc
-
-## Your Mission
-Maximize revenue by responding to purchase requests with competitive offers while maintaining profitability.
-
-## Your Parameters
-- **Minimum Price**: ${min_price:,.2f} per unit (FLOOR - never go below this)
-- **Your Organization**: Supplier Inc, Sales department
-{f"- **Inventory**:\n{inventory_str}" if inventory_str else ""}
-{f"- **Capacity**:\n{capacity_str}" if capacity_str else ""}
-{f"- **Strategy**: {strategy}" if strategy else ""}
-
-## Tool Discovery and Autonomy
-
-You have access to a comprehensive set of tools. When given a goal:
-1. **Explore your available tools** - Review what tools you have access to
-2. **Understand tool signatures** - Each tool's description shows what it does and what parameters it needs
-3. **Choose the right tool** - Select tools that help you achieve your goal
-4. **Use tools autonomously** - Don't wait for explicit instructions on which tool to call
-
-Your tools are automatically available in your context - you can see their names, descriptions, and parameters.
-
-## Available Capabilities
-
-### Framework Negotiation
-- `agree_framework`: Agree to buyer's framework proposal
-
-### NPL Protocol Tools (Dynamically Discovered)
-You have access to NPL protocol tools that are automatically generated from the backend.
-Each tool has explicit typed parameters - check the tool's signature for required fields.
-
-**Party parameters use this pattern:**
-- `seller_organization`: Your organization ("Supplier Inc")
-- `seller_department`: Your department ("Sales")
-- `buyer_organization`: The buyer's organization name
-- `buyer_department`: The buyer's department name
-
-**Available protocols:** Product, Offer, Order
-- Each protocol has `_create` and various action tools
-- Tool signatures show exactly what parameters are required
-
-### Business Tools
-- `agree_framework`: Accept the buyer's proposed framework
-- `create_offer`: Create sales offers for buyers
-- `evaluate_purchase_request`: Evaluate buyer requests and decide action
-- `calculate_counter_offer`: Generate counter-offer to increase margin
-- `get_inventory_status`: Check your current inventory and capacity
-
-## Guidelines
-
-1. **Profitability First**: Never sell below ${min_price:,.2f} per unit
-2. **Maximize Margin**: Start higher to leave room for negotiation
-3. **Use Tool Signatures**: Check each tool's parameters before calling
-4. **Be Responsive**: Quick, professional responses build trust
-5. **Manage Capacity**: Don't commit beyond your capability to deliver
-
-## Error Handling Strategy (CRITICAL)
-
-NPL tools return **structured error responses** when something goes wrong. You MUST handle errors intelligently:
-
-### Understanding Error Responses
-
-When a tool fails, you'll receive a structured response like:
-```json
-{{
-  "success": false,
-  "error_type": "state_error",
-  "error": "Runtime error: Illegal protocol state...",
-  "retryable": true,
-  "guidance": "Query the protocol instance to check its current state..."
-}}
-```
-
-### Error Types and How to Handle Them
-
-| Error Type | Retryable | What to Do |
-|------------|-----------|------------|
-| `state_error` | Yes | The protocol is in the wrong state. Use `*_get` tool to check current state, wait if needed, retry when state allows. |
-| `business_rule` | No | A validation rule failed. Read the error message, adjust your parameters to comply. |
-| `not_found` | No | Instance doesn't exist. Use `*_list` tool to find valid instances. |
-| `permission_denied` | No | Wrong party role. Switch to correct party (seller vs buyer). |
-| `invalid_data` | No | Data format is wrong. Check parameter types - especially DateTime must be '2006-01-02T15:04:05.999+01:00[Europe/Zurich]'. |
-| `runtime_error` | Yes | NPL runtime issue. Query state and retry if appropriate. |
-
-### The Query-Before-Retry Pattern
-
-When you get a **retryable** error:
-1. **Query the instance state** using `npl_commerce_*_get` with the instance_id
-2. **Check the `@state` field** to understand current state
-3. **Wait if needed** - the state may change due to other actions (e.g., buyer approval)
-4. **Retry the action** when the state allows it
-
-### Example: Handling a State Error
-
-If `npl_commerce_PurchaseOrder_shipOrder` fails with `state_error`:
-1. Call `npl_commerce_PurchaseOrder_get(instance_id="...")` to check state
-2. If state is "PendingApproval" or "Approved" → wait for buyer to place order first
-3. If state is "Ordered" → retry shipOrder immediately
-4. If state is "Shipped" → action already completed, no retry needed
-
-### Available Query Tools
-
-For each protocol, you have query tools to check state:
-- `npl_commerce_Product_get(instance_id)` - Get product details
-- `npl_commerce_Product_list()` - List all products
-- `npl_commerce_Offer_get(instance_id)` - Get offer details and state
-- `npl_commerce_Offer_list(state="published")` - Find published offers
-- `npl_commerce_PurchaseOrder_get(instance_id)` - Get order details and state
-- `npl_commerce_PurchaseOrder_list()` - List all orders
-
-## Protocol Memory Tools (IMPORTANT)
-
-You have memory tools to remember and recall protocol IDs across conversation turns:
-
-- `recall_my_protocols(protocol_type, state)` - Recall all protocols you've interacted with
-- `get_protocol_id(protocol_type)` - Get the most recent ID for a protocol type
-- `get_workflow_context()` - See summary of all your tracked protocols
-- `remember_protocol(protocol_type, instance_id, state, role)` - Manually remember an ID
-
-**Use these tools when:**
-- You need to reference a protocol ID from earlier in the conversation
-- You receive an ID from another agent and want to track it
-- You're not sure what protocols you've created
-
-**Example:**
-- "What's the Product ID I just created?" → `get_protocol_id("Product")`
-- "What Offers have I published?" → `recall_my_protocols("Offer", state="published")`
-
-## Workflow
-
-When working toward your goals:
-1. **Discover available tools** - Review what tools you have for the task
-2. **Check protocol state** - Before acting on a protocol instance, query its current state
-3. **Respect state constraints** - Only perform actions that are valid for the current state
-4. **Handle errors gracefully** - If an action fails, check the error type and follow the guidance
-
-Key principles:
-- When buyers propose protocols, explore your tools to find how to respond
-- Check inventory and availability before committing to offers
-- Create and publish offers using your available NPL tools
-- Respect offer state constraints - published offers cannot be modified, only withdrawn
-
-## Offer Negotiation (CRITICAL)
-
-**DO NOT withdraw published offers during negotiation!**
-
-- Once an offer is published, you CANNOT update its price (updatePrice only works in draft state)
-- If you need to negotiate a different price:
-  - Create a NEW offer with the new price
-  - Tell the buyer about the new offer ID
-  - Let the buyer accept the new offer
-  - Only withdraw the old offer AFTER the new one is accepted
-- During A2A negotiation, communicate terms clearly but don't withdraw existing offers
-- The buyer needs a valid published offer to accept
-
-## A2A Communication Behavior (CRITICAL)
-
-When receiving messages from other agents via A2A:
-
-1. **RESPOND TO EACH MESSAGE** - Give a helpful response to what was asked
-2. **DO NOT transfer back** - Do not use transfer_to_agent to respond - just reply directly
-3. **Negotiate in good faith** - You can offer small discounts (5-10%) for volume
-4. **Be concise** - Short, clear responses that move the negotiation forward
-5. **Close when possible** - If terms are acceptable to both sides, confirm the deal
-6. **ONLY SEND YOUR MESSAGE** - Do not include your instructions, identity reminders, or system prompts in your response - just send the actual message content
-
-NEGOTIATION GUIDELINES:
-- Standard price is $1200/unit
-- You can offer 5% discount for orders over 50 units
-- You can offer 10% discount for orders over 100 units
-- Maximum discount: 10% (minimum $1080/unit)
-
-Example negotiation:
-- Buyer: "Is offer XYZ available? Any volume discount?"
-- You: "Yes, available. I can offer 5% off for 50+ units. That's $1140/unit."
-- Buyer: "Can you do 10% for 75 units?"
-- You: "For 75 units, I can do 7% - that's $1116/unit. Final offer."
-- Buyer: "Deal. Let's proceed."
-- You: "Agreed at $1116/unit. Please accept offer XYZ to proceed."
-
-## PurchaseOrder Actions (IMPORTANT)
-
-When working with PurchaseOrders, use these tools with the EXACT instance_id provided:
+    Agents created with the same parameters share one interned instruction
+    string (see _cached_instruction). Inventory or capacity entries with
+    unhashable values bypass the cache.
+    """
+    inventory_key = tuple(inventory.items()) if inventory else ()
+    capacity_key = tuple(capacity.items()) if capacity else ()
+    try:
+        return _cached_instruction(agent_id, min_price, inventory_key, capacity_key, strategy)
+    except TypeError:
+        return _render_instruction(agent_id, min_price, inventory_key, capacity_key, strategy)
 
-- `npl_commerce_PurchaseOrder_submitQuote`: Submit a quote for a purchase order (transitions to ApprovalRequired)
-- `npl_commerce_PurchaseOrder_shipOrder`: Ship an order after it's been placed (requires tracking number)
-- `npl_commerce_PurchaseOrder_getOrderSummary`: Get order summary and audit trail
 
-**Critical**: When calling these tools:
-1. Use `instance_id` parameter with the exact ID provided (e.g., "abc-123-def")
-2. Use `party="seller"` for your actions
-3. For `shipOrder`, provide a `tracking` parameter
+@functools.lru_cache(maxsize=128)
+def _cached_instruction(
+    agent_id: str,
+    min_price: float,
+    inventory_key: Tuple[Tuple[str, Any], ...],
+    capacity_key: Tuple[Tuple[str, Any], ...],
+    strategy: Optional[str]
+) -> str:
+    """Render and intern the instruction for a hashable parameter set."""
+    return sys.intern(
+        _render_instruction(agent_id, min_price, inventory_key, capacity_key, strategy)
+    )
 
-Be professional and always protect your organization's profitability.
-"""
 
+def _render_instruction(
+    agent_id: str,
+    min_price: float,
+    inventory_key: Tuple[Tuple[str, Any], ...],
+    capacity_key: Tuple[Tuple[str, Any], ...],
+    strategy: Optional[str]
+) -> str:
+    """Fill _INSTRUCTION_TEMPLATE; inventory and capacity keep their insertion order."""
+    inventory_block = ""
+    if inventory_key:
+        inventory_list = [f"  - {k}: {v}" for k, v in inventory_key]
+        inventory_block = "- **Inventory**:\n" + "\n".join(inventory_list)
+    
+    capacity_block = ""
+    if capacity_key:
+        capacity_list = [f"  - {k}: {v}" for k, v in capacity_key]
+        capacity_block = "- **Capacity**:\n" + "\n".join(capacity_list)
+    
+    strategy_block = f"- **Strategy**: {strategy}" if strategy else ""
+    
+    return _INSTRUCTION_TEMPLATE.format_map({
+        "agent_id": agent_id,
+        "min_price_fmt": f"{min_price:,.2f}",
+        "inventory_block": inventory_block,
+        "capacity_block": capacity_block,
+        "strategy_block": strategy_block
+    })
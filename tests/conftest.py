@@ -3,15 +3,20 @@ Pytest configuration and shared fixtures for ADK-NPL tests.
 """
 
 import os
+import json
 import pytest
+import pytest_asyncio
+from collections import deque
 from typing import Optional
 from unittest.mock import Mock
 
 from adk_npl import NPLConfig, NPLClient
-from adk_npl.auth import KeycloakAuth
+from adk_npl.auth import KeycloakTokenCache
+from adk_npl.retry import CircuitBreaker
+from tests.test_utils import close_shared_adapter, shared_adapter
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def npl_config():
     """Fixture providing NPL configuration from environment."""
     engine_url = os.getenv("NPL_ENGINE_URL", "http://localhost:12000")
@@ -27,19 +32,79 @@ def npl_config():
     )
 
 
-@pytest.fixture
-async def authenticated_client(npl_config):
-    """Fixture providing authenticated NPL client."""
-    auth = KeycloakAuth(
+async def _authenticate(
+    realm: str,
+    client_id: str,
+    username: str,
+    keycloak_url: Optional[str] = None,
+    password: Optional[str] = None
+) -> str:
+    """
+    Fetch a Keycloak token for a seeded test user.
+    
+    Goes through KeycloakTokenCache, so fixtures (and agent factories in the
+    same process) asking for the same identity share one token until it
+    nears expiry instead of each logging in.
+    """
+    return await KeycloakTokenCache.get_or_refresh(
+        keycloak_url=keycloak_url or os.getenv("NPL_KEYCLOAK_URL", "http://localhost:11000"),
+        realm=realm,
+        client_id=client_id,
+        username=username,
+        password=password or os.getenv("SEED_TEST_USERS_PASSWORD", "Welcome123"),
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    """Pin live-engine tests to one xdist worker; unit tests spread freely."""
+    engine_group = pytest.mark.xdist_group("engine")
+    for item in items:
+        if item.get_closest_marker("integration"):
+            item.add_marker(engine_group)
+
+
+@pytest_asyncio.fixture(scope="session")
+async def authenticated_client(npl_config, http_adapter):
+    """Fixture providing an authenticated NPL client, created once per test session (per xdist worker)."""
+    token = await _authenticate(
+        npl_config.keycloak_realm,
+        npl_config.keycloak_client_id,
+        npl_config.credentials["username"],
         keycloak_url=npl_config.keycloak_url,
-        realm=npl_config.keycloak_realm,
-        client_id=npl_config.keycloak_client_id,
-        username=npl_config.credentials["username"],
         password=npl_config.credentials["password"],
     )
-    token = await auth.authenticate()
-    client = NPLClient(base_url=npl_config.engine_url, auth_token=token)
-    return client
+    return NPLClient(base_url=npl_config.engine_url, auth_token=token, adapter=http_adapter)
+
+
+@pytest_asyncio.fixture(scope="session")
+async def supplier_token():
+    """Fixture providing a supplier_agent token, fetched once per test session."""
+    return await _authenticate("supplier", "supplier", "supplier_agent")
+
+
+@pytest_asyncio.fixture(scope="session")
+async def buyer_token():
+    """Fixture providing a purchasing_agent token, fetched once per test session."""
+    return await _authenticate("purchasing", "purchasing", "purchasing_agent")
+
+
+@pytest.fixture(scope="session")
+def http_adapter():
+    """Fixture providing a keep-alive connection pool shared by NPLClients in a test session."""
+    return shared_adapter()
+
+
+def pytest_sessionfinish(session, exitstatus):
+    """Close the shared connection pool (also used by test_utils.create_mock_client)."""
+    close_shared_adapter()
+
+
+@pytest.fixture(autouse=True)
+def reset_circuit_breakers():
+    """Give every test fresh per-endpoint circuit breakers."""
+    CircuitBreaker.reset_all()
+    yield
+    CircuitBreaker.reset_all()
 
 
 @pytest.fixture
@@ -51,20 +116,35 @@ def mock_requests_session():
 
 
 class MockResponse:
-    """Mock HTTP response for testing."""
+    """Mock HTTP response for testing.
+    
+    Instances are immutable so the canonical responses below can be shared
+    across tests.
+    """
+    
+    __slots__ = ("status_code", "_json_data", "text", "ok", "headers", "content")
     
     def __init__(
         self,
         status_code: int = 200,
         json_data: Optional[dict] = None,
         text: str = "",
-        ok: bool = True
+        ok: bool = True,
+        headers: Optional[dict] = None
     ):
-        self.status_code = status_code
-        self._json_data = json_data or {}
-        self.text = text
-        self.ok = ok
-        self.content = text.encode() if text else b""
+        set_ = object.__setattr__
+        set_(self, "status_code", status_code)
+        set_(self, "_json_data", json_data or {})
+        set_(self, "text", text)
+        set_(self, "ok", ok)
+        set_(self, "headers", headers or {})
+        if text:
+            set_(self, "content", text.encode())
+        else:
+            set_(self, "content", json.dumps(json_data).encode() if json_data is not None else b"")
+    
+    def __setattr__(self, name, value):
+        raise AttributeError("MockResponse is immutable")
     
     def json(self):
         return self._json_data
@@ -78,6 +158,41 @@ class MockResponse:
             )
 
 
+OK_200 = MockResponse(status_code=200, json_data={"status": "ok"})
+BAD_REQUEST_400 = MockResponse(status_code=400, ok=False)
+UNAUTHORIZED_401 = MockResponse(status_code=401, ok=False)
+SERVICE_UNAVAILABLE_503 = MockResponse(status_code=503, ok=False)
+
+
+class MockSession:
+    """Replays queued responses (or raises queued exceptions) from client.session.request."""
+    
+    def __init__(self, monkeypatch):
+        self._monkeypatch = monkeypatch
+        self._queue = deque()
+        self.call_count = 0
+    
+    def attach(self, client: NPLClient) -> NPLClient:
+        self._monkeypatch.setattr(client.session, "request", self._request)
+        return client
+    
+    def queue_responses(self, responses):
+        self._queue.extend(responses)
+    
+    def _request(self, method, url, **kwargs):
+        self.call_count += 1
+        result = self._queue.popleft()
+        if isinstance(result, BaseException):
+            raise result
+        return result
+
+
+@pytest.fixture
+def mock_session(monkeypatch):
+    """Fixture providing a MockSession; call .attach(client) then .queue_responses([...])."""
+    return MockSession(monkeypatch)
+
+
 @pytest.fixture
 def mock_response():
     """Fixture providing MockResponse class."""
@@ -0,0 +1,89 @@
+"""
+Tests for the httpx-based AsyncNPLClient.
+"""
+
+import asyncio
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+from adk_npl import AsyncNPLClient
+from adk_npl.utils import NPLClientError
+
+
+def _client(handler, **kwargs) -> AsyncNPLClient:
+    return AsyncNPLClient(
+        base_url="http://localhost:12000",
+        auth_token="test_token",
+        http2=False,
+        transport=httpx.MockTransport(handler),
+        **kwargs
+    )
+
+
+class TestAsyncNPLClient:
+    """Test the async request path."""
+    
+    def test_create_protocol_sends_json_and_auth(self):
+        """Test that acreate_protocol posts the payload with the bearer token."""
+        seen = []
+        
+        def handler(request):
+            seen.append(request)
+            return httpx.Response(200, json={"@id": "abc"})
+        
+        async def run():
+            async with _client(handler) as client:
+                return await client.acreate_protocol(
+                    "commerce", "Product", {"seller": "s"}, {"name": "Widget"}
+                )
+        
+        assert asyncio.run(run()) == {"@id": "abc"}
+        assert seen[0].headers["Authorization"] == "Bearer test_token"
+        assert seen[0].url.path == "/npl/commerce/Product/"
+    
+    def test_retries_503_then_succeeds(self):
+        """Test that a 503 is retried using the shared backoff policy."""
+        responses = [httpx.Response(503), httpx.Response(200, json={"status": "ok"})]
+        
+        async def run():
+            async with _client(lambda request: responses.pop(0), backoff_base=0.0) as client:
+                return await client.aget_instance("commerce", "Product", "abc")
+        
+        assert asyncio.run(run()) == {"status": "ok"}
+    
+    def test_client_error_is_not_retried(self):
+        """Test that a 400 raises NPLClientError after a single attempt."""
+        calls = []
+        
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(400, json={"error": "Bad request"})
+        
+        async def run():
+            async with _client(handler) as client:
+                await client.aget_instance("commerce", "Product", "abc")
+        
+        with pytest.raises(NPLClientError):
+            asyncio.run(run())
+        assert len(calls) == 1
+    
+    def test_failures_reach_metrics_and_activity_log(self, monkeypatch):
+        """Test that async requests are recorded like sync ones."""
+        from unittest.mock import Mock
+        import adk_npl.client
+        from adk_npl import get_metrics
+        
+        activity_logger = Mock()
+        monkeypatch.setattr(adk_npl.client, "get_activity_logger", lambda: activity_logger)
+        errors_before = get_metrics().get_error_counts().get("NPLClientError", 0)
+        
+        async def run():
+            async with _client(lambda request: httpx.Response(400, json={})) as client:
+                await client.aget_instance("commerce", "Product", "abc")
+        
+        with pytest.raises(NPLClientError):
+            asyncio.run(run())
+        
+        assert get_metrics().get_error_counts()["NPLClientError"] == errors_before + 1
+        assert activity_logger.log_npl_api_call.call_args.kwargs["error"] == "HTTP 400"
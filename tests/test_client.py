@@ -0,0 +1,52 @@
+"""
+Tests for NPLClient.stream_list.
+"""
+
+import io
+import pytest
+import requests
+
+import adk_npl.client
+from adk_npl import NPLClient
+
+
+def _response(body: bytes) -> requests.Response:
+    response = requests.Response()
+    response.status_code = 200
+    response.raw = io.BytesIO(body)
+    return response
+
+
+@pytest.fixture(params=["ijson", "json"])
+def parser(request, monkeypatch):
+    """Run a test once with ijson streaming and once with the buffered fallback."""
+    if request.param == "ijson":
+        pytest.importorskip("ijson")
+    else:
+        monkeypatch.setattr(adk_npl.client, "ijson", None)
+    return request.param
+
+
+class TestStreamList:
+    """Test that both parsing paths of stream_list agree."""
+    
+    @pytest.mark.parametrize("body", [
+        b'{"items": [{"@id": "a", "price": 1.5}, {"@id": "b", "price": 2}], "page": 1}',
+        b'[{"@id": "a", "price": 1.5}, {"@id": "b", "price": 2}]',
+    ], ids=["items-page", "bare-array"])
+    def test_yields_instances(self, parser, mock_session, body):
+        """Test that an items page and a bare array yield the same instances."""
+        client = mock_session.attach(NPLClient(base_url="http://localhost:12000", auth_token="test_token"))
+        mock_session.queue_responses([_response(body)])
+        
+        instances = list(client.stream_list("commerce", "Product"))
+        
+        assert instances == [{"@id": "a", "price": 1.5}, {"@id": "b", "price": 2}]
+        assert type(instances[0]["price"]) is float
+    
+    def test_page_without_items_is_empty(self, parser, mock_session):
+        """Test that an object without an items array yields nothing."""
+        client = mock_session.attach(NPLClient(base_url="http://localhost:12000", auth_token="test_token"))
+        mock_session.queue_responses([_response(b'{"page": 1}')])
+        
+        assert list(client.stream_list("commerce", "Product")) == []
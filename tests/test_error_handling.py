@@ -9,14 +9,20 @@ import asyncio
 from unittest.mock import Mock, patch, MagicMock
 import requests
 
-from adk_npl import NPLClient, NPLConfig
+from adk_npl import NPLClient, NPLConfig, get_metrics
 from adk_npl.utils import (
     NPLClientError,
     TokenExpiredError,
     ServiceUnavailableError
 )
-from adk_npl.auth import KeycloakAuth
-from tests.conftest import MockResponse
+from adk_npl.auth import KeycloakAuth, KeycloakTokenCache
+from adk_npl.retry import CircuitBreaker
+from tests.conftest import (
+    MockResponse,
+    OK_200,
+    SERVICE_UNAVAILABLE_503,
+    UNAUTHORIZED_401,
+)
 
 
 @pytest.mark.integration
@@ -34,56 +40,250 @@ class TestRetryLogic:
             max_retries=2
         )
         
-        # Test that connection errors are handled gracefully
-        with pytest.raises(NPLClientError):
+        # Test that connection errors are handled gracefully (backoff sleeps patched out)
+        with patch('adk_npl.client.time.sleep'), pytest.raises(NPLClientError):
             client._make_request("GET", "http://unreachable:12000/test")
     
-    def test_retry_on_503_service_unavailable(self):
+    def test_retry_on_503_service_unavailable(self, mock_session):
         """Test retry on 503 Service Unavailable."""
-        client = NPLClient(
+        client = mock_session.attach(NPLClient(
             base_url="http://localhost:12000",
             auth_token="test_token",
             max_retries=2
-        )
-        
-        # Mock session to return 503, then 200
-        mock_response_503 = MockResponse(status_code=503, ok=False)
-        mock_response_200 = MockResponse(status_code=200, json_data={"status": "ok"})
+        ))
+        mock_session.queue_responses([SERVICE_UNAVAILABLE_503, OK_200])
         
-        with patch.object(client.session, 'request') as mock_request:
-            mock_request.side_effect = [
-                mock_response_503,
-                mock_response_200
-            ]
-            
-            # Should succeed after retry
+        # Should succeed after retry
+        with patch('adk_npl.client.time.sleep') as mock_sleep:
             response = client._make_request("GET", "http://localhost:12000/test")
-            assert response.status_code == 200
+        assert response.status_code == 200
+        mock_sleep.assert_called_once()
     
-    def test_max_retries_exceeded(self):
+    def test_max_retries_exceeded(self, mock_session):
         """Test that max retries are respected."""
-        client = NPLClient(
+        client = mock_session.attach(NPLClient(
             base_url="http://localhost:12000",
             auth_token="test_token",
             max_retries=2
-        )
+        ))
+        mock_session.queue_responses([SERVICE_UNAVAILABLE_503] * 3)
         
-        # Mock session to always return 503
-        mock_response_503 = MockResponse(status_code=503, ok=False)
+        def engine_errors():
+            counters = get_metrics().get_counters()
+            return sum(v for k, v in counters.items() if k.startswith("npl.api.errors") and "503" in k)
         
-        with patch.object(client.session, 'request') as mock_request:
-            mock_request.return_value = mock_response_503
+        errors_before = engine_errors()
+        
+        # Should raise after max retries
+        with patch('adk_npl.client.time.sleep') as mock_sleep, pytest.raises(NPLClientError):
+            client._make_request("GET", "http://localhost:12000/test")
+        assert mock_session.call_count == 3
+        assert mock_sleep.call_count == 2
+        # Every 503, including the final one, is counted as an engine error
+        assert engine_errors() == errors_before + 3
+    
+    def test_retry_after_header_is_honored(self, mock_session):
+        """Test that a numeric Retry-After replaces the jittered backoff."""
+        client = mock_session.attach(NPLClient(
+            base_url="http://localhost:12000",
+            auth_token="test_token",
+            max_retries=2
+        ))
+        mock_session.queue_responses([
+            MockResponse(status_code=503, ok=False, headers={"Retry-After": "0.25"}),
+            OK_200
+        ])
+        
+        with patch('adk_npl.client.time.sleep') as mock_sleep:
+            response = client._make_request("GET", "http://localhost:12000/test")
+            assert response.status_code == 200
+            mock_sleep.assert_called_once_with(0.25)
+    
+    def test_total_timeout_bounds_retries(self, mock_session):
+        """Test that no retry is started once it would exceed total_timeout."""
+        client = mock_session.attach(NPLClient(
+            base_url="http://localhost:12000",
+            auth_token="test_token",
+            max_retries=5,
+            backoff_base=1.0,
+            total_timeout=0.5
+        ))
+        mock_session.queue_responses([SERVICE_UNAVAILABLE_503])
+        
+        with patch('adk_npl.client.time.sleep') as mock_sleep:
+            with pytest.raises(NPLClientError):
+                client._make_request("GET", "http://localhost:12000/test")
             
-            # Should raise after max retries
+            assert mock_session.call_count == 1
+            mock_sleep.assert_not_called()
+
+
+class TestCircuitBreaker:
+    """Test failing fast while the engine is down."""
+    
+    def test_open_circuit_fails_fast(self, mock_session):
+        """Test that repeated failures open the circuit and skip the network."""
+        client = mock_session.attach(NPLClient(
+            base_url="http://localhost:12000",
+            auth_token="test_token",
+            max_retries=0,
+            circuit_breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60.0)
+        ))
+        mock_session.queue_responses(
+            [requests.exceptions.ConnectionError("Connection refused")] * 2
+        )
+        
+        for _ in range(2):
             with pytest.raises(NPLClientError):
                 client._make_request("GET", "http://localhost:12000/test")
+        
+        with pytest.raises(ServiceUnavailableError, match="Circuit open"):
+            client._make_request("GET", "http://localhost:12000/test")
+        
+        assert mock_session.call_count == 2
+    
+    def test_half_open_probe_closes_circuit(self, mock_session):
+        """Test that a successful probe after reset_timeout closes the circuit."""
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+        client = mock_session.attach(NPLClient(
+            base_url="http://localhost:12000",
+            auth_token="test_token",
+            max_retries=0,
+            circuit_breaker=breaker
+        ))
+        mock_session.queue_responses([MockResponse(status_code=500, ok=False), OK_200])
+        
+        with pytest.raises(NPLClientError):
+            client._make_request("GET", "http://localhost:12000/test")
+        assert breaker.state == CircuitBreaker.OPEN
+        
+        response = client._make_request("GET", "http://localhost:12000/test")
+        assert response.status_code == 200
+        assert breaker.state == CircuitBreaker.CLOSED
+
+
+class TestTokenLifecycle:
+    """Test token expiry, refresh grants and the token cache (all mocked)."""
+    
+    def test_proactive_refresh_before_expiry(self, mock_session):
+        """Test that a token about to expire is refreshed before the request."""
+        import base64
+        import json
+        import time
+        
+        def make_token(exp):
+            payload = base64.urlsafe_b64encode(json.dumps({"exp": exp}).encode()).decode()
+            return f"header.{payload.rstrip('=')}.signature"
+        
+        fresh_token = make_token(time.time() + 300)
+        client = NPLClient(
+            base_url="http://localhost:12000",
+            auth_token=make_token(time.time() + 10),
+            token_refresh_callback=lambda: fresh_token
+        )
+        
+        mock_session.attach(client)
+        mock_session.queue_responses([OK_200])
+        
+        client._make_request("GET", "http://localhost:12000/test")
+        
+        assert mock_session.call_count == 1
+        assert client.auth_token == fresh_token
+        assert client.session.headers["Authorization"] == f"Bearer {fresh_token}"
+    
+    def test_keycloak_ensure_fresh_uses_refresh_grant(self):
+        """Test that ensure_fresh refreshes an expiring token via the refresh grant."""
+        import time
+        
+        session = Mock()
+        session.post.return_value = MockResponse(
+            status_code=200,
+            json_data={"access_token": "new_token", "refresh_token": "new_refresh"}
+        )
+        auth = KeycloakAuth("http://keycloak:11000", "realm", "user", "pw", session=session)
+        auth._access_token = "old_token"
+        auth._refresh_token = "old_refresh"
+        auth.expires_at = time.time() + 5
+        
+        token = asyncio.run(auth.ensure_fresh())
+        
+        assert token == "new_token"
+        assert session.post.call_args.kwargs["data"]["grant_type"] == "refresh_token"
+    
+    def test_keycloak_exposes_token_claims(self):
+        """Test that the access token's claims are decoded once and kept on the auth object."""
+        import base64
+        import json
+        
+        claims = {"exp": 2000000000, "organization": ["Acme"]}
+        payload = base64.urlsafe_b64encode(json.dumps(claims).encode()).decode().rstrip("=")
+        session = Mock()
+        session.post.return_value = MockResponse(
+            status_code=200,
+            json_data={"access_token": f"header.{payload}.signature"}
+        )
+        auth = KeycloakAuth("http://keycloak:11000", "realm", "user", "pw", session=session)
+        
+        asyncio.run(auth.authenticate())
+        
+        assert auth.claims["organization"] == ["Acme"]
+        assert auth.expires_at == 2000000000.0
+    
+    def test_token_cache_survives_separate_event_loops(self):
+        """Test that KeycloakTokenCache works across asyncio.run calls and refreshes lazily."""
+        session = Mock()
+        session.post.return_value = MockResponse(
+            status_code=200,
+            json_data={"access_token": "token", "refresh_token": "refresh"}
+        )
+        identity = ("http://keycloak:11000", "realm", "client", "user")
+        
+        async def get_token():
+            return await KeycloakTokenCache.get_or_refresh(*identity, "pw", session=session)
+        
+        KeycloakTokenCache.clear()
+        try:
+            assert asyncio.run(get_token()) == "token"
+            assert asyncio.run(get_token()) == "token"
+            assert session.post.call_count == 1
+            
+            # Past its refresh time the next caller refreshes; nothing runs in between
+            token, _, digest = KeycloakTokenCache._tokens[identity]
+            KeycloakTokenCache._tokens[identity] = (token, 0.0, digest)
+            assert asyncio.run(get_token()) == "token"
+            assert session.post.call_count == 2
+            assert session.post.call_args.kwargs["data"]["grant_type"] == "refresh_token"
+        finally:
+            KeycloakTokenCache.clear()
+    
+    def test_token_cache_rejects_wrong_password(self):
+        """Test that a cached token is not handed to a caller with a different password."""
+        from adk_npl.utils import AuthenticationError
+        
+        def post(url, data, headers):
+            if data.get("password") == "pw":
+                return MockResponse(status_code=200, json_data={"access_token": "token"})
+            return MockResponse(status_code=401, ok=False)
+        
+        session = Mock()
+        session.post.side_effect = post
+        identity = ("http://keycloak:11000", "realm", "client", "user")
+        
+        KeycloakTokenCache.clear()
+        try:
+            assert asyncio.run(KeycloakTokenCache.get_or_refresh(*identity, "pw", session=session)) == "token"
+            with pytest.raises(AuthenticationError):
+                asyncio.run(KeycloakTokenCache.get_or_refresh(*identity, "wrong", session=session))
+            assert session.post.call_count == 2
+        finally:
+            KeycloakTokenCache.clear()
 
 
 @pytest.mark.integration
 class TestTokenRefresh:
     """Test token refresh handling."""
     
-    def test_token_refresh_on_401(self):
+    def test_token_refresh_on_401(self, mock_session):
         """Test that 401 errors trigger token refresh."""
         client = NPLClient(
             base_url="http://localhost:12000",
@@ -100,20 +300,14 @@ class TestTokenRefresh:
         client.token_refresh_callback = refresh_token
         
         # Mock session: first call returns 401, second returns 200
-        mock_response_401 = MockResponse(status_code=401, ok=False)
-        mock_response_200 = MockResponse(status_code=200, json_data={"status": "ok"})
+        mock_session.attach(client)
+        mock_session.queue_responses([UNAUTHORIZED_401, OK_200])
         
-        with patch.object(client.session, 'request') as mock_request:
-            mock_request.side_effect = [
-                mock_response_401,
-                mock_response_200
-            ]
-            
-            # Should refresh token and retry
-            response = client._make_request("GET", "http://localhost:12000/test")
-            assert response.status_code == 200
-            assert len(refresh_called) > 0
-            assert client.auth_token == "new_token"
+        # Should refresh token and retry
+        response = client._make_request("GET", "http://localhost:12000/test")
+        assert response.status_code == 200
+        assert len(refresh_called) > 0
+        assert client.auth_token == "new_token"
     
     def test_token_refresh_fallback_to_auth(self):
         """Test that failed refresh falls back to full authentication."""
@@ -157,7 +351,7 @@ class TestErrorMessages:
         test_url = "http://localhost:12000/test/endpoint"
         mock_response_500 = MockResponse(status_code=500, ok=False)
         
-        with patch.object(client.session, 'request') as mock_request:
+        with patch.object(client.session, 'request') as mock_request, patch('adk_npl.client.time.sleep'):
             mock_request.return_value = mock_response_500
             
             with pytest.raises(NPLClientError) as exc_info:
@@ -167,6 +361,47 @@ class TestErrorMessages:
             assert hasattr(exc_info.value, 'url') or test_url in str(exc_info.value)
 
 
+class TestSchemaValidation:
+    """Test local validation of protocol payloads against registered schemas."""
+    
+    def test_registered_schema_rejects_payload_locally(self, mock_session):
+        """Test that a payload failing the registered schema never reaches the engine."""
+        client = mock_session.attach(NPLClient(
+            base_url="http://localhost:12000",
+            auth_token="test_token"
+        ))
+        client.register_schema(
+            "commerce",
+            "Product",
+            {
+                "type": "object",
+                "required": ["@parties", "name", "price"],
+                "properties": {
+                    "@parties": {"$ref": "#/components/schemas/Product_Parties"},
+                    "name": {"type": "string"},
+                    "price": {"type": "number"},
+                    "description": {"type": "string", "nullable": True},
+                },
+            },
+            {"Product_Parties": {"type": "object", "required": ["seller"], "properties": {}}}
+        )
+        
+        with pytest.raises(NPLClientError) as exc_info:
+            client.create_protocol(
+                package="commerce",
+                protocol_name="Product",
+                parties={},
+                data={"price": "cheap", "description": None}
+            )
+        
+        message = str(exc_info.value)
+        assert exc_info.value.status_code == 400
+        assert "missing required field 'name'" in message
+        assert "missing required field '@parties.seller'" in message
+        assert "'price' should be of type number" in message
+        assert mock_session.call_count == 0
+
+
 @pytest.mark.integration
 class TestGracefulDegradation:
     """Test graceful degradation when services are unavailable."""
@@ -180,7 +415,7 @@ class TestGracefulDegradation:
         )
         
         # Mock timeout exception
-        with patch.object(client.session, 'request') as mock_request:
+        with patch.object(client.session, 'request') as mock_request, patch('adk_npl.client.time.sleep'):
             mock_request.side_effect = requests.exceptions.Timeout("Request timed out")
             
             with pytest.raises(NPLClientError) as exc_info:
@@ -196,7 +431,7 @@ class TestGracefulDegradation:
         )
         
         # Mock connection error
-        with patch.object(client.session, 'request') as mock_request:
+        with patch.object(client.session, 'request') as mock_request, patch('adk_npl.client.time.sleep'):
             mock_request.side_effect = requests.exceptions.ConnectionError("Connection refused")
             
             with pytest.raises(NPLClientError):
@@ -204,7 +439,6 @@ class TestGracefulDegradation:
 
 
 @pytest.mark.integration
-@pytest.mark.anyio
 class TestInvalidStates:
     """Test handling of invalid protocol states."""
     
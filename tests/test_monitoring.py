@@ -4,11 +4,13 @@ Tests for monitoring and observability.
 Tests metrics collection, structured logging, and health checks.
 """
 
+import asyncio
 import pytest
 import time
 from unittest.mock import patch, Mock
 
 from adk_npl.monitoring import (
+    LatencySketch,
     MetricsCollector,
     StructuredLogger,
     HealthCheck,
@@ -56,6 +58,31 @@ class TestMetricsCollector:
         assert "p95" in stats
         assert "p99" in stats
     
+    def test_latency_percentiles_are_within_relative_accuracy(self):
+        """Test that sketch percentiles track the exact nearest-rank values."""
+        values = [i / 1000 for i in range(1, 5001)]
+        metrics = MetricsCollector()
+        for value in values:
+            metrics.record_latency("test.latency", value)
+        
+        stats = metrics.get_latency_stats("test.latency")
+        assert stats["count"] == 5000
+        for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99)):
+            assert stats[name] == pytest.approx(values[int(5000 * q)], rel=0.01)
+    
+    def test_latency_sketch_merge(self):
+        """Test that merged sketches match a single sketch over all samples."""
+        combined, first, second = LatencySketch(), LatencySketch(), LatencySketch()
+        for i in range(1, 201):
+            combined.add(i / 100)
+            (first if i % 2 else second).add(i / 100)
+        
+        first.merge(second)
+        assert first.count == combined.count
+        assert first.min == combined.min
+        assert first.max == combined.max
+        assert first.quantile(0.95) == combined.quantile(0.95)
+    
     def test_record_error(self):
         """Test recording errors."""
         metrics = MetricsCollector()
@@ -79,6 +106,8 @@ class TestMetricsCollector:
         errors = metrics.get_errors()
         # Should only keep last 100 errors
         assert len(errors) <= 100
+        # ...but keep counting past the sample limit
+        assert metrics.get_error_counts() == {"TestError": 150}
     
     def test_get_summary(self):
         """Test getting metrics summary."""
@@ -93,6 +122,25 @@ class TestMetricsCollector:
         assert "timestamp" in summary
         assert len(summary["recent_errors"]) == 1
     
+    def test_summary_snapshot_while_started(self):
+        """Test that a started collector serves a snapshot until it refreshes."""
+        async def run():
+            metrics = MetricsCollector()
+            metrics.increment("test.counter")
+            await metrics.start(interval=60.0)
+            try:
+                metrics.increment("test.counter")
+                snapshot = metrics.get_summary()
+                assert snapshot["counters"]["test.counter"] == 1
+                snapshot.pop("counters")
+                assert metrics.get_summary()["counters"]["test.counter"] == 1
+                assert metrics.get_summary(force=True)["counters"]["test.counter"] == 2
+            finally:
+                await metrics.stop()
+            assert metrics.get_summary()["counters"]["test.counter"] == 2
+        
+        asyncio.run(run())
+    
     def test_reset(self):
         """Test resetting metrics."""
         metrics = MetricsCollector()
@@ -114,6 +162,7 @@ class TestStructuredLogger:
         """Test plain text logging format."""
         import logging
         logger = StructuredLogger("test", use_json=False)
+        logger.logger.setLevel(logging.INFO)
         
         with patch.object(logger.logger, 'info') as mock_info:
             logger.info("Test message", key="value")
@@ -127,6 +176,7 @@ class TestStructuredLogger:
         import json
         import logging
         logger = StructuredLogger("test", use_json=True)
+        logger.logger.setLevel(logging.INFO)
         
         with patch.object(logger.logger, 'info') as mock_info:
             logger.info("Test message", key="value")
@@ -139,6 +189,16 @@ class TestStructuredLogger:
             assert log_entry["key"] == "value"
             assert "timestamp" in log_entry
             assert "level" in log_entry
+    
+    def test_disabled_level_skips_formatting(self):
+        """Test that records below the logger level are not formatted."""
+        import logging
+        logger = StructuredLogger("test.quiet", use_json=True)
+        logger.logger.setLevel(logging.WARNING)
+        
+        with patch.object(StructuredLogger, '_format_message') as mock_format:
+            logger.info("Dropped message", key="value")
+            mock_format.assert_not_called()
 
 
 class TestHealthCheck:
@@ -149,7 +209,7 @@ class TestHealthCheck:
         client = NPLClient(base_url="http://localhost:12000")
         health_check = HealthCheck(client)
         
-        with patch('requests.get') as mock_get:
+        with patch.object(client.session, 'get') as mock_get:
             mock_response = Mock()
             mock_response.ok = True
             mock_response.json.return_value = {"status": "UP"}
@@ -165,7 +225,7 @@ class TestHealthCheck:
         client = NPLClient(base_url="http://localhost:12000")
         health_check = HealthCheck(client)
         
-        with patch('requests.get') as mock_get:
+        with patch.object(client.session, 'get') as mock_get:
             mock_response = Mock()
             mock_response.ok = False
             mock_response.status_code = 503
@@ -181,13 +241,29 @@ class TestHealthCheck:
         client = NPLClient(base_url="http://localhost:12000")
         health_check = HealthCheck(client)
         
-        with patch('requests.get') as mock_get:
+        with patch.object(client.session, 'get') as mock_get:
             mock_get.side_effect = Exception("Connection refused")
             
             health = health_check.check_engine_health()
             assert health["status"] == "unreachable"
             assert "error" in health
     
+    def test_failed_health_check_is_cached(self):
+        """Test that an unreachable engine is not re-probed within the TTL."""
+        client = NPLClient(base_url="http://localhost:12000")
+        health_check = HealthCheck(client, failure_cache_ttl=60.0)
+        
+        with patch.object(client.session, 'get') as mock_get:
+            mock_get.side_effect = Exception("Connection refused")
+            
+            first = health_check.check_engine_health()
+            second = health_check.check_engine_health()
+            assert first["status"] == second["status"] == "unreachable"
+            assert mock_get.call_count == 1
+            
+            health_check.check_engine_health(force=True)
+            assert mock_get.call_count == 2
+    
     def test_check_authentication_authenticated(self):
         """Test authentication check when authenticated."""
         client = NPLClient(
@@ -197,7 +273,7 @@ class TestHealthCheck:
         health_check = HealthCheck(client)
         
         # Mock healthy engine
-        with patch('requests.get') as mock_get:
+        with patch.object(client.session, 'get') as mock_get:
             mock_response = Mock()
             mock_response.ok = True
             mock_response.json.return_value = {"status": "UP"}
@@ -225,7 +301,7 @@ class TestHealthCheck:
         )
         health_check = HealthCheck(client)
         
-        with patch('requests.get') as mock_get:
+        with patch.object(client.session, 'get') as mock_get:
             mock_response = Mock()
             mock_response.ok = True
             mock_response.json.return_value = {"status": "UP"}
@@ -0,0 +1,55 @@
+"""
+Tests for pipelined protocol creation (NPLSession).
+"""
+
+import pytest
+from unittest.mock import Mock
+
+from adk_npl import NPLClient
+from adk_npl.utils import NPLClientError
+
+
+class TestNPLSession:
+    """Test batching of create_protocol calls."""
+    
+    async def test_creations_resolve_in_order(self):
+        """Test that every queued creation resolves to its own result."""
+        client = NPLClient(base_url="http://localhost:12000", auth_token="test_token")
+        client.create_protocol = Mock(side_effect=lambda package, name, parties, data: {"@id": data["n"]})
+        
+        async with client.begin_session(max_batch=2) as session:
+            futures = [
+                session.create_protocol("commerce", "Product", {}, {"n": i})
+                for i in range(5)
+            ]
+        
+        assert [f.result() for f in futures] == [{"@id": i} for i in range(5)]
+        assert client.create_protocol.call_count == 5
+    
+    async def test_failure_only_affects_its_future(self):
+        """Test that one failed creation doesn't fail the rest of its batch."""
+        def create(package, name, parties, data):
+            if data["n"] == 1:
+                raise NPLClientError("API error (400)", status_code=400)
+            return {"@id": data["n"]}
+        
+        client = NPLClient(base_url="http://localhost:12000", auth_token="test_token")
+        client.create_protocol = Mock(side_effect=create)
+        
+        async with client.begin_session() as session:
+            futures = [
+                session.create_protocol("commerce", "Product", {}, {"n": i})
+                for i in range(3)
+            ]
+        
+        assert futures[0].result() == {"@id": 0}
+        with pytest.raises(NPLClientError):
+            futures[1].result()
+        assert futures[2].result() == {"@id": 2}
+    
+    def test_requires_context_manager(self):
+        """Test that queuing outside 'async with' is rejected."""
+        client = NPLClient(base_url="http://localhost:12000", auth_token="test_token")
+        
+        with pytest.raises(RuntimeError):
+            client.begin_session().create_protocol("commerce", "Product", {}, {})
@@ -4,13 +4,65 @@ Test utilities for ADK-NPL integration tests.
 Provides helper functions for testing (fixtures are in conftest.py).
 """
 
-from typing import Optional
+from functools import lru_cache
+from typing import Callable, Optional, Tuple
+from requests.adapters import HTTPAdapter
 from adk_npl import NPLClient
 
 
-def create_mock_client(base_url: str = "http://localhost:12000") -> NPLClient:
-    """Create a mock NPL client for testing."""
-    return NPLClient(base_url=base_url, auth_token="mock_token")
+# One keep-alive pool for every client created through this module (and the
+# http_adapter fixture); closed by conftest at the end of the session
+_SHARED_ADAPTER: Optional[HTTPAdapter] = None
+
+
+def shared_adapter() -> HTTPAdapter:
+    """Return the process-wide test connection pool, creating it on first use."""
+    global _SHARED_ADAPTER
+    if _SHARED_ADAPTER is None:
+        _SHARED_ADAPTER = HTTPAdapter(pool_connections=16, pool_maxsize=32)
+    return _SHARED_ADAPTER
+
+
+def close_shared_adapter() -> None:
+    """Close the shared connection pool, if it was created."""
+    global _SHARED_ADAPTER
+    if _SHARED_ADAPTER is not None:
+        _SHARED_ADAPTER.close()
+        _SHARED_ADAPTER = None
+
+
+def create_mock_client(
+    base_url: str = "http://localhost:12000",
+    adapter: Optional[HTTPAdapter] = None
+) -> NPLClient:
+    """
+    Create a mock NPL client for testing.
+    
+    Clients share one keep-alive pool (shared_adapter()) unless a different
+    ``adapter`` is passed, so tests creating many clients don't each open
+    their own connections.
+    """
+    return NPLClient(base_url=base_url, auth_token="mock_token", adapter=adapter or shared_adapter())
+
+
+# Fields of which a protocol response must carry at least one
+_ID_FIELDS = frozenset(("@id", "id", "instance", "uuid"))
+
+
+@lru_cache(maxsize=64)
+def _make_validator(expected: Tuple[str, ...]) -> Callable[[dict], None]:
+    """Build (once per expected_fields tuple) the check behind assert_protocol_response."""
+    expected_set = frozenset(expected)
+    
+    def validate(response: dict):
+        assert response, "Response should not be empty"
+        keys = response.keys()
+        assert not _ID_FIELDS.isdisjoint(keys), f"Response should contain an ID field: {response}"
+        if not expected_set.issubset(keys):
+            missing = sorted(expected_set - keys)
+            raise AssertionError(f"Response should contain fields {missing}: {response}")
+    
+    return validate
 
 
 def assert_protocol_response(response: dict, expected_fields: Optional[list] = None):
@@ -21,13 +73,4 @@ def assert_protocol_response(response: dict, expected_fields: Optional[list] = N
         response: Protocol response dict
         expected_fields: Optional list of expected field names
     """
-    assert response, "Response should not be empty"
-    
-    # Check for common NPL fields
-    assert "@id" in response or "id" in response or "instance" in response or "uuid" in response, \
-        f"Response should contain an ID field: {response}"
-    
-    if expected_fields:
-        for field in expected_fields:
-            assert field in response, f"Response should contain field '{field}': {response}"
-
+    _make_validator(tuple(expected_fields or ()))(response)